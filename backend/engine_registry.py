@@ -0,0 +1,152 @@
+"""
+引擎注册表 - 每个 (model, backend) 一个常驻 LLM 引擎，每种 OCR 配置一个常驻 OCR 引擎
+避免请求间切换模型时反复重建客户端（丢失 HTTP 连接池）
+"""
+
+import logging
+import threading
+from typing import Optional, Dict, Tuple, List
+
+from src.ocr import RapidOCREngine
+from src.llm import OllamaEngine, VLLMEngine, RouterEngine, OpenAICompatibleEngine, LLMCache
+
+logger = logging.getLogger(__name__)
+
+
+# 支持的 LLM 后端
+LLM_BACKENDS = {
+    "ollama": OllamaEngine,
+    "vllm": VLLMEngine,
+}
+
+
+class EngineRegistry:
+    """
+    引擎注册表（线程安全）
+
+    引擎在首次使用时创建，之后一直复用，直到 close() 统一释放。
+    """
+
+    def __init__(
+        self,
+        backend: str = "ollama",
+        api_base: Optional[str] = None,
+        temperature: float = 0.0,
+        max_tokens: int = 512,
+        cache: Optional[LLMCache] = None,
+        structured_output: bool = True,
+        attempt_timeout: float = 30.0,
+    ):
+        """
+        初始化引擎注册表
+
+        Args:
+            backend: 默认 LLM 后端（ollama / vllm）
+            api_base: LLM API 地址（为空时使用各后端的默认地址；多个地址用逗号分隔，
+                此时每个模型一个 RouterEngine，按负载分发到各地址）
+            temperature: 采样温度
+            max_tokens: 最大生成 token 数
+            cache: 所有 LLM 引擎共用的响应缓存（可选）
+            structured_output: 是否使用约束解码（JSON Schema）
+            attempt_timeout: 多地址时单个地址多久没有输出视为无响应（秒，摘除并换地址重试）
+        """
+        if backend not in LLM_BACKENDS:
+            raise ValueError(f"Unsupported LLM backend: {backend}")
+
+        self.backend = backend
+        self.api_base = api_base
+        self.api_bases = [b.strip() for b in (api_base or "").split(",") if b.strip()]
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.structured_output = structured_output
+        self.attempt_timeout = attempt_timeout
+
+        self._llm_engines: Dict[Tuple[str, str], OpenAICompatibleEngine] = {}
+        self._ocr_engines: Dict[bool, RapidOCREngine] = {}
+        # OCR 引擎创建耗时较长，使用独立的锁，避免阻塞 LLM 引擎的获取
+        self._llm_lock = threading.Lock()
+        self._ocr_lock = threading.Lock()
+
+    def get_llm(self, model: str, backend: Optional[str] = None) -> OpenAICompatibleEngine:
+        """
+        获取 LLM 引擎（不存在时创建）
+
+        Args:
+            model: 模型名称
+            backend: LLM 后端（默认使用注册表的后端）
+
+        Returns:
+            LLM 引擎
+        """
+        key = (model, backend or self.backend)
+
+        with self._llm_lock:
+            engine = self._llm_engines.get(key)
+            if engine is None:
+                engine_cls = LLM_BACKENDS[key[1]]
+                if len(self.api_bases) > 1:
+                    engine = RouterEngine(
+                        self.api_bases,
+                        model_name=model,
+                        engine_cls=engine_cls,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        cache=self.cache,
+                        structured_output=self.structured_output,
+                        attempt_timeout=self.attempt_timeout,
+                    )
+                else:
+                    kwargs = {"api_base": self.api_bases[0]} if self.api_bases else {}
+                    engine = engine_cls(
+                        model_name=model,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        cache=self.cache,
+                        structured_output=self.structured_output,
+                        **kwargs,
+                    )
+                self._llm_engines[key] = engine
+                logger.info(f"LLM engine registered: {key[1]}/{model}")
+            return engine
+
+    def get_ocr(self, use_angle_cls: bool = False) -> RapidOCREngine:
+        """
+        获取 OCR 引擎（每种配置一个实例）
+
+        Args:
+            use_angle_cls: 是否使用角度分类器
+
+        Returns:
+            OCR 引擎
+        """
+        with self._ocr_lock:
+            engine = self._ocr_engines.get(use_angle_cls)
+            if engine is None:
+                engine = RapidOCREngine(use_angle_cls=use_angle_cls, print_verbose=False)
+                self._ocr_engines[use_angle_cls] = engine
+                logger.info(f"OCR engine registered: use_angle_cls={use_angle_cls}")
+            return engine
+
+    def llm_engines(self) -> List[OpenAICompatibleEngine]:
+        """已创建的 LLM 引擎"""
+        with self._llm_lock:
+            return list(self._llm_engines.values())
+
+    def ocr_engines(self) -> List[RapidOCREngine]:
+        """已创建的 OCR 引擎"""
+        with self._ocr_lock:
+            return list(self._ocr_engines.values())
+
+    def close(self):
+        """释放所有引擎"""
+        with self._llm_lock:
+            for engine in self._llm_engines.values():
+                try:
+                    engine.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close {engine.model_name}: {e}")
+            self._llm_engines.clear()
+
+        with self._ocr_lock:
+            self._ocr_engines.clear()
@@ -0,0 +1,239 @@
+"""
+异步扫描任务存储 - POST /jobs 立即返回任务 ID，后台 worker 处理
+内存存储，可选 SQLite 持久化（进程重启后未完成的任务会重新入队）
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """单个扫描任务"""
+    job_id: str
+    params: Dict[str, Any]                     # 扫描参数
+    image: Optional[bytes]                     # 上传的图片（完成后释放）
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    stages: Dict[str, float] = field(default_factory=dict)   # 阶段耗时
+    progress: Dict[str, Any] = field(default_factory=dict)   # 进度信息（订单数等）
+    partial: List[Dict[str, Any]] = field(default_factory=list)  # 已完成的订单
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（不含图片）"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "stages": self.stages,
+            "progress": self.progress,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """
+    扫描任务存储
+
+    worker 线程通过 update_stage / add_partial 上报进度，
+    所有方法都是线程安全的。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl: float = 3600):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: SQLite 数据库路径（为空时只使用内存）
+            ttl: 已结束任务的保留时间（秒）
+        """
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, params TEXT NOT NULL, image BLOB, "
+                "status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "stages TEXT, progress TEXT, partial TEXT, result TEXT, error TEXT)"
+            )
+            self._db.commit()
+            self._load()
+            logger.info(f"Job store persisted to {db_path}")
+
+    def create(self, image: bytes, params: Dict[str, Any]) -> Job:
+        """
+        创建任务
+
+        Args:
+            image: 图片字节
+            params: 扫描参数
+
+        Returns:
+            新建的任务
+        """
+        job = Job(job_id=uuid.uuid4().hex, params=params, image=image)
+        with self._lock:
+            self._purge()
+            self._jobs[job.job_id] = job
+            self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """查询任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态（加锁复制，避免读到 worker 写了一半的数据）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            data = job.to_dict()
+            data["stages"] = dict(job.stages)
+            data["progress"] = dict(job.progress)
+            data["partial"] = list(job.partial)
+            return data
+
+    def pending(self) -> List[str]:
+        """未完成的任务 ID（按创建时间排序，用于重启后重新入队）"""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.status in (JOB_QUEUED, JOB_RUNNING)]
+            return [j.job_id for j in sorted(jobs, key=lambda j: j.created_at)]
+
+    def mark_running(self, job_id: str):
+        """标记任务开始执行"""
+        self._update(job_id, status=JOB_RUNNING)
+
+    def update_stage(self, job_id: str, stage: str, seconds: float, **progress):
+        """上报阶段耗时和进度"""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.stages[stage] = seconds
+            job.progress.update(progress)
+            job.updated_at = time.time()
+            self._save(job)
+
+    def add_partial(self, job_id: str, order: Dict[str, Any]):
+        """上报一个已完成的订单"""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.partial.append(order)
+            job.updated_at = time.time()
+            self._save(job)
+
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        """任务完成（根据结果设置 done / failed）"""
+        success = result.get("success", False)
+        self._update(
+            job_id,
+            status=JOB_DONE if success else JOB_FAILED,
+            result=result,
+            error=None if success else result.get("error"),
+            stages=result.get("performance") or {},
+            image=None,
+        )
+
+    def fail(self, job_id: str, error: str):
+        """任务失败"""
+        self._update(job_id, status=JOB_FAILED, error=error, image=None)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+            self._save(job)
+
+    def _purge(self):
+        """清理过期的已结束任务（调用方持有锁）"""
+        expire = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in (JOB_DONE, JOB_FAILED) and job.updated_at < expire
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._db is not None and expired:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_DONE, JOB_FAILED, expire),
+            )
+            self._db.commit()
+
+    def _save(self, job: Job):
+        """写入 SQLite（调用方持有锁）"""
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, params, image, status, created_at, updated_at, "
+            "stages, progress, partial, result, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.job_id,
+                json.dumps(job.params),
+                job.image,
+                job.status,
+                job.created_at,
+                job.updated_at,
+                json.dumps(job.stages),
+                json.dumps(job.progress, ensure_ascii=False),
+                json.dumps(job.partial, ensure_ascii=False),
+                json.dumps(job.result, ensure_ascii=False) if job.result is not None else None,
+                job.error,
+            ),
+        )
+        self._db.commit()
+
+    def _load(self):
+        """从 SQLite 加载任务，执行中断的任务重置为排队状态"""
+        rows = self._db.execute(
+            "SELECT job_id, params, image, status, created_at, updated_at, "
+            "stages, progress, partial, result, error FROM jobs"
+        ).fetchall()
+
+        for row in rows:
+            job = Job(
+                job_id=row[0],
+                params=json.loads(row[1]),
+                image=row[2],
+                status=JOB_QUEUED if row[3] == JOB_RUNNING else row[3],
+                created_at=row[4],
+                updated_at=row[5],
+                stages=json.loads(row[6] or "{}"),
+                progress=json.loads(row[7] or "{}"),
+                partial=json.loads(row[8] or "[]"),
+                result=json.loads(row[9]) if row[9] else None,
+                error=row[10],
+            )
+            if job.status == JOB_QUEUED:
+                # 重新执行时从头开始
+                job.stages, job.progress, job.partial = {}, {}, []
+            self._jobs[job.job_id] = job
+
+        self._purge()
@@ -0,0 +1,245 @@
+"""
+负载保护 - 根据最近的阶段耗时估算排队等待时间
+预计无法在客户端预算内完成的请求在读取请求体之前直接拒绝（429 + Retry-After），
+负载持续偏高时逐级降低识别质量换取速度
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, Deque, Tuple
+
+
+class LatencyEstimator:
+    """
+    最近 N 次扫描的阶段耗时（滑动窗口）
+
+    OCR 和 LLM 两个阶段分别统计，LLM 阶段为 detect_type + split + parse 之和；
+    total 为端到端耗时（用于 p95）。
+    """
+
+    def __init__(self, window: int = 50):
+        """
+        初始化耗时估算
+
+        Args:
+            window: 每个阶段保留的最近样本数
+        """
+        self.window = window
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}  # 阶段 -> (记录时间, 耗时)
+        self._lock = threading.Lock()
+
+    def observe(self, times: Dict[str, float]):
+        """
+        记录一次扫描的阶段耗时
+
+        Args:
+            times: scan_image 返回的 performance 字典
+        """
+        llm = sum(times.get(stage, 0.0) for stage in ("detect_type", "split", "parse"))
+
+        with self._lock:
+            if "ocr" in times:
+                self._append("ocr", times["ocr"])
+            if "parse" in times:
+                self._append("llm", llm)
+            if "total" in times:
+                self._append("total", times["total"])
+
+    def _append(self, stage: str, seconds: float):
+        """写入样本（调用方持有锁）"""
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append((time.monotonic(), seconds))
+
+    def mean(self, stage: str) -> Optional[float]:
+        """阶段平均耗时（无样本时返回 None）"""
+        with self._lock:
+            samples = self._samples.get(stage)
+            if not samples:
+                return None
+            return sum(v for _, v in samples) / len(samples)
+
+    def percentile(self, stage: str, q: float, max_age: Optional[float] = None) -> Optional[float]:
+        """
+        阶段耗时分位数
+
+        Args:
+            stage: 阶段（ocr / llm / total）
+            q: 分位（0-1）
+            max_age: 只统计最近 max_age 秒内的样本（负载回落后旧样本不再影响结果）
+
+        Returns:
+            分位数，无样本时返回 None
+        """
+        cutoff = time.monotonic() - max_age if max_age is not None else None
+        with self._lock:
+            values = sorted(
+                v for t, v in self._samples.get(stage, ())
+                if cutoff is None or t >= cutoff
+            )
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def service_time(self) -> Optional[float]:
+        """单次扫描的预计执行时间（OCR + LLM），无样本时返回 None"""
+        stages = [self.mean("ocr"), self.mean("llm")]
+        if all(s is None for s in stages):
+            return None
+        return sum(s for s in stages if s is not None)
+
+
+class LoadShedder:
+    """
+    基于排队延迟的准入判断
+
+    预计完成时间 = 排队等待 + 执行时间，其中排队等待按
+    (已接收扫描数 - 线程数 + 1) / 线程数 × 执行时间 估算。
+    还没有耗时样本时（刚启动）不做延迟判断，只检查数量上限。
+    """
+
+    def __init__(self, workers: int, max_inflight: int, default_budget: float, window: int = 50):
+        """
+        初始化负载保护
+
+        Args:
+            workers: 扫描线程数
+            max_inflight: 已接收扫描数上限（执行中 + 排队中）
+            default_budget: 请求未提供预算时的默认值（秒）
+            window: 耗时样本窗口大小
+        """
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.default_budget = default_budget
+        self.latency = LatencyEstimator(window)
+
+    def estimate(self, inflight: int) -> Optional[float]:
+        """
+        新请求的预计完成时间（秒）
+
+        Args:
+            inflight: 当前已接收的扫描数
+
+        Returns:
+            预计完成时间，无耗时样本时返回 None
+        """
+        service = self.latency.service_time()
+        if service is None:
+            return None
+        queued = max(0, inflight - self.workers + 1)
+        return queued / self.workers * service + service
+
+    def check(self, inflight: int, budget: Optional[float] = None) -> Optional[Dict]:
+        """
+        准入判断
+
+        Args:
+            inflight: 当前已接收的扫描数
+            budget: 客户端的等待预算（秒），为空时使用默认值
+
+        Returns:
+            允许时返回 None；拒绝时返回 {status, reason, retry_after, estimate}
+        """
+        if inflight >= self.max_inflight:
+            return {"status": 503, "reason": "capacity", "retry_after": 5, "estimate": None}
+
+        # 有空闲线程时不需要排队，即使预算偏紧也尝试执行
+        if inflight < self.workers:
+            return None
+
+        estimate = self.estimate(inflight)
+        budget = budget if budget is not None else self.default_budget
+        if estimate is None or estimate <= budget:
+            return None
+
+        # 队列按执行速度消化，超出预算的部分大约就是需要等待的时间
+        retry_after = max(1, math.ceil(estimate - budget))
+        return {"status": 429, "reason": "latency", "retry_after": retry_after, "estimate": estimate}
+
+
+class DegradationController:
+    """
+    自动降级等级（带滞后）
+
+    - 过载（排队数或最近 p95 超过阈值）时立即升到 1 级，之后每隔 interval 秒再升一级
+    - 负载回落到阈值的 recover_ratio 以下并保持 interval 秒后降一级，直到恢复为 0
+    - 介于两者之间时保持当前等级，避免在阈值附近来回切换
+    """
+
+    def __init__(
+        self,
+        latency: LatencyEstimator,
+        queue_threshold: int,
+        p95_threshold: float,
+        max_level: int = 3,
+        interval: float = 10.0,
+        recover_ratio: float = 0.5,
+        p95_window: float = 60.0,
+    ):
+        """
+        初始化降级控制
+
+        Args:
+            latency: 耗时统计（与负载保护共用）
+            queue_threshold: 排队扫描数阈值
+            p95_threshold: 端到端耗时 p95 阈值（秒）
+            max_level: 最高降级等级（0 表示关闭降级）
+            interval: 相邻两次升级 / 降级的最小间隔（秒）
+            recover_ratio: 恢复阈值占过载阈值的比例
+            p95_window: p95 只统计最近多少秒内的扫描
+        """
+        self.latency = latency
+        self.queue_threshold = queue_threshold
+        self.p95_threshold = p95_threshold
+        self.max_level = max_level
+        self.interval = interval
+        self.recover_ratio = recover_ratio
+        self.p95_window = p95_window
+
+        self.level = 0
+        self._changed_at = 0.0
+        self._calm_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, queue_depth: int) -> int:
+        """
+        根据当前负载更新降级等级
+
+        Args:
+            queue_depth: 排队中的扫描数
+
+        Returns:
+            当前降级等级
+        """
+        if self.max_level <= 0:
+            return 0
+
+        now = time.monotonic()
+        p95 = self.latency.percentile("total", 0.95, max_age=self.p95_window)
+
+        overloaded = queue_depth >= self.queue_threshold or (
+            p95 is not None and p95 >= self.p95_threshold
+        )
+        relaxed = queue_depth <= self.queue_threshold * self.recover_ratio and (
+            p95 is None or p95 <= self.p95_threshold * self.recover_ratio
+        )
+
+        with self._lock:
+            if overloaded:
+                self._calm_since = None
+                if self.level < self.max_level and (self.level == 0 or now - self._changed_at >= self.interval):
+                    self.level += 1
+                    self._changed_at = now
+            elif relaxed and self.level > 0:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.interval:
+                    self.level -= 1
+                    self._changed_at = now
+                    self._calm_since = now
+            else:
+                self._calm_since = None
+            return self.level
@@ -0,0 +1,170 @@
+"""
+扫描结果缓存 - 按图片内容哈希 + 扫描参数缓存完整识别结果
+内存 LRU + TTL，可选 SQLite 持久化（进程重启后仍可命中）
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class ScanCache:
+    """
+    扫描结果缓存
+
+    同一张截图的重试（客户端超时后重新点击）直接返回缓存结果，
+    跳过 OCR 和 LLM。只缓存成功的结果。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600,
+        db_path: Optional[str] = None,
+        max_db_entries: int = 10000,
+    ):
+        """
+        初始化扫描缓存
+
+        Args:
+            max_entries: 内存中最多缓存的结果数（LRU 淘汰）
+            ttl: 缓存有效期（秒）
+            db_path: SQLite 数据库路径（为空时只使用内存缓存）
+            max_db_entries: SQLite 中最多保留的结果数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (写入时间, 结果)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scan_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_scan_cache_created ON scan_cache(created)"
+            )
+            self._db.commit()
+            logger.info(f"Scan cache persisted to {db_path}")
+
+    @staticmethod
+    def make_key(image_bytes: bytes, idempotency_key: Optional[str] = None, **params) -> str:
+        """
+        生成缓存键：图片内容 SHA-256 + 扫描参数
+
+        Args:
+            image_bytes: 图片字节
+            idempotency_key: 客户端提供的幂等键（提供时代替图片哈希）
+            **params: 影响结果的扫描参数（model, skip_items, clean_text 等）
+
+        Returns:
+            缓存键
+        """
+        if idempotency_key:
+            digest = "idem-" + hashlib.sha256(idempotency_key.encode()).hexdigest()
+        else:
+            digest = hashlib.sha256(image_bytes).hexdigest()
+        param_str = json.dumps(params, sort_keys=True)
+        return f"{digest}:{hashlib.sha256(param_str.encode()).hexdigest()[:16]}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存（内存未命中时查询 SQLite）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的结果，未命中返回 None
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM scan_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = json.loads(row[0]), row[1]
+                    if now - created <= self.ttl:
+                        self._store(key, value, created)
+                        self.hits += 1
+                        return value
+                    self._db.execute("DELETE FROM scan_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 扫描结果（需可 JSON 序列化）
+        """
+        now = time.time()
+
+        with self._lock:
+            self._store(key, value, now)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO scan_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now),
+                )
+                # 清理过期和超出容量的记录
+                self._db.execute("DELETE FROM scan_cache WHERE created < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM scan_cache WHERE key NOT IN "
+                    "(SELECT key FROM scan_cache ORDER BY created DESC LIMIT ?)",
+                    (self.max_db_entries,),
+                )
+                self._db.commit()
+
+    def _store(self, key: str, value: Dict[str, Any], created: float):
+        """写入内存 LRU（调用方持有锁）"""
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """缓存命中统计"""
+        with self._lock:
+            return {
+                "cache_hits": float(self.hits),
+                "cache_misses": float(self.misses),
+            }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM scan_cache")
+                self._db.commit()
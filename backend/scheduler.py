@@ -0,0 +1,191 @@
+"""
+LLM 调用调度器 - 所有请求共用一组 worker 线程
+按优先级分道，同一优先级内按请求轮转，避免长订单列表占满 LLM 并发
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Deque, Callable, Any, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# 优先级（从高到低）
+PRIORITY_INTERACTIVE = "interactive"   # 交互式请求（/scan/fast，快捷指令）
+PRIORITY_STANDARD = "standard"         # 标准请求（/scan、/scan/stream）
+PRIORITY_BULK = "bulk"                 # 批量导入（/scan/batch、/jobs）
+
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BULK)
+
+# 工作项：(future, fn, args, kwargs)
+_WorkItem = Tuple[Future, Callable[..., Any], tuple, dict]
+
+
+class WorkGroup:
+    """
+    一个请求的工作项集合
+
+    同一个 WorkGroup 内的工作项按提交顺序执行；
+    不同 WorkGroup 之间每次只取一个工作项，轮转执行。
+    """
+
+    def __init__(self, scheduler: "FairScheduler", priority: str):
+        self._scheduler = scheduler
+        self.priority = priority
+        self.pending: Deque[_WorkItem] = deque()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        提交工作项
+
+        Args:
+            fn: 要执行的函数（在调度器线程中调用）
+            *args, **kwargs: 函数参数
+
+        Returns:
+            Future（与 concurrent.futures 用法相同）
+        """
+        future = Future()
+        self._scheduler._enqueue(self, (future, fn, args, kwargs))
+        return future
+
+    def cancel(self):
+        """取消所有尚未开始的工作项"""
+        self._scheduler._cancel(self)
+
+
+class FairScheduler:
+    """
+    公平调度器
+
+    - 严格优先级：有高优先级工作项时先执行高优先级
+    - 同一优先级内按请求轮转：20 个订单的列表与 1 个订单的请求交替取工作项，
+      小请求的等待时间取决于同时在执行的请求数，而不是前面排队的订单总数
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        thread_name_prefix: str = "kapi-llm",
+        capacity: Optional[Callable[[], int]] = None,
+    ):
+        """
+        初始化调度器
+
+        Args:
+            workers: worker 线程数（即 LLM 最大并发数）
+            thread_name_prefix: 线程名前缀
+            capacity: 当前允许同时执行的工作项数（可选，如自适应并发上限）；
+                超出部分留在调度器队列中按优先级等待，而不是占着线程在下游排队
+        """
+        self.workers = workers
+        self.capacity = capacity
+        self._queues: Dict[str, Deque[WorkGroup]] = {p: deque() for p in PRIORITIES}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._active = 0
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{thread_name_prefix}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        logger.info(f"FairScheduler started with {workers} workers")
+
+    def group(self, priority: str = PRIORITY_STANDARD) -> WorkGroup:
+        """
+        为一个请求创建工作组
+
+        Args:
+            priority: 优先级（interactive / standard / bulk）
+
+        Returns:
+            工作组
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        return WorkGroup(self, priority)
+
+    def _enqueue(self, group: WorkGroup, item: _WorkItem):
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            if not group.pending:
+                self._queues[group.priority].append(group)
+            group.pending.append(item)
+            self._cond.notify()
+
+    def _cancel(self, group: WorkGroup):
+        with self._cond:
+            for future, _, _, _ in group.pending:
+                future.cancel()
+            group.pending.clear()
+            try:
+                self._queues[group.priority].remove(group)
+            except ValueError:
+                pass
+
+    def _next(self):
+        """取下一个工作项（调用方持有锁），没有或已达到并发上限时返回 None"""
+        if self.capacity is not None and self._active >= max(1, self.capacity()):
+            return None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if queue:
+                group = queue.popleft()
+                item = group.pending.popleft()
+                if group.pending:
+                    queue.append(group)
+                return item
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._next()
+                while item is None and not self._shutdown:
+                    self._cond.wait()
+                    item = self._next()
+                if item is None:
+                    return
+                self._active += 1
+
+            future, fn, args, kwargs = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    if self.capacity is not None:
+                        # 有名额空出（并发上限也可能刚刚上调），唤醒等待的 worker
+                        self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """各优先级排队的工作项数和执行中的工作项数"""
+        with self._cond:
+            stats = {
+                priority: sum(len(g.pending) for g in queue)
+                for priority, queue in self._queues.items()
+            }
+            stats["active"] = self._active
+            return stats
+
+    def shutdown(self):
+        """停止调度器（取消所有尚未开始的工作项）"""
+        with self._cond:
+            self._shutdown = True
+            for queue in self._queues.values():
+                for group in queue:
+                    for future, _, _, _ in group.pending:
+                        future.cancel()
+                    group.pending.clear()
+                queue.clear()
+            self._cond.notify_all()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+批量扫描压测 - 对比逐张 /scan 与 /scan/batch 流水线的吞吐量
+
+用法:
+    python3 scripts/bench_batch.py <图片...> [--url URL] [-r 重复次数] [--skip-items]
+
+每次上传都会在图片末尾追加随机字节（解码器会忽略），避免命中扫描缓存。
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import httpx
+
+
+def salted(data: bytes) -> bytes:
+    """在图片末尾追加随机字节，改变内容哈希但不影响解码"""
+    return data + os.urandom(16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比逐张扫描与批量流水线的吞吐量")
+    parser.add_argument("images", type=Path, nargs="+", help="测试图片")
+    parser.add_argument("--url", default="http://localhost:8080", help="服务地址")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="图片列表重复次数")
+    parser.add_argument("--skip-items", action="store_true", help="跳过商品明细")
+    args = parser.parse_args()
+
+    images = [(p.name, p.read_bytes()) for p in args.images] * args.repeat
+    data = {"skip_items": str(args.skip_items).lower()}
+
+    with httpx.Client(base_url=args.url, timeout=600) as client:
+        client.get("/health")
+
+        # 逐张扫描
+        t = time.perf_counter()
+        sequential_ok = 0
+        for name, content in images:
+            resp = client.post("/scan", files={"file": (name, salted(content))}, data=data)
+            sequential_ok += resp.status_code == 200 and resp.json()["success"]
+        sequential = time.perf_counter() - t
+
+        # 批量流水线
+        t = time.perf_counter()
+        resp = client.post(
+            "/scan/batch",
+            files=[("files", (name, salted(content))) for name, content in images],
+            data=data,
+        )
+        batch = time.perf_counter() - t
+        resp.raise_for_status()
+        body = resp.json()
+
+    n = len(images)
+    batch_ok = sum(r["success"] for r in body["results"])
+
+    print(f"图片数: {n}")
+    print(f"逐张 /scan:       {sequential:7.2f}s  {n / sequential * 60:7.1f} 张/分钟  成功 {sequential_ok}/{n}")
+    print(f"批量 /scan/batch: {batch:7.2f}s  {n / batch * 60:7.1f} 张/分钟  成功 {batch_ok}/{n}")
+    print(f"加速比: {sequential / batch:.2f}x")
+
+    print("\n每张图片阶段耗时（批量）:")
+    for i, r in enumerate(body["results"], 1):
+        perf = r.get("performance") or {}
+        stages = "  ".join(f"{k}={v:.2f}" for k, v in perf.items() if k != "cache_hit")
+        print(f"  {i:>3}. {stages}")
+
+    if sequential_ok != n or batch_ok != n:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
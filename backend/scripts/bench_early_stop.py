@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+提前停止压测 - 摘要模式所需字段输出完整后立即停止生成，统计每次调用节省的解码时间
+
+用法:
+    python3 scripts/bench_early_stop.py <图片或 .txt 文本...> [--model 模型] [--clean] [-r 重复次数]
+
+每个输入先做一次 OCR，之后用摘要模式（skip_items）的提示词交替调用（不经过服务，不使用 LLM 响应缓存）：
+    - full:  流式生成到模型自然结束（与未启用提前停止时的输出相同）
+    - early: seller_name / total_amount 完整输出后关闭连接
+输出两种方式的平均耗时、输出块数（约等于 token 数）、每次调用节省的时间，
+以及两种方式提取的商家名 + 金额一致的次数。
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from statistics import mean
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "engine"))
+
+from src.llm import OllamaEngine
+from src.llm.json_stream import JSONFieldScanner
+from src.parser.fast_parser import FastBillParser
+
+
+def load_text(path: Path, clean: bool) -> str:
+    """读取 OCR 文本（.txt 直接读取，图片做一次 OCR）"""
+    if path.suffix == ".txt":
+        return path.read_text(encoding="utf-8")
+
+    from src.ocr import RapidOCREngine, clean_ocr_text
+    result = RapidOCREngine(use_angle_cls=False, print_verbose=False).extract_text(str(path))
+    if not result.success:
+        sys.exit(f"OCR 失败: {result.error_message}")
+    return clean_ocr_text(result.text) if clean else result.text
+
+
+def call(llm: OllamaEngine, prompt: str, max_tokens: int, early: bool):
+    """
+    流式调用一次
+
+    Returns:
+        (耗时, 输出块数, (商家名, 金额))
+    """
+    scanner = JSONFieldScanner(FastBillParser.SUMMARY_FIELDS)
+    chunks = []
+
+    def stop(content: str) -> bool:
+        chunks.append(content)
+        done = scanner.feed(content)
+        return early and done
+
+    t = time.perf_counter()
+    llm.generate(prompt, temperature=0.0, max_tokens=max_tokens, json_mode=True, stop=stop)
+    elapsed = time.perf_counter() - t
+
+    values = scanner.result()
+    return elapsed, len(chunks), (values.get("seller_name"), values.get("total_amount"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计摘要模式提前停止节省的解码时间")
+    parser.add_argument("inputs", type=Path, nargs="+", help="账单截图或 OCR 文本（.txt）")
+    parser.add_argument("--model", default="qwen2.5:3b", help="LLM 模型")
+    parser.add_argument("--clean", action="store_true", help="清理 OCR 文本")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每个输入的重复次数")
+    args = parser.parse_args()
+
+    llm = OllamaEngine(model_name=args.model, temperature=0.0)
+    summary_parser = FastBillParser(llm, skip_items=True)
+
+    runs = {"full": [], "early": []}
+    same = total = 0
+    try:
+        for path in args.inputs:
+            prompt, max_tokens = summary_parser._build_prompt(load_text(path, args.clean))
+            prompt = llm._json_prompt(prompt)
+            # 预热一次（加载模型、建立连接），不计入统计
+            call(llm, prompt, max_tokens, early=False)
+
+            for _ in range(args.repeat):
+                # 交替执行，避免后端负载变化只影响其中一种方式
+                full = call(llm, prompt, max_tokens, early=False)
+                early = call(llm, prompt, max_tokens, early=True)
+                runs["full"].append(full)
+                runs["early"].append(early)
+                same += full[2] == early[2]
+                total += 1
+    finally:
+        llm.close()
+
+    print(f"输入 {len(args.inputs)} 个, 每个重复 {args.repeat} 次, 模型 {args.model}\n")
+    print(f"{'方式':<6} {'平均耗时':>8} {'平均输出块数':>12}")
+    for mode, samples in runs.items():
+        print(f"{mode:<6} {mean(s[0] for s in samples):>7.3f}s {mean(s[1] for s in samples):>12.1f}")
+
+    saved = [f[0] - e[0] for f, e in zip(runs["full"], runs["early"])]
+    saved_chunks = [f[1] - e[1] for f, e in zip(runs["full"], runs["early"])]
+    print(f"\n每次调用节省: {mean(saved) * 1000:.0f}ms（{mean(saved_chunks):.1f} 个输出块）")
+    print(f"结果一致（商家名 + 金额）: {same}/{total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+订单列表批量解析压测 - 对比逐个订单调用 LLM 与多个订单共用一个提示词
+
+用法:
+    python3 scripts/bench_order_batch.py <图片或 .txt 文本> [--model 模型] [--skip-items] [-r 重复次数]
+
+图片先做一次 OCR，之后两种模式解析同一段文本（不经过服务，不使用 LLM 响应缓存）：
+    - per-block: 每个订单一次 LLM 调用（当前默认）
+    - batched:   按 token 预算分组，每组一次 LLM 调用，缺失的订单单独重试
+两种模式都按订单并发（异步接口），输出耗时、LLM 调用次数、输入 / 输出 token 数，
+以及两种模式结果（商家名 + 金额）一致的订单数。
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "engine"))
+
+from src.llm import OllamaEngine
+from src.parser.multi_order_parser import MultiOrderParser
+
+
+def load_text(path: Path, clean: bool) -> str:
+    """读取 OCR 文本（.txt 直接读取，图片做一次 OCR）"""
+    if path.suffix == ".txt":
+        return path.read_text(encoding="utf-8")
+
+    from src.ocr import RapidOCREngine, clean_ocr_text
+    result = RapidOCREngine(use_angle_cls=False, print_verbose=False).extract_text(str(path))
+    if not result.success:
+        sys.exit(f"OCR 失败: {result.error_message}")
+    return clean_ocr_text(result.text) if clean else result.text
+
+
+async def run(llm: OllamaEngine, text: str, batch: bool, skip_items: bool, repeat: int):
+    """
+    解析 repeat 次，返回 (结果, 统计, 耗时, 用量增量)
+    """
+    parser = MultiOrderParser(llm, skip_items=skip_items, batch=batch)
+    before = llm.usage_stats()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        results, stats = await parser.aparse_order_list(text)
+    elapsed = time.perf_counter() - t
+    after = llm.usage_stats()
+    usage = {k: after[k] - before[k] for k in after}
+    return results, stats, elapsed, usage
+
+
+def summary(result):
+    """用于比较的关键字段"""
+    if not result.success or not result.invoice:
+        return None
+    return result.invoice.seller_name, result.invoice.total_amount
+
+
+async def main_async(args):
+    text = load_text(args.input, args.clean)
+    llm = OllamaEngine(model_name=args.model, temperature=0.0, max_tokens=512)
+
+    try:
+        runs = {}
+        for mode, batch in (("per-block", False), ("batched", True)):
+            runs[mode] = await run(llm, text, batch, args.skip_items, args.repeat)
+    finally:
+        await llm.aclose()
+
+    total_orders = runs["per-block"][1]["total_orders"]
+    if total_orders < 2:
+        print("⚠️  文本中不足 2 个订单，批量模式与逐个解析相同")
+
+    print(f"订单数: {total_orders}, 重复 {args.repeat} 次, 模型 {args.model}\n")
+    print(f"{'模式':<10} {'耗时':>8} {'LLM 调用':>8} {'输入 token':>10} {'输出 token':>10} {'成功':>6}")
+    for mode, (results, _, elapsed, usage) in runs.items():
+        ok = sum(r.success for r in results)
+        print(
+            f"{mode:<10} {elapsed:>7.2f}s {usage['requests']:>8} "
+            f"{usage['prompt_tokens']:>10} {usage['completion_tokens']:>10} {ok:>3}/{len(results)}"
+        )
+
+    per_block, batched = runs["per-block"], runs["batched"]
+    same = sum(
+        summary(a) == summary(b) and summary(a) is not None
+        for a, b in zip(per_block[0], batched[0])
+    )
+    tokens = lambda usage: usage["prompt_tokens"] + usage["completion_tokens"]
+    print(f"\n结果一致（商家名 + 金额）: {same}/{len(per_block[0])}")
+    if tokens(per_block[3]):
+        print(f"token 总量: {tokens(batched[3]) / tokens(per_block[3]):.0%}（批量 / 逐个）")
+    print(f"耗时: {batched[2] / per_block[2]:.0%}（批量 / 逐个）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比订单列表的逐个解析与批量解析")
+    parser.add_argument("input", type=Path, help="订单列表截图或 OCR 文本（.txt）")
+    parser.add_argument("--model", default="qwen2.5:3b", help="LLM 模型")
+    parser.add_argument("--skip-items", action="store_true", help="跳过商品明细")
+    parser.add_argument("--clean", action="store_true", help="清理 OCR 文本")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="重复次数")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+并发检查脚本 - 验证扫描期间 /health 延迟保持平稳
+
+用法:
+    python3 scripts/check_concurrency.py <图片路径> [--url URL] [-n 并发数] [--max-p95 秒]
+
+步骤:
+  1. 空闲状态下采样 /health 延迟（基线）
+  2. 同时发起 N 个 /scan 请求，期间持续采样 /health 延迟
+  3. 对比两组延迟，负载下 p95 超过阈值时以非零状态码退出
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import httpx
+
+
+def percentile(values, p):
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(int(len(values) * p), len(values) - 1)
+    return values[idx]
+
+
+async def sample_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float = 0.1):
+    """持续采样 /health 延迟，直到 stop 被设置"""
+    latencies = []
+    while not stop.is_set():
+        t = time.perf_counter()
+        resp = await client.get("/health")
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - t)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def scan_once(client: httpx.AsyncClient, image_path: Path, endpoint: str):
+    """发起一次扫描请求，返回 (状态码, 耗时)"""
+    t = time.perf_counter()
+    with open(image_path, "rb") as f:
+        resp = await client.post(endpoint, files={"file": (image_path.name, f.read())})
+    return resp.status_code, time.perf_counter() - t
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="检查扫描负载下 /health 的延迟")
+    parser.add_argument("image", type=Path, help="测试图片")
+    parser.add_argument("--url", default="http://localhost:8080", help="服务地址")
+    parser.add_argument("-n", "--concurrency", type=int, default=8, help="并发扫描数")
+    parser.add_argument("--endpoint", default="/scan/fast", help="扫描接口")
+    parser.add_argument("--max-p95", type=float, default=0.2, help="负载下 /health p95 上限（秒）")
+    args = parser.parse_args()
+
+    if not args.image.exists():
+        print(f"错误: 文件不存在 - {args.image}")
+        sys.exit(1)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+        # 基线（同时完成引擎初始化）
+        await client.get("/health")
+        stop = asyncio.Event()
+        baseline_task = asyncio.create_task(sample_health(client, stop))
+        await asyncio.sleep(2)
+        stop.set()
+        baseline = await baseline_task
+
+        # 负载
+        stop = asyncio.Event()
+        loaded_task = asyncio.create_task(sample_health(client, stop))
+        t = time.perf_counter()
+        scans = await asyncio.gather(
+            *(scan_once(client, args.image, args.endpoint) for _ in range(args.concurrency))
+        )
+        wall = time.perf_counter() - t
+        stop.set()
+        loaded = await loaded_task
+
+    statuses = [status for status, _ in scans]
+    durations = [d for _, d in scans]
+
+    print(f"并发扫描: {args.concurrency} 个, 总耗时 {wall:.2f}s, "
+          f"单次 p50 {percentile(durations, 0.5):.2f}s, 状态码 {sorted(set(statuses))}")
+    print(f"/health 基线:  n={len(baseline):<4} p50={percentile(baseline, 0.5) * 1000:7.1f}ms "
+          f"p95={percentile(baseline, 0.95) * 1000:7.1f}ms max={max(baseline) * 1000:7.1f}ms")
+    print(f"/health 负载:  n={len(loaded):<4} p50={percentile(loaded, 0.5) * 1000:7.1f}ms "
+          f"p95={percentile(loaded, 0.95) * 1000:7.1f}ms max={max(loaded) * 1000:7.1f}ms")
+
+    if percentile(loaded, 0.95) > args.max_p95:
+        print(f"✗ 负载下 /health p95 超过 {args.max_p95 * 1000:.0f}ms，事件循环可能被阻塞")
+        sys.exit(1)
+    print("✓ /health 延迟保持平稳")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
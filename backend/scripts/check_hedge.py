@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+对冲请求检查 - 偶发慢调用时 generate_json(hedge=True) 的长尾延迟
+
+用法:
+    python3 scripts/check_hedge.py [-n 调用数] [-c 并发数] [--slow-ratio 慢调用比例]
+
+不需要 Ollama / vLLM：在本地启动一个 OpenAI 兼容的替身服务（支持流式输出），
+每次调用 0.05s，其中 slow-ratio 比例的调用需要 1s。分别以 hedge=False / hedge=True
+调用 n 次（相同提示词，关闭缓存），对比 p50 / p99 耗时，并检查：
+    - 对冲后 p99 明显降低
+    - 对冲次数和对冲调用先返回的次数被统计，被取消的调用不会继续占用替身服务
+任一检查失败时以非零状态退出。
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "engine"))
+
+from src.llm import OllamaEngine, configure_limiters
+
+
+class StandIn:
+    """OpenAI 兼容接口的替身服务（chat.completions，流式输出按 10 个块均匀发送）"""
+
+    def __init__(self, delay: float, slow_delay: float, slow_ratio: float):
+        self.delay = delay
+        self.slow_delay = slow_delay
+        self.slow_ratio = slow_ratio
+        self.calls = 0
+        self.aborted = 0  # 客户端提前关闭的流式调用数
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with stand_in._lock:
+                    stand_in.calls += 1
+                    slow = stand_in._random.random() < stand_in.slow_ratio
+                delay = stand_in.slow_delay if slow else stand_in.delay
+                content = json.dumps({"seller_name": "stand-in", "total_amount": 1.0})
+
+                if not request.get("stream"):
+                    time.sleep(delay)
+                    self._send_json({
+                        "id": "stand-in", "object": "chat.completion", "created": 0,
+                        "model": request["model"],
+                        "choices": [{
+                            "index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": content},
+                        }],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                size = -(-len(content) // 10)
+                try:
+                    for i in range(0, len(content), size):
+                        time.sleep(delay / 10)
+                        self._send_chunk(request["model"], {"content": content[i:i + size]})
+                    self._send_chunk(request["model"], {}, finish_reason="stop")
+                    self._write(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    with stand_in._lock:
+                        stand_in.aborted += 1
+                    self.close_connection = True
+
+            def _send_json(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, model, delta, finish_reason=None):
+                chunk = {
+                    "id": "stand-in", "object": "chat.completion.chunk", "created": 0, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                self._write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+            def _write(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(engine: OllamaEngine, hedge: bool, calls: int, concurrency: int):
+    """并发调用 calls 次，返回各次耗时"""
+    def one(_):
+        start = time.perf_counter()
+        engine.generate_json("ping json", max_tokens=64, hedge=hedge)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查对冲请求对长尾延迟的影响")
+    parser.add_argument("-n", "--calls", type=int, default=300, help="每轮调用数")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发调用数")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="慢调用比例")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    # 替身服务的慢调用与负载无关，固定并发上限，避免自适应限制把慢调用当作拥塞而收紧并发
+    configure_limiters(initial=16, min_limit=16, max_limit=16)
+    stand_in = StandIn(delay=0.05, slow_delay=1.0, slow_ratio=args.slow_ratio)
+    engine = OllamaEngine(model_name="stand-in", api_base=stand_in.api_base, structured_output=False)
+
+    failed = []
+    results = {}
+    for hedge in (False, True):
+        latencies = run(engine, hedge, args.calls, args.concurrency)
+        results[hedge] = latencies
+        print(f"hedge={str(hedge):<5}  p50 {percentile(latencies, 0.5) * 1000:>6.0f}ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:>6.0f}ms")
+
+    stats = engine.usage_stats()
+    time.sleep(0.5)
+    engine.close()
+    print(f"\n对冲 {stats['hedges']} 次，对冲调用先返回 {stats['hedge_wins']} 次，"
+          f"替身服务收到 {stand_in.calls} 次调用，提前关闭 {stand_in.aborted} 次")
+
+    if not percentile(results[True], 0.99) < percentile(results[False], 0.99) * 0.6:
+        failed.append("对冲后 p99 没有明显降低")
+    if stats["hedges"] == 0 or stats["hedge_wins"] == 0:
+        failed.append("对冲次数 / 对冲调用先返回的次数未统计")
+    if stats["hedges"] > args.calls * max(0.3, args.slow_ratio * 4):
+        failed.append("对冲次数过多")
+    if stand_in.aborted == 0:
+        failed.append("被取消的调用没有关闭连接")
+
+    print()
+    if failed:
+        for reason in failed:
+            print(f"❌ {reason}")
+        sys.exit(1)
+    print("✅ 对冲请求降低了长尾延迟")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+自适应并发检查 - LLM 并发上限应收敛到后端实际并行度附近
+
+用法:
+    python3 scripts/check_limiter.py [-p 后端并行度...] [--call 单次 LLM 耗时] [-d 持续秒数]
+
+不需要 OCR / LLM：用 sleep 模拟一个并行度为 P 的后端
+（同时执行的调用数超过 P 后，每次调用的耗时按 并发数 / P 线性变长），
+16 个线程持续调用，统计后半段的并发上限。
+
+后半段平均并发上限不在 [P × 0.5, P × 2]（受上限 16 截断）范围内时以非零状态退出。
+"""
+
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "engine"))
+
+from src.llm.limiter import AdaptiveLimiter
+
+MAX_LIMIT = 16
+
+
+def run(parallelism: int, call: float, duration: float):
+    """
+    模拟后端上运行 AIMD 限制器
+
+    Returns:
+        (并发上限采样列表, 完成的调用数)
+    """
+    limiter = AdaptiveLimiter(name=f"p{parallelism}", initial=4, max_limit=MAX_LIMIT)
+    lock = threading.Lock()
+    state = {"active": 0, "calls": 0}
+    stop = time.monotonic() + duration
+
+    def fake_llm_call():
+        with lock:
+            state["active"] += 1
+            n = state["active"]
+        time.sleep(call * max(1.0, n / parallelism))
+        with lock:
+            state["active"] -= 1
+            state["calls"] += 1
+
+    def worker():
+        while time.monotonic() < stop:
+            with limiter.slot():
+                fake_llm_call()
+
+    threads = [threading.Thread(target=worker) for _ in range(MAX_LIMIT)]
+    for thread in threads:
+        thread.start()
+
+    samples = []
+    while any(thread.is_alive() for thread in threads):
+        samples.append(limiter.limit)
+        time.sleep(0.05)
+
+    return samples, state["calls"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查 LLM 自适应并发上限是否收敛")
+    parser.add_argument("-p", "--parallelism", type=int, nargs="+", default=[2, 6, 12], help="模拟后端的并行度")
+    parser.add_argument("--call", type=float, default=0.05, help="无排队时单次 LLM 调用耗时（秒）")
+    parser.add_argument("-d", "--duration", type=float, default=8.0, help="每种并行度运行的秒数")
+    args = parser.parse_args()
+
+    print(f"{'并行度':<6} {'后半段平均上限':>14} {'最小':>4} {'最大':>4} {'吞吐':>10}")
+    failed = []
+    for parallelism in args.parallelism:
+        samples, calls = run(parallelism, args.call, args.duration)
+        tail = samples[len(samples) // 2:]
+        mean = sum(tail) / len(tail)
+        print(f"{parallelism:<6} {mean:>14.1f} {min(tail):>4} {max(tail):>4} {calls / args.duration:>8.1f}/s")
+
+        low, high = parallelism * 0.5, min(MAX_LIMIT, parallelism * 2)
+        if not low <= mean <= high:
+            failed.append(str(parallelism))
+
+    print()
+    if failed:
+        print(f"❌ 并发上限未收敛: 并行度 {', '.join(failed)}")
+        sys.exit(1)
+    print("✅ 并发上限收敛到后端并行度附近")
+
+
+if __name__ == "__main__":
+    main()
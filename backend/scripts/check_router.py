@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+多地址 LLM 路由检查 - 负载分配、故障摘除和自动恢复
+
+用法:
+    python3 scripts/check_router.py [-c 并发数] [-d 每阶段秒数]
+
+不需要 Ollama / vLLM：在本地启动 3 个 OpenAI 兼容的替身服务
+（fast 每次调用 0.05s，slow 0.2s，flaky 0.05s），RouterEngine 分三个阶段持续调用：
+    1. 正常：fast 收到的调用应明显多于 slow
+    2. flaky 返回 500：所有调用仍应成功（换地址重试），flaky 被摘除
+    3. flaky 恢复：摘除到期后 flaky 重新收到调用
+    4. flaky 无响应（带截止时间的流式调用）：flaky 超过 attempt_timeout 没有输出即被摘除，
+       调用在截止时间之前换地址完成，不应出现 DeadlineExceeded
+任一检查失败时以非零状态退出。
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "engine"))
+
+from src.llm import RouterEngine, OllamaEngine, Deadline
+
+
+class StandIn:
+    """OpenAI 兼容接口的替身服务（chat.completions，流式调用一次输出全部内容）"""
+
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+        self.failing = False
+        self.hanging = False   # 收到调用后长时间不输出
+        self.calls = 0
+        self._lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with stand_in._lock:
+                    stand_in.calls += 1
+                time.sleep(30.0 if stand_in.hanging else stand_in.delay)
+
+                if request.get("stream") and not stand_in.failing:
+                    self._send_stream(request["model"])
+                    return
+                if stand_in.failing:
+                    status, body = 500, {"error": {"message": "stand-in failure"}}
+                else:
+                    status, body = 200, {
+                        "id": "stand-in", "object": "chat.completion", "created": 0,
+                        "model": request["model"],
+                        "choices": [{
+                            "index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": json.dumps({"endpoint": stand_in.name})},
+                        }],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                    }
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model):
+                content = json.dumps({"endpoint": stand_in.name})
+                chunks = [
+                    {"choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]},
+                    {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+                ]
+                body = "".join(
+                    "data: " + json.dumps({"id": "stand-in", "object": "chat.completion.chunk",
+                                           "created": 0, "model": model, **chunk}) + "\n\n"
+                    for chunk in chunks
+                ) + "data: [DONE]\n\n"
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def take_calls(self) -> int:
+        """本阶段收到的调用数（取出后清零）"""
+        with self._lock:
+            calls, self.calls = self.calls, 0
+            return calls
+
+
+def run_phase(router: RouterEngine, concurrency: int, duration: float, budget: float = None):
+    """
+    并发调用 duration 秒
+
+    Args:
+        budget: 每次调用的截止时间（秒，可选，有截止时间时为流式调用）
+
+    Returns:
+        (成功数, 失败数)
+    """
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < stop:
+            try:
+                deadline = Deadline.after(budget) if budget is not None else None
+                router.generate_json("ping json", max_tokens=8, deadline=deadline)
+                key = "ok"
+            except Exception:
+                key = "failed"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["ok"], counts["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查多地址 LLM 路由的负载分配和故障摘除")
+    parser.add_argument("-c", "--concurrency", type=int, default=6, help="并发调用数")
+    parser.add_argument("-d", "--duration", type=float, default=3.0, help="每个阶段的秒数")
+    args = parser.parse_args()
+
+    stand_ins = [StandIn("fast", 0.05), StandIn("slow", 0.2), StandIn("flaky", 0.05)]
+    fast, slow, flaky = stand_ins
+    router = RouterEngine(
+        [s.api_base for s in stand_ins],
+        model_name="stand-in",
+        engine_cls=OllamaEngine,
+        eject_seconds=1.0,
+        max_eject_seconds=1.0,
+        attempt_timeout=0.5,
+    )
+
+    failed = []
+
+    def report(phase: str, ok: int, errors: int):
+        calls = {s.name: s.take_calls() for s in stand_ins}
+        print(f"{phase:<8} 成功 {ok:>5}  失败 {errors:>3}  " + "  ".join(f"{k} {v:>4}" for k, v in calls.items()))
+        return calls
+
+    print(f"并发 {args.concurrency}, 每阶段 {args.duration:.0f}s\n")
+
+    calls = report("正常", *run_phase(router, args.concurrency, args.duration))
+    if not calls["fast"] > calls["slow"] * 1.5:
+        failed.append("fast 地址收到的调用没有明显多于 slow")
+
+    flaky.failing = True
+    ok, errors = run_phase(router, args.concurrency, args.duration)
+    calls = report("故障", ok, errors)
+    if errors:
+        failed.append(f"flaky 故障期间有 {errors} 次调用失败")
+    if calls["flaky"] > max(10, calls["fast"] // 5):
+        failed.append("flaky 故障后未被摘除")
+
+    flaky.failing = False
+    time.sleep(1.0)
+    calls = report("恢复", *run_phase(router, args.concurrency, args.duration))
+    if calls["flaky"] == 0:
+        failed.append("flaky 恢复后未重新收到调用")
+
+    flaky.hanging = True
+    ejections = router.endpoint_stats()[2]["ejections"]
+    ok, errors = run_phase(router, args.concurrency, args.duration, budget=3.0)
+    report("无响应", ok, errors)
+    if errors:
+        failed.append(f"flaky 无响应期间有 {errors} 次调用失败（未在截止时间之前换地址）")
+    if router.endpoint_stats()[2]["ejections"] == ejections:
+        failed.append("flaky 无响应时未被摘除")
+
+    print()
+    for stats in router.endpoint_stats():
+        latency = f"{stats['latency'] * 1000:.0f}ms" if stats["latency"] is not None else "-"
+        print(f"{stats['api_base']}  耗时 {latency:>6}  摘除 {stats['ejections']} 次")
+    router.close()
+
+    print()
+    if failed:
+        for reason in failed:
+            print(f"❌ {reason}")
+        sys.exit(1)
+    print("✅ 负载分配、故障摘除（含无响应地址）和自动恢复正常")
+
+
+if __name__ == "__main__":
+    main()
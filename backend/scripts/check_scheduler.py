@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+调度公平性检查 - 长订单列表执行期间，小请求的延迟应保持有界
+
+用法:
+    python3 scripts/check_scheduler.py [-n 长列表订单数] [-w worker 数] [--call 单次 LLM 耗时]
+
+不需要 OCR / LLM：用 sleep 模拟一次 LLM 调用，分别在以下两种调度方式下测量：
+    - fifo: 所有请求共用一个先进先出线程池（小请求排在长列表的全部订单之后）
+    - fair: FairScheduler（按请求轮转 + 优先级）
+
+fair 模式下小请求延迟超过上限（留 50% 余量）时以非零状态退出：
+    standard 小请求 <= (同时执行的请求数 + 1) × 单次耗时
+    interactive 小请求 <= 2 × 单次耗时
+"""
+
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BULK
+
+
+def fake_llm_call(seconds: float):
+    time.sleep(seconds)
+
+
+def run(mode: str, orders: int, workers: int, call: float):
+    """
+    一个长列表（bulk）+ 一个长列表（standard）在执行时，依次发起小请求
+
+    Returns:
+        {priority: [延迟...]}
+    """
+    latencies = {PRIORITY_STANDARD: [], PRIORITY_INTERACTIVE: []}
+
+    if mode == "fair":
+        scheduler = FairScheduler(workers=workers, thread_name_prefix="check")
+        submit = lambda priority, fn, *args: scheduler.group(priority).submit(fn, *args)
+
+        def submit_list(priority, n):
+            group = scheduler.group(priority)
+            return [group.submit(fake_llm_call, call) for _ in range(n)]
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda priority, fn, *args: executor.submit(fn, *args)
+
+        def submit_list(priority, n):
+            return [executor.submit(fake_llm_call, call) for _ in range(n)]
+
+    # 两个长列表同时在执行
+    big = submit_list(PRIORITY_BULK, orders) + submit_list(PRIORITY_STANDARD, orders)
+
+    def small_request(priority):
+        t = time.perf_counter()
+        submit(priority, fake_llm_call, call).result()
+        latencies[priority].append(time.perf_counter() - t)
+
+    threads = []
+    for i in range(6):
+        priority = PRIORITY_INTERACTIVE if i % 2 else PRIORITY_STANDARD
+        thread = threading.Thread(target=small_request, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(call * 1.5)
+
+    for thread in threads:
+        thread.join()
+    for future in big:
+        future.result()
+
+    if mode == "fair":
+        scheduler.shutdown()
+    else:
+        executor.shutdown()
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查长订单列表执行期间小请求的延迟")
+    parser.add_argument("-n", "--orders", type=int, default=20, help="长列表订单数")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="LLM worker 数")
+    parser.add_argument("--call", type=float, default=0.2, help="单次 LLM 调用耗时（秒）")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("fifo", "fair"):
+        results[mode] = run(mode, args.orders, args.workers, args.call)
+
+    print(f"长列表: 2 × {args.orders} 订单, workers={args.workers}, 单次调用 {args.call:.2f}s\n")
+    print(f"{'模式':<6} {'优先级':<12} {'最大延迟':>8} {'平均延迟':>8}")
+    for mode, latencies in results.items():
+        for priority, values in latencies.items():
+            print(f"{mode:<6} {priority:<12} {max(values):>7.2f}s {sum(values) / len(values):>7.2f}s")
+
+    # 同时执行的请求：2 个长列表 + 1 个小请求，每轮最多等待一次调用
+    bounds = {
+        PRIORITY_STANDARD: (2 + 1) * args.call * 1.5,
+        PRIORITY_INTERACTIVE: 2 * args.call * 1.5,
+    }
+    failed = [
+        priority for priority, values in results["fair"].items()
+        if max(values) > bounds[priority]
+    ]
+
+    print()
+    if failed:
+        print(f"❌ 小请求延迟超出上限: {', '.join(failed)}")
+        sys.exit(1)
+    print("✅ 长列表执行期间小请求延迟有界")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,29 +5,46 @@ KAPI HTTP Server - 基于 FastAPI 的账单识别服务
 
 import sys
 import os
+import json
 import time
+import asyncio
 import logging
-import tempfile
-import uuid
+import contextvars
+from contextlib import contextmanager, asynccontextmanager, ExitStack
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel, Field
+from starlette.routing import Match
+from starlette.datastructures import Headers
 
 # 添加 engine 到路径
 ENGINE_PATH = Path(__file__).parent.parent / "engine"
 sys.path.insert(0, str(ENGINE_PATH))
 
 from src.ocr import RapidOCREngine, clean_ocr_text
-from src.llm import OllamaEngine
+from src.llm import (
+    OllamaEngine, RouterEngine, Deadline, DeadlineExceeded, LLMCache,
+    configure_limiters, all_limiters, configure_breakers, all_breakers,
+)
 from src.parser.smart_parser import SmartParser
 from src.parser.multi_order_parser import MultiOrderParser
 from src.parser.fast_parser import FastBillParser
 from src.parser.bank_parser import BankStatementParser
+from src.parser.rule_engine import default_rule_engine
+from src.parser.merchant_templates import MerchantTemplateStore
+
+from scan_cache import ScanCache
+from engine_registry import EngineRegistry
+from job_queue import JobStore
+from metrics import MetricsRegistry
+from load_shedding import LoadShedder, DegradationController
+from scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BULK
 
 # 配置日志
 logging.basicConfig(
@@ -49,6 +66,40 @@ class ScanResponse(BaseModel):
     data: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     performance: Optional[Dict[str, float]] = None
+    degradation_level: int = 0  # 负载过高时自动降级的等级（0 表示未降级）
+
+
+class BatchScanResponse(BaseModel):
+    """批量扫描响应"""
+    success: bool
+    results: List[ScanResponse]
+    performance: Optional[Dict[str, float]] = None
+
+
+class JobSubmitResponse(BaseModel):
+    """任务提交响应"""
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatusResponse(BaseModel):
+    """任务状态响应"""
+    job_id: str
+    status: str
+    created_at: float
+    updated_at: float
+    stages: Dict[str, float]
+    progress: Dict[str, Any]
+    partial: List[Dict[str, Any]]
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class ReadyResponse(BaseModel):
+    """就绪检查响应"""
+    status: str
+    components: Dict[str, Any]
 
 
 class HealthResponse(BaseModel):
@@ -60,14 +111,135 @@ class HealthResponse(BaseModel):
 
 # ==================== FastAPI 应用 ====================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动预热和任务 worker；退出时停止 worker、关闭线程池并释放引擎"""
+    for job_id in job_store.pending():
+        job_queue.put_nowait(job_id)
+
+    # 预热在后台执行，服务立即可以响应 /health，预热完成前 /ready 返回 503
+    background = [asyncio.create_task(warm_up()), asyncio.create_task(degradation_monitor())]
+    background += [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    logger.info(f"Started {JOB_WORKERS} job workers")
+
+    yield
+
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    scan_executor.shutdown(wait=False, cancel_futures=True)
+    llm_scheduler.shutdown()
+    engines.close()
+    if llm_cache is not None:
+        llm_cache.close()
+    if merchant_templates is not None:
+        merchant_templates.close()
+
+
 app = FastAPI(
     title="KAPI - 智能账单识别服务",
     description="基于 OCR + LLM 的账单识别 HTTP API",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+class MetricsMiddleware:
+    """
+    请求指标中间件（纯 ASGI，流式响应结束时才计为完成）
+
+    endpoint 标签使用路由模板（/jobs/{job_id}），避免标签基数随任务 ID 增长；
+    同时写入 current_endpoint，供扫描阶段指标使用。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = route_template(scope)
+        current_endpoint.set(endpoint)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+        t = time.time()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+            REQUEST_SECONDS.observe(time.time() - t, endpoint=endpoint)
+            REQUESTS_TOTAL.inc(endpoint=endpoint, status=str(status["code"]))
+
+
+def route_template(scope) -> str:
+    """匹配请求对应的路由模板（未匹配时返回 other）"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "other"
+
+
+class LoadSheddingMiddleware:
+    """
+    负载保护中间件（在读取请求体之前执行）
+
+    同步扫描接口预计无法在客户端预算（X-Request-Budget 请求头，秒）内完成时
+    直接返回 429 + Retry-After，超过扫描数上限时返回 503。
+    拒绝不读取上传内容、不执行 OCR，客户端可以立即重试其他实例。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in SHED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = parse_budget(Headers(scope=scope).get("x-request-budget"))
+        decision = load_shedder.check(inflight_scans, budget)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        REQUESTS_SHED.inc(endpoint=scope["path"], reason=decision["reason"])
+        if decision["reason"] == "latency":
+            detail = f"预计耗时 {decision['estimate']:.1f}s 超出预算，请稍后重试"
+        else:
+            detail = "服务繁忙，请稍后重试"
+        logger.warning(f"Scan shed ({decision['reason']}): {inflight_scans} scans in flight")
+
+        response = JSONResponse(
+            status_code=decision["status"],
+            content={"detail": detail},
+            headers={"Retry-After": str(decision["retry_after"])},
+        )
+        await response(scope, receive, send)
+
+
+def parse_budget(value: Optional[str]) -> Optional[float]:
+    """解析请求预算（秒），缺失或无效时返回 None（使用默认预算）"""
+    try:
+        budget = float(value) if value else None
+    except ValueError:
+        return None
+    return budget if budget and budget > 0 else None
+
+
+# 中间件从内到外：负载保护 -> 指标 -> CORS（拒绝的请求也计入指标并带有 CORS 头）
+app.add_middleware(LoadSheddingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # 配置 CORS
 app.add_middleware(
     CORSMiddleware,
@@ -79,61 +251,433 @@ app.add_middleware(
 
 # ==================== 全局变量 ====================
 
-# 临时文件目录
-TEMP_DIR = Path(tempfile.gettempdir()) / "kapi_uploads"
-TEMP_DIR.mkdir(exist_ok=True, parents=True)
+# 上传限制
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_BATCH_FILES = int(os.getenv("KAPI_MAX_BATCH_FILES", "50"))
 
 # 默认配置
 DEFAULT_MODEL = "qwen2.5:3b"
 FAST_MODEL = "qwen2.5:1.5b"
 
-# 引擎实例（延迟初始化）
-ocr_engine = None
-llm_engine = None
+# 扫描线程池配置（可通过环境变量覆盖）
+# SCAN_WORKERS: 同时执行的扫描数（OCR + LLM 流水线）
+# MAX_PENDING_SCANS: 线程池满时允许排队的扫描数，超出后直接拒绝
+SCAN_WORKERS = int(os.getenv("KAPI_SCAN_WORKERS", "4"))
+MAX_PENDING_SCANS = int(os.getenv("KAPI_MAX_PENDING_SCANS", "16"))
+
+# 负载保护：预计完成时间（排队 + 执行，按最近的阶段耗时估算）超过客户端预算时直接拒绝
+# KAPI_REQUEST_BUDGET: 请求未携带 X-Request-Budget 时的默认预算（秒），与客户端超时保持一致
+REQUEST_BUDGET = float(os.getenv("KAPI_REQUEST_BUDGET", "120"))
+SHED_PATHS = {"/scan", "/scan/raw", "/scan/fast", "/scan/stream", "/scan/batch"}
+load_shedder = LoadShedder(
+    workers=SCAN_WORKERS,
+    max_inflight=SCAN_WORKERS + MAX_PENDING_SCANS,
+    default_budget=REQUEST_BUDGET,
+)
+
+# 自动降级：排队扫描数或最近 p95 超过阈值时，标准扫描逐级降级（带滞后，负载回落后自动恢复）
+#   1 级：清理并格式化文本（clean_text + format_text，提示词更短）
+#   2 级：+ 使用小模型（FAST_MODEL）
+#   3 级：+ 跳过商品明细（skip_items）
+# KAPI_DEGRADE_MAX_LEVEL=0 关闭自动降级
+degradation = DegradationController(
+    load_shedder.latency,
+    queue_threshold=int(os.getenv("KAPI_DEGRADE_QUEUE_DEPTH", "4")),
+    p95_threshold=float(os.getenv("KAPI_DEGRADE_P95", "30")),
+    max_level=int(os.getenv("KAPI_DEGRADE_MAX_LEVEL", "3")),
+    interval=float(os.getenv("KAPI_DEGRADE_INTERVAL", "10")),
+)
 
+# 扫描线程池：scan_image 是同步阻塞调用，必须放到线程池中执行，避免阻塞事件循环
+scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="kapi-scan")
 
-# ==================== 工具函数 ====================
+# LLM 调度器：所有请求的 LLM 调用共用 LLM_WORKERS 个线程，
+# 按优先级（interactive > standard > bulk）分道，同一优先级内按请求轮转
+LLM_WORKERS = int(os.getenv("KAPI_LLM_WORKERS", "16"))
 
-def init_engines(model: str = DEFAULT_MODEL, use_angle_cls: bool = True):
-    """初始化 OCR 和 LLM 引擎"""
-    global ocr_engine, llm_engine
+# 订单列表批量解析：多个订单放进同一个提示词（规则部分只发送一次），默认关闭
+ORDER_BATCH = os.getenv("KAPI_ORDER_BATCH", "0").lower() in ("1", "true", "yes")
 
-    if ocr_engine is None:
-        ocr_engine = RapidOCREngine(use_angle_cls=use_angle_cls, print_verbose=False)
-        logger.info("OCR engine initialized")
+# 对冲请求：interactive（/scan/fast）的订单调用超过最近耗时的 p90 仍未返回时再发一个相同的调用，
+# 取先返回的结果（降低长尾延迟，代价是少量重复调用），默认关闭
+LLM_HEDGE = os.getenv("KAPI_LLM_HEDGE", "0").lower() in ("1", "true", "yes")
 
-    if llm_engine is None or llm_engine.model_name != model:
-        llm_engine = OllamaEngine(model_name=model, temperature=0.0, max_tokens=512)
-        logger.info(f"LLM engine initialized: {model}")
 
-    return ocr_engine, llm_engine
+def hedge_enabled(priority: str) -> bool:
+    """该优先级的 LLM 调用是否对冲"""
+    return LLM_HEDGE and priority == PRIORITY_INTERACTIVE
+
+
+# 规则优先：瑞幸、麦当劳、美团外卖、淘宝等高频模板先用规则提取，字段齐全时不调用 LLM，
+# 缺少的字段用精简提示词交给 LLM 补充，默认开启
+RULES_FIRST = os.getenv("KAPI_RULES_FIRST", "1").lower() in ("1", "true", "yes")
+
+# 不调用 LLM 的解析方式（规则模板提取、学习的商家模板、银行流水规则解析）
+LLM_FREE_PARSE_MODES = ("rules", "learned", "bank_statement")
+
+
+# LLM 自适应并发限制（每个后端 + 模型一个，AIMD）：实际发往后端的并发数在
+# [KAPI_LLM_CONCURRENCY_MIN, LLM_WORKERS] 之间按观测到的调用耗时自动调整
+LLM_CONCURRENCY_INITIAL = int(os.getenv("KAPI_LLM_CONCURRENCY_INITIAL", "4"))
+configure_limiters(
+    initial=LLM_CONCURRENCY_INITIAL,
+    min_limit=int(os.getenv("KAPI_LLM_CONCURRENCY_MIN", "1")),
+    max_limit=LLM_WORKERS,
+)
+
+# LLM 熔断（每个后端地址 + 模型一个）：最近的调用中出错或耗时超过 KAPI_LLM_BREAKER_SLOW 秒的比例
+# 达到 KAPI_LLM_BREAKER_RATIO 时熔断，熔断期间调用立即失败，解析器降级为规则提取（置信度较低），
+# KAPI_LLM_BREAKER_OPEN 秒后放行一个探测调用，成功后恢复
+configure_breakers(
+    failure_ratio=float(os.getenv("KAPI_LLM_BREAKER_RATIO", "0.5")),
+    slow_seconds=float(os.getenv("KAPI_LLM_BREAKER_SLOW", "20")),
+    open_seconds=float(os.getenv("KAPI_LLM_BREAKER_OPEN", "10")),
+)
+
+
+# 最近多少秒内有调用的后端 + 模型计入调度器的并发上限
+LLM_CAPACITY_WINDOW = 60.0
+
+
+def llm_capacity() -> int:
+    """
+    调度器同时执行的工作项上限：最近有流量的各后端 + 模型当前并发上限之和
+
+    空闲的模型（预热过的、客户端偶尔指定的）和已不再使用的后端地址不计入，
+    否则它们的上限会叠加到实际在用的后端上，工作项都挤到下游限制器中排队；
+    都没有流量时取单个限制器的最大上限
+    """
+    limiters = list(all_limiters().values())
+    if not limiters:
+        return LLM_CONCURRENCY_INITIAL
+    active = [limiter.limit for limiter in limiters if limiter.active(LLM_CAPACITY_WINDOW)]
+    if not active:
+        return min(LLM_WORKERS, max(limiter.limit for limiter in limiters))
+    return min(LLM_WORKERS, sum(active))
+
+
+llm_scheduler = FairScheduler(workers=LLM_WORKERS, capacity=llm_capacity)
+
+# 当前已接收的扫描数（执行中 + 排队中），仅在事件循环线程中读写
+inflight_scans = 0
+
+# 扫描结果缓存（按图片哈希 + 扫描参数），KAPI_SCAN_CACHE_DB 为空时只使用内存
+scan_cache = ScanCache(
+    max_entries=int(os.getenv("KAPI_SCAN_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("KAPI_SCAN_CACHE_TTL", "3600")),
+    db_path=os.getenv("KAPI_SCAN_CACHE_DB") or None,
+)
+
+# 影响识别结果的扫描参数（参与缓存键计算）
+CACHE_KEY_PARAMS = ("model", "skip_items", "clean_text", "format_text", "use_angle_cls")
+
+# 异步任务（POST /jobs）：本地 worker 从进程内队列取任务，KAPI_JOB_DB 设置后任务持久化到 SQLite
+JOB_WORKERS = int(os.getenv("KAPI_JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("KAPI_MAX_QUEUED_JOBS", "100"))
+job_store = JobStore(
+    db_path=os.getenv("KAPI_JOB_DB") or None,
+    ttl=float(os.getenv("KAPI_JOB_TTL", "3600")),
+)
+job_queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+# 启动预热：OCR 引擎执行一次推理，每个模型发送一个极短的提示词使其常驻
+# KAPI_WARMUP_MODELS 为逗号分隔的模型列表（为空时不预热 LLM）
+WARMUP_MODELS = [m.strip() for m in os.getenv("KAPI_WARMUP_MODELS", f"{DEFAULT_MODEL},{FAST_MODEL}").split(",") if m.strip()]
+
+# 允许客户端指定的模型（每个模型一个常驻引擎和一组监控标签，不接受任意模型名）
+# KAPI_ALLOWED_MODELS 为逗号分隔的模型列表，为空时为默认模型、快速模型和预热模型
+ALLOWED_MODELS = set(
+    m.strip() for m in os.getenv("KAPI_ALLOWED_MODELS", "").split(",") if m.strip()
+) or {DEFAULT_MODEL, FAST_MODEL, *WARMUP_MODELS}
+
+WARMUP_RETRY_INTERVAL = float(os.getenv("KAPI_WARMUP_RETRY_INTERVAL", "10"))
+
+# 预热状态：组件名 -> {"ready": bool, "seconds" / "error"}，仅在事件循环线程中读写
+warmup_status: Dict[str, Dict[str, Any]] = {}
+
+# 进行中的扫描（缓存键 -> Task），相同请求合并到同一次计算，仅在事件循环线程中读写
+inflight_tasks: Dict[str, asyncio.Task] = {}
+# 进行中扫描的截止时间和等待者数量，所有等待者断开后取消扫描
+inflight_deadlines: Dict[str, Deadline] = {}
+scan_waiters: Dict[str, int] = {}
+
+# 客户端断开检测间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# 引擎注册表：每个 (model, backend) 一个常驻 LLM 引擎，每种 OCR 配置一个常驻 OCR 引擎
+# KAPI_LLM_BACKEND: ollama / vllm；KAPI_LLM_API_BASE 为空时使用各后端默认地址，
+# 多个地址用逗号分隔时按负载分发（RouterEngine），故障地址自动摘除和恢复；
+# KAPI_LLM_ATTEMPT_TIMEOUT: 多地址时单个地址多久没有输出视为无响应（秒），摘除并换地址重试
+LLM_BACKEND = os.getenv("KAPI_LLM_BACKEND", "ollama")
+
+# 约束解码：解析器传入的 JSON Schema 通过 Ollama format / vLLM guided_json 约束输出，
+# 后端版本不支持时设为 0（只使用 JSON 模式）
+LLM_STRUCTURED_OUTPUT = os.getenv("KAPI_LLM_STRUCTURED_OUTPUT", "1").lower() in ("1", "true", "yes")
+
+# LLM 响应缓存（相同提示词的 temperature=0 调用直接返回上次结果），KAPI_LLM_CACHE_SIZE=0 时关闭
+# KAPI_LLM_CACHE_DB 为空时只使用内存；修改 KAPI_LLM_CACHE_VERSION 使旧记录全部失效
+LLM_CACHE_SIZE = int(os.getenv("KAPI_LLM_CACHE_SIZE", "1024"))
+llm_cache = LLMCache(
+    max_entries=LLM_CACHE_SIZE,
+    db_path=os.getenv("KAPI_LLM_CACHE_DB") or None,
+    max_db_bytes=int(float(os.getenv("KAPI_LLM_CACHE_DB_MB", "64")) * 1024 * 1024),
+    version=os.getenv("KAPI_LLM_CACHE_VERSION", ""),
+) if LLM_CACHE_SIZE > 0 else None
+
+# 学习的商家模板（LLM 解析过的商家之后直接用模板解析），KAPI_MERCHANT_TEMPLATES=0 时关闭
+# KAPI_MERCHANT_TEMPLATES_DB 为空时只保存在内存中
+MERCHANT_TEMPLATES_SIZE = int(os.getenv("KAPI_MERCHANT_TEMPLATES", "10000"))
+merchant_templates = MerchantTemplateStore(
+    max_entries=MERCHANT_TEMPLATES_SIZE,
+    db_path=os.getenv("KAPI_MERCHANT_TEMPLATES_DB") or None,
+) if MERCHANT_TEMPLATES_SIZE > 0 else None
+
+engines = EngineRegistry(
+    backend=LLM_BACKEND,
+    api_base=os.getenv("KAPI_LLM_API_BASE") or None,
+    temperature=0.0,
+    max_tokens=512,
+    cache=llm_cache,
+    structured_output=LLM_STRUCTURED_OUTPUT,
+    attempt_timeout=float(os.getenv("KAPI_LLM_ATTEMPT_TIMEOUT", "30")),
+)
+
+# ==================== 监控指标 ====================
+
+# 当前请求的路由模板（由 MetricsMiddleware 设置，扫描阶段指标按接口区分）
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("kapi_endpoint", default="other")
+
+# 导出的扫描阶段耗时（performance 中的其余字段为标志位和统计值）
+SCAN_STAGES = ("ocr_wait", "ocr", "detect_type", "split", "parse_wait", "parse", "total")
+
+metrics = MetricsRegistry()
+
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    "kapi_http_requests_in_flight", "正在处理的 HTTP 请求数", ("endpoint",))
+REQUESTS_TOTAL = metrics.counter(
+    "kapi_http_requests_total", "HTTP 请求数", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.histogram(
+    "kapi_http_request_seconds", "HTTP 请求耗时（秒）", ("endpoint",))
+SCAN_STAGE_SECONDS = metrics.histogram(
+    "kapi_scan_stage_seconds", "扫描各阶段耗时（秒）", ("endpoint", "model", "bill_type", "stage"))
+SCANS_TOTAL = metrics.counter(
+    "kapi_scans_total", "实际执行的扫描数（不含缓存命中）", ("endpoint", "model", "bill_type", "success"))
+SCANS_ABORTED = metrics.counter(
+    "kapi_scans_aborted_total", "因超时或客户端断开而中止的扫描数", ("reason",))
+SCANS_DEGRADED = metrics.counter(
+    "kapi_scans_degraded_total", "被自动降级的扫描请求数", ("level",))
+SCANS_LLM_BYPASSED = metrics.counter(
+    "kapi_scans_llm_bypassed_total", "完全未调用 LLM 的扫描数（所有订单都由规则解析）",
+    ("endpoint", "model", "bill_type"))
+REQUESTS_SHED = metrics.counter(
+    "kapi_requests_shed_total", "负载保护拒绝的请求数", ("endpoint", "reason"))
+OCR_LINES = metrics.histogram(
+    "kapi_ocr_lines", "每张图片的 OCR 文本行数", buckets=(5, 10, 20, 40, 80, 160, 320))
+
+metrics.callback(
+    "kapi_scans_in_flight", "已接收的扫描数（执行中 + 排队中）",
+    lambda: {(): inflight_scans})
+metrics.callback(
+    "kapi_scan_executor_queue_depth", "扫描线程池中等待执行的任务数",
+    lambda: {(): scan_executor._work_queue.qsize()})
+metrics.callback(
+    "kapi_scan_estimated_seconds", "新扫描请求的预计完成时间（排队 + 执行）",
+    lambda: {(): load_shedder.estimate(inflight_scans) or 0.0})
+metrics.callback(
+    "kapi_degradation_level", "当前自动降级等级",
+    lambda: {(): degradation.level})
+metrics.callback(
+    "kapi_llm_scheduler_pending", "LLM 调度器中排队的工作项数",
+    lambda: {(p,): n for p, n in llm_scheduler.stats().items() if p != "active"}, ("priority",))
+metrics.callback(
+    "kapi_llm_scheduler_active", "LLM 调度器中执行中的工作项数",
+    lambda: {(): llm_scheduler.stats()["active"]})
+metrics.callback(
+    "kapi_job_queue_depth", "排队中的异步任务数",
+    lambda: {(): job_queue.qsize()})
+
+
+def llm_usage(field: str) -> Callable[[], Dict[tuple, float]]:
+    """按 (backend, model) 汇总 LLM 引擎的用量统计"""
+    def collect():
+        return {(e.backend, e.model_name): e.usage_stats()[field] for e in engines.llm_engines()}
+    return collect
+
+
+def llm_endpoints(field: str) -> Callable[[], Dict[tuple, float]]:
+    """多地址路由时各地址的状态（单地址引擎不输出）"""
+    def collect():
+        values: Dict[tuple, float] = {}
+        for e in engines.llm_engines():
+            if isinstance(e, RouterEngine):
+                for endpoint in e.endpoint_stats():
+                    values[(e.backend, e.model_name, endpoint["api_base"])] = float(endpoint[field])
+        return values
+    return collect
+
+
+def llm_concurrency(field: str) -> Callable[[], Dict[tuple, float]]:
+    """按 (backend, model) 汇总 LLM 并发限制器状态（同一后端 + 模型部署多个地址时求和）"""
+    def collect():
+        values: Dict[tuple, float] = {}
+        for (backend, _, model), limiter in all_limiters().items():
+            values[(backend, model)] = values.get((backend, model), 0) + limiter.stats()[field]
+        return values
+    return collect
+
+
+def llm_breakers(field: str) -> Callable[[], Dict[tuple, float]]:
+    """各后端地址 + 模型的熔断器状态"""
+    def collect():
+        return {
+            (backend, model, api_base): float(breaker.stats()[field])
+            for (backend, api_base, model), breaker in all_breakers().items()
+        }
+    return collect
+
+
+def rule_extractions() -> Dict[tuple, float]:
+    """各规则模板的提取结果数（rules：不调用 LLM，residual：LLM 补充缺少的字段）"""
+    return {key: float(n) for key, n in default_rule_engine.stats().items()}
+
+
+def merchant_template_stats(field: str) -> Callable[[], Dict[tuple, float]]:
+    """商家模板库的统计（关闭时不输出）"""
+    def collect():
+        return {(): float(merchant_templates.stats()[field])} if merchant_templates else {}
+    return collect
+
+
+def llm_bypass_ratio() -> Dict[tuple, float]:
+    scans = SCANS_TOTAL.total()
+    return {(): SCANS_LLM_BYPASSED.total() / scans if scans else 0.0}
+
+
+def cache_hit_ratio() -> Dict[tuple, float]:
+    stats = scan_cache.stats()
+    lookups = stats["cache_hits"] + stats["cache_misses"]
+    return {(): stats["cache_hits"] / lookups if lookups else 0.0}
+
+
+metrics.callback(
+    "kapi_llm_requests_total", "LLM 调用次数",
+    llm_usage("requests"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_prompt_tokens_total", "LLM 输入 token 数",
+    llm_usage("prompt_tokens"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_completion_tokens_total", "LLM 输出 token 数",
+    llm_usage("completion_tokens"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_endpoint_healthy", "LLM 地址是否可用（1 可用，0 已摘除）",
+    llm_endpoints("healthy"), ("backend", "model", "endpoint"))
+metrics.callback(
+    "kapi_llm_endpoint_inflight", "各 LLM 地址正在执行的调用数",
+    llm_endpoints("inflight"), ("backend", "model", "endpoint"))
+metrics.callback(
+    "kapi_llm_endpoint_ejections_total", "LLM 地址因出错或超时被摘除的次数",
+    llm_endpoints("ejections"), ("backend", "model", "endpoint"), type="counter")
+metrics.callback(
+    "kapi_llm_circuit_state", "LLM 熔断器状态（0 正常，1 半开，2 熔断）",
+    llm_breakers("state"), ("backend", "model", "endpoint"))
+metrics.callback(
+    "kapi_llm_circuit_trips_total", "LLM 熔断次数",
+    llm_breakers("trips"), ("backend", "model", "endpoint"), type="counter")
+metrics.callback(
+    "kapi_llm_circuit_rejected_total", "熔断期间直接失败的 LLM 调用数（解析器降级为规则提取）",
+    llm_breakers("rejected"), ("backend", "model", "endpoint"), type="counter")
+metrics.callback(
+    "kapi_llm_hedges_total", "对冲的 LLM 调用数（超过最近耗时的 p90 后发出的重复调用）",
+    llm_usage("hedges"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_hedge_wins_total", "对冲调用先于原调用返回的次数",
+    llm_usage("hedge_wins"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_early_stops_total", "LLM 所需字段输出完整后提前停止生成的次数",
+    llm_usage("early_stops"), ("backend", "model"), type="counter")
+metrics.callback(
+    "kapi_llm_concurrency_limit", "LLM 自适应并发上限",
+    llm_concurrency("limit"), ("backend", "model"))
+metrics.callback(
+    "kapi_llm_inflight", "正在执行的 LLM 调用数",
+    llm_concurrency("inflight"), ("backend", "model"))
+metrics.callback(
+    "kapi_llm_cache_hits_total", "LLM 响应缓存命中次数",
+    lambda: {(): llm_cache.stats()["hits"]} if llm_cache else {}, type="counter")
+metrics.callback(
+    "kapi_llm_cache_misses_total", "LLM 响应缓存未命中次数",
+    lambda: {(): llm_cache.stats()["misses"]} if llm_cache else {}, type="counter")
+metrics.callback(
+    "kapi_rule_extractions_total", "规则模板的提取次数",
+    rule_extractions, ("template", "outcome"), type="counter")
+metrics.callback(
+    "kapi_merchant_templates", "学习的商家模板数", merchant_template_stats("entries"))
+metrics.callback(
+    "kapi_merchant_template_hits_total", "用商家模板解析（不调用 LLM）的次数",
+    merchant_template_stats("hits"), type="counter")
+metrics.callback(
+    "kapi_merchant_template_misses_total", "商家模板校验失败（回退到 LLM）的次数",
+    merchant_template_stats("misses"), type="counter")
+metrics.callback(
+    "kapi_merchant_templates_learned_total", "新学习或更新的商家模板数",
+    merchant_template_stats("learned"), type="counter")
+metrics.callback(
+    "kapi_scans_llm_bypassed_ratio", "完全未调用 LLM 的扫描占比（服务启动以来）", llm_bypass_ratio)
+metrics.callback(
+    "kapi_scan_cache_hits_total", "扫描缓存命中次数",
+    lambda: {(): scan_cache.stats()["cache_hits"]}, type="counter")
+metrics.callback(
+    "kapi_scan_cache_misses_total", "扫描缓存未命中次数",
+    lambda: {(): scan_cache.stats()["cache_misses"]}, type="counter")
+metrics.callback(
+    "kapi_scan_cache_hit_ratio", "扫描缓存命中率", cache_hit_ratio)
+
+
+# ==================== 工具函数 ====================
+
+def init_engines(model: str = DEFAULT_MODEL, use_angle_cls: bool = True):
+    """获取 OCR 和 LLM 引擎（首次使用时创建，之后复用）"""
+    return engines.get_ocr(use_angle_cls), engines.get_llm(model)
 
 
 def scan_image(
-    image_path: str,
+    image_path: Optional[str] = None,
     model: str = DEFAULT_MODEL,
     skip_items: bool = False,
     clean_text: bool = False,
     format_text: bool = False,
     concurrent: bool = False,
     use_angle_cls: bool = True,
+    image_bytes: Optional[bytes] = None,
+    on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = PRIORITY_STANDARD,
 ) -> Dict[str, Any]:
     """
     扫描图片
 
     Args:
-        image_path: 图片路径
+        image_path: 图片路径（与 image_bytes 二选一）
         model: LLM 模型
         skip_items: 跳过商品明细
         clean_text: 清理文本
         format_text: 格式化文本
         concurrent: 并发处理
         use_angle_cls: 角度检测
+        image_bytes: 图片字节流（上传接口使用，直接在内存中解码，不落盘）
+        on_progress: 进度回调 (事件, 数据)，在扫描线程中调用
+            - ocr: OCR 完成 {seconds, lines}
+            - detect: 类型检测完成 {seconds, type}
+            - split: 订单分离完成 {seconds, total_orders}
+            - order: 一个订单解析完成 {index, order}
+        deadline: 请求截止时间（到期或取消后不再发起新的 LLM 调用，进行中的调用被中断）
+        priority: LLM 调度优先级（interactive / standard / bulk）
 
     Returns:
         扫描结果字典
     """
-    if not Path(image_path).exists():
+    if image_bytes is None and (image_path is None or not Path(image_path).exists()):
         return {"success": False, "error": f"文件不存在: {image_path}"}
 
     times = {}
@@ -143,11 +687,10 @@ def scan_image(
         # 初始化引擎
         ocr, llm = init_engines(model, use_angle_cls)
 
-        # Step 1: OCR 提取
-        logger.info("OCR extracting...")
-        t = time.time()
-        ocr_result = ocr.extract_text(image_path)
-        times["ocr"] = time.time() - t
+        # Step 1: OCR 提取（排队期间可能已经超时）
+        if deadline is not None:
+            deadline.check("ocr")
+        ocr_result = extract_ocr_text(ocr, image_path, image_bytes, clean_text, format_text, times, on_progress)
 
         if not ocr_result.success:
             return {
@@ -156,84 +699,387 @@ def scan_image(
                 "performance": times,
             }
 
-        # 文本处理
-        if clean_text or format_text:
-            ocr_result.text = clean_ocr_text(ocr_result.text, format_text=format_text)
+        # Step 2-3: 检测类型 + 解析
+        result = parse_ocr_text(
+            ocr_result.text, llm, skip_items, concurrent, times, on_progress, deadline, priority
+        )
+        times["total"] = time.time() - total_start
+        return result
+
+    except DeadlineExceeded as e:
+        logger.warning(f"Scan aborted: {e}")
+        SCANS_ABORTED.inc(reason="disconnect" if deadline.cancelled else "deadline")
+        times["total"] = time.time() - total_start
+        return {
+            "success": False,
+            "error": str(e),
+            "performance": times,
+        }
+
+    except Exception as e:
+        logger.error(f"Scan failed: {e}", exc_info=True)
+        times["total"] = time.time() - total_start
+        return {
+            "success": False,
+            "error": str(e),
+            "performance": times,
+        }
+
+
+def extract_ocr_text(
+    ocr: RapidOCREngine,
+    image_path: Optional[str],
+    image_bytes: Optional[bytes],
+    clean_text: bool,
+    format_text: bool,
+    times: Dict[str, float],
+    on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+):
+    """
+    OCR 阶段：提取文本并按需清理
+
+    Args:
+        ocr: OCR 引擎
+        image_path: 图片路径（与 image_bytes 二选一）
+        image_bytes: 图片字节流
+        clean_text: 清理文本
+        format_text: 格式化文本
+        times: 阶段耗时（写入 ocr）
+        on_progress: 进度回调
+
+    Returns:
+        OCRResult
+    """
+    logger.info("OCR extracting...")
+    t = time.time()
+    if image_bytes is not None:
+        ocr_result = ocr.extract_from_bytes(image_bytes)
+    else:
+        ocr_result = ocr.extract_text(image_path)
+    times["ocr"] = time.time() - t
+
+    # 文本处理
+    if ocr_result.success and (clean_text or format_text):
+        ocr_result.text = clean_ocr_text(ocr_result.text, format_text=format_text)
+
+    if ocr_result.success:
+        OCR_LINES.observe(len(ocr_result.lines))
+        report_progress(on_progress, "ocr", seconds=times["ocr"], lines=len(ocr_result.lines))
+
+    return ocr_result
+
 
-        # Step 2: 检测类型
-        logger.info("Detecting type...")
+def parse_ocr_text(
+    text: str,
+    llm: OllamaEngine,
+    skip_items: bool,
+    concurrent: bool,
+    times: Dict[str, float],
+    on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = PRIORITY_STANDARD,
+) -> Dict[str, Any]:
+    """
+    LLM 阶段：检测单个订单 / 订单列表并解析
+
+    LLM 调用都提交到共享调度器（llm_scheduler），与其他请求公平分享 LLM 并发。
+
+    Args:
+        text: OCR 文本
+        llm: LLM 引擎
+        skip_items: 跳过商品明细
+        concurrent: 并发处理订单列表
+        times: 阶段耗时（写入 detect_type、split、parse）
+        on_progress: 进度回调
+        deadline: 请求截止时间（到期时抛出 DeadlineExceeded）
+        priority: LLM 调度优先级
+
+    Returns:
+        扫描结果字典（不含 total 耗时）
+    """
+    # Step 2: 检测类型
+    logger.info("Detecting type...")
+    t = time.time()
+    multi_parser = MultiOrderParser(llm, skip_items=skip_items)
+    is_list, list_conf = multi_parser.is_order_list(text)
+    times["detect_type"] = time.time() - t
+    report_progress(
+        on_progress, "detect",
+        seconds=times["detect_type"], type="order_list" if is_list else "single_order",
+    )
+
+    # Step 3: 解析
+    if is_list:
+        # 订单列表
+        logger.info(f"Order list detected (conf: {list_conf:.2%})")
         t = time.time()
-        multi_parser = MultiOrderParser(llm, skip_items=skip_items)
-        is_list, list_conf = multi_parser.is_order_list(ocr_result.text)
-        times["detect_type"] = time.time() - t
-
-        # Step 3: 解析
-        if is_list:
-            # 订单列表
-            logger.info(f"Order list detected (conf: {list_conf:.2%})")
-            t = time.time()
-            order_blocks = multi_parser.split_orders(ocr_result.text)
-            times["split"] = time.time() - t
+        order_blocks = multi_parser.split_orders(text)
+        times["split"] = time.time() - t
+        report_progress(on_progress, "split", seconds=times["split"], total_orders=len(order_blocks))
 
-            t = time.time()
-            is_bank = multi_parser._is_bank_statement_list(ocr_result.text)
+        t = time.time()
+        is_bank = multi_parser._is_bank_statement_list(text)
 
-            if concurrent and len(order_blocks) > 1:
-                results, stats = parse_concurrent(order_blocks, llm, is_bank, skip_items)
-            else:
-                results, stats = multi_parser.parse_order_list(ocr_result.text)
+        results, stats = parse_concurrent(
+            order_blocks, llm, is_bank, skip_items, on_progress, deadline,
+            priority=priority, parallel=concurrent,
+        )
 
-            times["parse"] = time.time() - t
-            times["total"] = time.time() - total_start
+        times["parse"] = time.time() - t
 
-            return {
-                "success": True,
-                "data": {
-                    "type": "order_list",
-                    "total_orders": stats["total_orders"],
-                    "stats": stats,
-                    "orders": [r.model_dump(exclude_none=True) if r.success else {"success": False, "error": r.error_message} for r in results],
-                },
-                "performance": times,
-            }
-        else:
-            # 单个订单
-            logger.info("Single order detected")
-            t = time.time()
-            parser = SmartParser(llm, skip_items=skip_items)
-            result = parser.parse(ocr_result.text)
-            times["parse"] = time.time() - t
-            times["total"] = time.time() - total_start
-
-            if not result.success:
-                return {
-                    "success": False,
-                    "error": result.error_message,
-                    "performance": times,
-                }
+        return {
+            "success": True,
+            "data": {
+                "type": "order_list",
+                "total_orders": stats["total_orders"],
+                "stats": stats,
+                "orders": [order_to_dict(r) for r in results],
+            },
+            "performance": times,
+        }
+    else:
+        # 单个订单
+        logger.info("Single order detected")
+        t = time.time()
+        parser = SmartParser(
+            llm, skip_items=skip_items, hedge=hedge_enabled(priority), rules_first=RULES_FIRST,
+            merchant_templates=merchant_templates,
+        )
+        result = llm_scheduler.group(priority).submit(parser.parse, text, deadline=deadline).result()
+        times["parse"] = time.time() - t
+
+        if result.success:
+            report_progress(on_progress, "order", index=0, order=order_to_dict(result))
 
+        if not result.success:
             return {
-                "success": True,
-                "data": {
-                    "type": "single_order",
-                    "invoice": result.invoice.model_dump(exclude_none=True) if result.invoice else None,
-                    "confidence": result.confidence,
-                },
+                "success": False,
+                "error": result.error_message,
                 "performance": times,
             }
 
-    except Exception as e:
-        logger.error(f"Scan failed: {e}", exc_info=True)
-        times["total"] = time.time() - total_start
         return {
-            "success": False,
-            "error": str(e),
+            "success": True,
+            "data": {
+                "type": "single_order",
+                "invoice": result.invoice.model_dump(exclude_none=True) if result.invoice else None,
+                "confidence": result.confidence,
+                "parse_mode": result.parse_mode,
+            },
             "performance": times,
         }
 
 
-def parse_concurrent(order_blocks, llm, is_bank, skip_items):
-    """并发解析订单"""
+@contextmanager
+def admit_scan():
+    """
+    扫描准入控制
+
+    超过 SCAN_WORKERS + MAX_PENDING_SCANS 时直接返回 503，
+    避免请求在队列中无限堆积直到客户端超时。
+    LoadSheddingMiddleware 在读取请求体之前已做过同样的检查，
+    这里是读完请求体后的最终检查（并发上传可能同时通过预检）。
+    """
+    global inflight_scans
+
+    if inflight_scans >= load_shedder.max_inflight:
+        logger.warning(f"Scan rejected: {inflight_scans} scans in flight")
+        raise HTTPException(
+            status_code=503,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "5"},
+        )
+
+    inflight_scans += 1
+    try:
+        yield
+    finally:
+        inflight_scans -= 1
+
+
+async def run_scan(**kwargs) -> Dict[str, Any]:
+    """
+    在扫描线程池中执行 scan_image（不阻塞事件循环）
+
+    Args:
+        **kwargs: 透传给 scan_image 的参数
+
+    Returns:
+        扫描结果字典
+    """
+    with admit_scan():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(scan_executor, partial(scan_image, **kwargs))
+
+
+async def run_batch_pipeline(
+    contents_list: List[bytes],
+    model: str,
+    skip_items: bool,
+    clean_text: bool,
+    format_text: bool,
+    concurrent: bool,
+    use_angle_cls: bool,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict[str, Any]]:
+    """
+    批量扫描流水线：第 k 张图片在 LLM 阶段时，第 k+1 张图片同时进行 OCR
+
+    - OCR 阶段（CPU 密集）按输入顺序逐张执行
+    - LLM 阶段最多占用 SCAN_WORKERS - 1 个线程，始终为 OCR 留出一个线程
+    - 结果按输入顺序返回，附带每张图片的阶段耗时
+
+    Returns:
+        扫描结果字典列表（与输入顺序一致）
+    """
+    loop = asyncio.get_running_loop()
+    ocr_gate = asyncio.Semaphore(1)
+    llm_gate = asyncio.Semaphore(max(1, SCAN_WORKERS - 1))
+
+    params = dict(model=model, skip_items=skip_items, clean_text=clean_text,
+                  format_text=format_text, use_angle_cls=use_angle_cls)
+
+    async def scan_one(contents: bytes) -> Dict[str, Any]:
+        times = {}
+        total_start = time.time()
+
+        cache_key = ScanCache.make_key(contents, **params)
+        cached = scan_cache.get(cache_key)
+        if cached is not None:
+            return {"success": True, "data": cached,
+                    "performance": {"total": time.time() - total_start, "cache_hit": 1.0}}
+
+        try:
+            # OCR 阶段
+            t = time.time()
+            async with ocr_gate:
+                times["ocr_wait"] = time.time() - t
+                if deadline is not None:
+                    deadline.check("ocr")
+                ocr, llm = await loop.run_in_executor(
+                    scan_executor, partial(init_engines, model, use_angle_cls)
+                )
+                ocr_result = await loop.run_in_executor(
+                    scan_executor,
+                    partial(extract_ocr_text, ocr, None, contents, clean_text, format_text, times),
+                )
+
+            if not ocr_result.success:
+                times["total"] = time.time() - total_start
+                return {"success": False, "error": f"OCR failed: {ocr_result.error_message}",
+                        "performance": times}
+
+            # LLM 阶段（复用 MultiOrderParser / SmartParser 分发）
+            t = time.time()
+            async with llm_gate:
+                times["parse_wait"] = time.time() - t
+                result = await loop.run_in_executor(
+                    scan_executor,
+                    partial(parse_ocr_text, ocr_result.text, llm, skip_items, concurrent, times,
+                            None, deadline, PRIORITY_BULK),
+                )
+
+        except DeadlineExceeded as e:
+            logger.warning(f"Batch scan aborted: {e}")
+            SCANS_ABORTED.inc(reason="disconnect" if deadline.cancelled else "deadline")
+            result = {"success": False, "error": str(e), "performance": times}
+        except Exception as e:
+            logger.error(f"Batch scan failed: {e}", exc_info=True)
+            result = {"success": False, "error": str(e), "performance": times}
+
+        times["total"] = time.time() - total_start
+        observe_scan(result, model)
+        times["cache_hit"] = 0.0
+        if result["success"]:
+            scan_cache.put(cache_key, result["data"])
+        return result
+
+    with admit_scan():
+        return await asyncio.gather(*(scan_one(contents) for contents in contents_list))
+
+
+def observe_scan(result: Dict[str, Any], model: str, endpoint: Optional[str] = None):
+    """
+    记录一次实际执行的扫描（阶段耗时直方图 + 计数）
+
+    Args:
+        result: scan_image 返回的结果字典
+        model: LLM 模型
+        endpoint: 接口（默认使用当前请求的路由模板）
+    """
+    endpoint = endpoint or current_endpoint.get()
+    bill_type = (result.get("data") or {}).get("type", "unknown")
+    labels = dict(endpoint=endpoint, model=model, bill_type=bill_type)
+
+    times = result.get("performance") or {}
+    load_shedder.latency.observe(times)
+    for stage in SCAN_STAGES:
+        if stage in times:
+            SCAN_STAGE_SECONDS.observe(times[stage], stage=stage, **labels)
+    SCANS_TOTAL.inc(success=str(bool(result.get("success"))).lower(), **labels)
+    if llm_bypassed(result):
+        SCANS_LLM_BYPASSED.inc(**labels)
+
+
+def llm_bypassed(result: Dict[str, Any]) -> bool:
+    """扫描是否完全未调用 LLM（单个订单或订单列表中所有订单都由规则解析，不含熔断降级）"""
+    if not result.get("success"):
+        return False
+    data = result.get("data") or {}
+    if data.get("type") == "single_order":
+        modes = [data.get("parse_mode")]
+    else:
+        modes = [order.get("parse_mode") for order in data.get("orders") or []]
+    return bool(modes) and all(mode in LLM_FREE_PARSE_MODES for mode in modes)
+
+
+def resolve_model(model: Optional[str]) -> str:
+    """
+    客户端指定的模型（为空时使用默认模型）
+
+    Raises:
+        HTTPException: 模型不在 ALLOWED_MODELS 中（400）
+    """
+    model = model or DEFAULT_MODEL
+    if model not in ALLOWED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的模型: {model}（可用: {', '.join(sorted(ALLOWED_MODELS))}）",
+        )
+    return model
+
+
+def report_progress(on_progress: Optional[Callable[[str, Dict[str, Any]], None]], event: str, **payload):
+    """上报扫描进度（未设置回调时忽略）"""
+    if on_progress is not None:
+        on_progress(event, payload)
+
+
+def order_to_dict(result) -> Dict[str, Any]:
+    """订单解析结果转换为响应字典"""
+    if result.success:
+        return result.model_dump(exclude_none=True)
+    return {"success": False, "error": result.error_message}
+
+
+def parse_concurrent(
+    order_blocks,
+    llm,
+    is_bank,
+    skip_items,
+    on_progress=None,
+    deadline=None,
+    priority=PRIORITY_STANDARD,
+    parallel=True,
+):
+    """
+    解析订单列表
+
+    订单块提交到共享调度器，与其他请求的订单轮转执行（长列表不会阻塞其他请求）。
+    每完成一个订单上报一次进度；截止时间到期后取消剩余订单。
+    parallel=False 时逐个提交，前一个订单完成后再提交下一个。
+    ORDER_BATCH 开启时按 token 预算把多个订单放进同一次 LLM 调用，每组是一个工作项。
+    """
     results = []
     stats = {
         "total_orders": len(order_blocks),
@@ -243,45 +1089,203 @@ def parse_concurrent(order_blocks, llm, is_bank, skip_items):
         "other": 0,
     }
 
-    def parse_one(block):
+    parser = None if is_bank else FastBillParser(
+        llm, skip_items=skip_items, hedge=hedge_enabled(priority), rules_first=RULES_FIRST,
+        merchant_templates=merchant_templates,
+    )
+    if parser is not None and ORDER_BATCH:
+        units = parser.plan_batches([block.text for block in order_blocks])
+    else:
+        units = [[i] for i in range(len(order_blocks))]
+
+    def parse_unit(indices):
+        if deadline is not None:
+            deadline.check("order")
+
         if is_bank:
-            parser = BankStatementParser()
-            result = parser.parse(block.text)
+            unit_results = [BankStatementParser().parse(order_blocks[i].text) for i in indices]
+        elif len(indices) == 1:
+            unit_results = [parser.parse(order_blocks[indices[0]].text, deadline=deadline)]
         else:
-            parser = FastBillParser(llm, skip_items=skip_items)
-            result = parser.parse(block.text)
+            unit_results = parser.parse_group([order_blocks[i].text for i in indices], deadline=deadline)
 
-        if result.success and result.invoice:
-            if not result.invoice.remarks:
-                result.invoice.remarks = f"订单状态: {block.status}"
-            else:
-                result.invoice.remarks += f" | 订单状态: {block.status}"
+        for i, result in zip(indices, unit_results):
+            status = order_blocks[i].status
+            if result.success and result.invoice:
+                if not result.invoice.remarks:
+                    result.invoice.remarks = f"订单状态: {status}"
+                else:
+                    result.invoice.remarks += f" | 订单状态: {status}"
 
-        return result, block.status
+        return [(i, result, order_blocks[i].status) for i, result in zip(indices, unit_results)]
 
-    with ThreadPoolExecutor(max_workers=min(len(order_blocks), 4)) as executor:
-        futures = {executor.submit(parse_one, block): i for i, block in enumerate(order_blocks)}
-        temp_results = [None] * len(order_blocks)
+    group = llm_scheduler.group(priority)
+    temp_results = [None] * len(order_blocks)
 
-        for future in as_completed(futures):
-            idx = futures[future]
-            result, status = future.result()
+    def collect(unit_results):
+        for idx, result, status in unit_results:
             temp_results[idx] = (result, status)
+            report_progress(on_progress, "order", index=idx, order=order_to_dict(result))
 
-        for result, status in temp_results:
-            results.append(result)
-            if status == "已完成":
-                stats["completed"] += 1
-            elif status == "已取消":
-                stats["cancelled"] += 1
-            elif status in ["进行中", "待支付", "待发货", "待收货"]:
-                stats["in_progress"] += 1
-            else:
-                stats["other"] += 1
+    try:
+        if parallel:
+            futures = [group.submit(parse_unit, indices) for indices in units]
+            for future in as_completed(futures):
+                collect(future.result())
+        else:
+            for indices in units:
+                collect(group.submit(parse_unit, indices).result())
+    except BaseException:
+        # 超时等情况下取消尚未开始的订单，进行中的 LLM 调用会在下一个数据块到达时中断
+        group.cancel()
+        raise
+
+    for result, status in temp_results:
+        results.append(result)
+        if status == "已完成":
+            stats["completed"] += 1
+        elif status == "已取消":
+            stats["cancelled"] += 1
+        elif status in ["进行中", "待支付", "待发货", "待收货"]:
+            stats["in_progress"] += 1
+        else:
+            stats["other"] += 1
 
     return results, stats
 
 
+def warm_up_ocr() -> float:
+    """预热 OCR 引擎（扫描接口默认关闭角度检测）"""
+    return engines.get_ocr(use_angle_cls=False).warm_up()
+
+
+def warm_up_llm(model: str) -> float:
+    """预热 LLM：发送极短的提示词，让后端加载模型（多地址时每个地址各一次）"""
+    t = time.time()
+    llm = engines.get_llm(model)
+    for engine in (llm.engines if isinstance(llm, RouterEngine) else [llm]):
+        engine.generate("hi", max_tokens=1)
+    return time.time() - t
+
+
+async def warm_up():
+    """
+    启动预热（后台任务）
+
+    所有组件并行预热，失败的组件每隔 WARMUP_RETRY_INTERVAL 秒重试，
+    全部成功后 /ready 返回 200。
+    """
+    pending = {"ocr": warm_up_ocr}
+    for model in WARMUP_MODELS:
+        pending[f"llm:{model}"] = partial(warm_up_llm, model)
+
+    for name in pending:
+        warmup_status[name] = {"ready": False}
+
+    while pending:
+        names = list(pending)
+        results = await asyncio.gather(
+            *(asyncio.to_thread(pending[name]) for name in names),
+            return_exceptions=True,
+        )
+
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up failed for {name}: {result}")
+                warmup_status[name] = {"ready": False, "error": str(result)}
+            else:
+                logger.info(f"Warm-up done for {name} ({result:.2f}s)")
+                warmup_status[name] = {"ready": True, "seconds": result}
+                del pending[name]
+
+        if pending:
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+    logger.info("Warm-up complete, server ready")
+
+
+async def degradation_monitor():
+    """每秒根据排队扫描数更新降级等级（没有新请求时也能自动恢复）"""
+    while True:
+        previous = degradation.level
+        level = degradation.update(max(0, inflight_scans - SCAN_WORKERS))
+        if level != previous:
+            logger.warning(f"Degradation level changed: {previous} -> {level}")
+        await asyncio.sleep(1)
+
+
+def apply_degradation(params: Dict[str, Any]) -> int:
+    """
+    按当前降级等级调整扫描参数（原地修改）
+
+    Args:
+        params: 扫描参数（model, skip_items, clean_text ...）
+
+    Returns:
+        实际改变了参数的最高降级等级（0 表示参数未改变）
+    """
+    steps = (
+        {"clean_text": True, "format_text": True},
+        {"model": FAST_MODEL},
+        {"skip_items": True},
+    )
+    applied = 0
+    for level, changes in enumerate(steps[:degradation.level], 1):
+        if any(params.get(key) != value for key, value in changes.items()):
+            params.update(changes)
+            applied = level
+
+    # 请求参数已经是降级后的配置时（如客户端已指定小模型）不算降级
+    if applied > 0:
+        SCANS_DEGRADED.inc(level=str(applied))
+    return applied
+
+
+async def job_worker():
+    """任务 worker：从队列取任务并在扫描线程池中执行"""
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await process_job(job_id)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+            job_store.fail(job_id, str(e))
+        finally:
+            job_queue.task_done()
+
+
+async def process_job(job_id: str):
+    """执行单个任务，阶段耗时和已完成的订单实时写入任务存储"""
+    job = job_store.get(job_id)
+    if job is None or job.image is None:
+        return
+
+    cache_key = ScanCache.make_key(job.image, **{k: job.params[k] for k in CACHE_KEY_PARAMS})
+    cached = scan_cache.get(cache_key)
+    if cached is not None:
+        job_store.finish(job_id, {"success": True, "data": cached, "performance": {"cache_hit": 1.0}})
+        return
+
+    job_store.mark_running(job_id)
+
+    def on_progress(event: str, payload: Dict[str, Any]):
+        if event == "order":
+            job_store.add_partial(job_id, payload["order"])
+        else:
+            job_store.update_stage(job_id, event, payload.pop("seconds"), **payload)
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        scan_executor,
+        partial(scan_image, image_bytes=job.image, on_progress=on_progress, priority=PRIORITY_BULK, **job.params),
+    )
+    observe_scan(result, job.params["model"], endpoint="/jobs")
+
+    if result["success"]:
+        scan_cache.put(cache_key, result["data"])
+    job_store.finish(job_id, result)
+
+
 # ==================== API 端点 ====================
 
 @app.get("/")
@@ -300,7 +1304,9 @@ async def health_check():
     components = {}
 
     try:
-        ocr, llm = init_engines()
+        # 引擎已创建时直接复用（创建 OCR 引擎较慢，放到线程中执行）
+        if not engines.ocr_engines() or not engines.llm_engines():
+            await asyncio.to_thread(init_engines, DEFAULT_MODEL, False)
         components["ocr"] = True
         components["llm"] = True
         status = "healthy"
@@ -317,8 +1323,164 @@ async def health_check():
     )
 
 
+@app.get("/ready", response_model=ReadyResponse)
+async def readiness_check():
+    """
+    就绪检查（供负载均衡使用）
+
+    所有组件预热完成前返回 503，避免冷启动的实例接收流量。
+    """
+    ready = bool(warmup_status) and all(c["ready"] for c in warmup_status.values())
+    body = ReadyResponse(status="ready" if ready else "warming_up", components=warmup_status)
+
+    if not ready:
+        return JSONResponse(status_code=503, content=body.model_dump())
+    return body
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def check_upload_size(size: int):
+    """检查上传大小（10MB）"""
+    if size > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件太大: {size} bytes (max: 10MB)",
+        )
+
+
+def request_deadline(request: Request) -> Deadline:
+    """请求截止时间：X-Request-Budget 请求头（秒），未提供时使用 REQUEST_BUDGET"""
+    budget = parse_budget(request.headers.get("x-request-budget")) or REQUEST_BUDGET
+    return Deadline.after(budget)
+
+
+async def wait_disconnect(request: Request):
+    """等待客户端断开"""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def cancel_on_disconnect(request: Request, deadline: Deadline):
+    """客户端断开时取消截止时间（作为后台 Task 运行，请求结束时取消）"""
+    await wait_disconnect(request)
+    logger.info("Client disconnected, cancelling scan")
+    deadline.cancel()
+
+
+async def wait_scan(task: asyncio.Task, cache_key: str, request: Request) -> Dict[str, Any]:
+    """
+    等待（可能被合并的）扫描结果
+
+    客户端断开时退出等待；同一次计算的所有等待者都断开后取消扫描，
+    未开始的 LLM 调用不再发起，释放容量给仍在等待的请求。
+    """
+    scan_waiters[cache_key] = scan_waiters.get(cache_key, 0) + 1
+    disconnected = asyncio.create_task(wait_disconnect(request))
+
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        raise HTTPException(status_code=499, detail="客户端已断开")
+
+    finally:
+        disconnected.cancel()
+        scan_waiters[cache_key] -= 1
+        if scan_waiters[cache_key] == 0:
+            del scan_waiters[cache_key]
+            if not task.done():
+                logger.info(f"All clients gone, cancelling scan: {cache_key[:12]}")
+                inflight_deadlines[cache_key].cancel()
+
+
+async def scan_contents(
+    contents: bytes,
+    request: Request,
+    idempotency_key: Optional[str] = None,
+    degradation_level: int = 0,
+    **kwargs,
+) -> ScanResponse:
+    """
+    扫描已读入内存的图片（上传缓冲区直接送入 OCR 解码，不写临时文件）
+
+    - 相同图片 + 相同参数的重复请求直接返回缓存结果
+    - 并发到达的相同请求合并到同一次计算（单飞），所有等待者得到同一结果
+    - 提供 Idempotency-Key 时按该键（而非图片内容）去重
+    - 截止时间（X-Request-Budget）传递到 LLM 调用；合并的计算按最晚的截止时间执行
+    """
+    check_upload_size(len(contents))
+
+    t = time.time()
+    cache_key = ScanCache.make_key(
+        contents,
+        idempotency_key=idempotency_key,
+        **{k: kwargs[k] for k in CACHE_KEY_PARAMS},
+    )
+    cached = scan_cache.get(cache_key)
+
+    if cached is not None:
+        lookup = time.time() - t
+        logger.info(f"Scan cache hit: {cache_key[:12]}")
+        return ScanResponse(
+            success=True,
+            data=cached,
+            performance={"cache_lookup": lookup, "total": lookup, "cache_hit": 1.0, **scan_cache.stats()},
+            degradation_level=degradation_level,
+        )
+
+    try:
+        deadline = request_deadline(request)
+        task = inflight_tasks.get(cache_key)
+        coalesced = task is not None
+
+        if coalesced:
+            logger.info(f"Joining in-flight scan: {cache_key[:12]}")
+            inflight_deadlines[cache_key].extend(deadline.expires_at)
+        else:
+            # 计算放在独立 Task 中，发起请求的客户端断开后，其他等待者仍能拿到结果
+            task = asyncio.create_task(scan_and_cache(cache_key, contents, {**kwargs, "deadline": deadline}))
+            inflight_tasks[cache_key] = task
+            inflight_deadlines[cache_key] = deadline
+
+            def forget(_):
+                inflight_tasks.pop(cache_key, None)
+                inflight_deadlines.pop(cache_key, None)
+
+            task.add_done_callback(forget)
+
+        # 扫描（在线程池中执行）
+        result = await wait_scan(task, cache_key, request)
+
+        performance = {**(result.get("performance") or {}), "cache_hit": 0.0, **scan_cache.stats()}
+        performance["coalesced"] = 1.0 if coalesced else 0.0
+        return ScanResponse(**{**result, "performance": performance}, degradation_level=degradation_level)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def scan_and_cache(cache_key: str, contents: bytes, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """执行扫描并缓存成功的结果"""
+    result = await run_scan(image_bytes=contents, **kwargs)
+    observe_scan(result, kwargs["model"])
+
+    if result["success"]:
+        scan_cache.put(cache_key, result["data"])
+
+    return result
+
+
 @app.post("/scan", response_model=ScanResponse)
 async def scan_bill(
+    request: Request,
     file: UploadFile = File(..., description="账单图片"),
     skip_items: bool = Form(False, description="跳过商品明细"),
     clean_text: bool = Form(True, description="清理文本"),
@@ -326,6 +1488,7 @@ async def scan_bill(
     concurrent: bool = Form(True, description="并发处理"),
     use_angle_cls: bool = Form(False, description="角度检测"),
     model: Optional[str] = Form(None, description="LLM 模型"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="幂等键"),
 ):
     """
     扫描账单（标准模式）
@@ -337,66 +1500,104 @@ async def scan_bill(
     - **concurrent**: 并发解析订单列表（默认 True）
     - **use_angle_cls**: OCR 角度检测（默认 False，关闭可提升速度）
     - **model**: LLM 模型（默认 qwen2.5:3b）
+    - **Idempotency-Key**（请求头，可选）: 相同键的请求只计算一次，返回同一结果
+    - **X-Request-Budget**（请求头，可选）: 客户端等待预算（秒），超时或断开后停止计算
+
+    负载过高时自动降级（响应中的 degradation_level）。
     """
     # 检查文件类型
-    allowed_ext = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
     file_ext = Path(file.filename).suffix.lower()
 
-    if file_ext not in allowed_ext:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail=f"不支持的文件类型: {file_ext}",
         )
 
-    # 保存临时文件
-    temp_file_id = str(uuid.uuid4())
-    temp_file_path = TEMP_DIR / f"{temp_file_id}{file_ext}"
+    contents = await file.read()
+    logger.info(f"File uploaded: {file.filename}")
 
-    try:
-        contents = await file.read()
-
-        # 检查文件大小（10MB）
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(
-                status_code=400,
-                detail=f"文件太大: {len(contents)} bytes (max: 10MB)",
-            )
+    params = dict(
+        model=resolve_model(model),
+        skip_items=skip_items,
+        clean_text=clean_text,
+        format_text=format_text,
+        concurrent=concurrent,
+        use_angle_cls=use_angle_cls,
+    )
+    level = apply_degradation(params)
+
+    return await scan_contents(
+        contents,
+        request,
+        idempotency_key=idempotency_key,
+        degradation_level=level,
+        **params,
+    )
 
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
 
-        logger.info(f"File uploaded: {file.filename}")
+@app.post("/scan/raw", response_model=ScanResponse)
+async def scan_bill_raw(
+    request: Request,
+    skip_items: bool = Query(False, description="跳过商品明细"),
+    clean_text: bool = Query(True, description="清理文本"),
+    format_text: bool = Query(False, description="格式化文本"),
+    concurrent: bool = Query(True, description="并发处理"),
+    use_angle_cls: bool = Query(False, description="角度检测"),
+    model: Optional[str] = Query(None, description="LLM 模型"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="幂等键"),
+):
+    """
+    扫描账单（原始字节上传）
 
-        # 扫描
-        result = scan_image(
-            image_path=str(temp_file_path),
-            model=model or DEFAULT_MODEL,
-            skip_items=skip_items,
-            clean_text=clean_text,
-            format_text=format_text,
-            concurrent=concurrent,
-            use_angle_cls=use_angle_cls,
+    请求体直接为图片字节（Content-Type: application/octet-stream 或 image/*），
+    参数通过 query string 传递，跳过 multipart 解析，全程不落盘。
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type != "application/octet-stream" and not content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=415,
+            detail=f"不支持的 Content-Type: {content_type or '(empty)'}",
         )
 
-        return ScanResponse(**result)
+    # 先根据 Content-Length 拒绝超大请求，避免读入整个请求体
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        check_upload_size(int(content_length))
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # 清理
-        if temp_file_path.exists():
-            os.remove(temp_file_path)
+    contents = await request.body()
+    if not contents:
+        raise HTTPException(status_code=400, detail="请求体为空")
+
+    logger.info(f"Raw upload: {len(contents)} bytes")
+
+    params = dict(
+        model=resolve_model(model),
+        skip_items=skip_items,
+        clean_text=clean_text,
+        format_text=format_text,
+        concurrent=concurrent,
+        use_angle_cls=use_angle_cls,
+    )
+    level = apply_degradation(params)
+
+    return await scan_contents(
+        contents,
+        request,
+        idempotency_key=idempotency_key,
+        degradation_level=level,
+        **params,
+    )
 
 
 @app.post("/scan/fast", response_model=ScanResponse)
 async def scan_bill_fast(
+    request: Request,
     file: UploadFile = File(..., description="账单图片"),
     skip_items: bool = Form(True, description="跳过商品明细"),
     clean_text: bool = Form(True, description="清理文本"),
     concurrent: bool = Form(True, description="并发处理"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="幂等键"),
 ):
     """
     快速扫描（预设优化参数）
@@ -407,18 +1608,300 @@ async def scan_bill_fast(
     - 默认关闭角度检测（--no-angle）
     - 默认并发处理（--concurrent）
     - 速度: 2-3 秒
+    - 参数已是快速配置，不参与自动降级
     """
-    return await scan_bill(
-        file=file,
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {file_ext}",
+        )
+
+    contents = await file.read()
+    logger.info(f"File uploaded (fast): {file.filename}")
+
+    return await scan_contents(
+        contents,
+        request,
+        idempotency_key=idempotency_key,
+        model=FAST_MODEL,
         skip_items=skip_items,
         clean_text=clean_text,
         format_text=False,
         concurrent=concurrent,
         use_angle_cls=False,
-        model=FAST_MODEL,
+        priority=PRIORITY_INTERACTIVE,
+    )
+
+
+def format_stream_event(event: str, payload: Dict[str, Any], stream_format: str) -> str:
+    """格式化流式事件（NDJSON 一行一个 JSON；SSE 为 event/data 块）"""
+    data = json.dumps(payload, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+
+
+@app.post("/scan/stream")
+async def scan_bill_stream(
+    request: Request,
+    file: UploadFile = File(..., description="账单图片"),
+    skip_items: bool = Form(False, description="跳过商品明细"),
+    clean_text: bool = Form(True, description="清理文本"),
+    format_text: bool = Form(False, description="格式化文本"),
+    use_angle_cls: bool = Form(False, description="角度检测"),
+    model: Optional[str] = Form(None, description="LLM 模型"),
+    stream_format: str = Form("ndjson", description="ndjson 或 sse"),
+):
+    """
+    流式扫描（订单逐个返回）
+
+    依次推送事件：
+    - **ocr**: OCR 完成（耗时、行数）
+    - **detect**: 类型检测完成（single_order / order_list）
+    - **split**: 订单分离完成（订单数）
+    - **order**: 每个订单解析完成后立即推送（index 为订单序号）
+    - **done**: 扫描结束（success、error、performance）
+
+    订单列表始终并发解析，首个订单的延迟约为一次 LLM 调用。
+    客户端断开或超过 X-Request-Budget 后停止解析剩余订单。
+    """
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"不支持的流格式: {stream_format}")
+
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {file_ext}",
+        )
+
+    contents = await file.read()
+    check_upload_size(len(contents))
+
+    params = dict(
+        model=resolve_model(model),
+        skip_items=skip_items,
+        clean_text=clean_text,
+        format_text=format_text,
+        use_angle_cls=use_angle_cls,
+    )
+    cache_key = ScanCache.make_key(contents, **params)
+    cached = scan_cache.get(cache_key)
+
+    # 准入检查在开始响应之前完成（拒绝时仍能返回 503），名额在扫描结束时释放
+    admission = ExitStack()
+    if cached is None:
+        admission.enter_context(admit_scan())
+
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue" = asyncio.Queue()
+    deadline = request_deadline(request)
+
+    def on_progress(event: str, payload: Dict[str, Any]):
+        # 在扫描线程中调用，转交给事件循环
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    def on_scan_done(slot: ExitStack, future: "asyncio.Future"):
+        """
+        扫描结束（在事件循环线程中调用）：释放准入名额，记录并缓存结果
+
+        客户端断开后截止时间只是协作式取消，扫描线程仍在执行，
+        名额保留到扫描真正结束，结果也照常记录和缓存
+        """
+        with slot:
+            if future.cancelled() or future.exception() is not None:
+                return
+            result = future.result()
+            observe_scan(result, params["model"])
+            if result["success"]:
+                scan_cache.put(cache_key, result["data"])
+
+    async def event_stream():
+        with admission:
+            if cached is not None:
+                if cached["type"] == "order_list":
+                    orders = cached["orders"]
+                else:
+                    orders = [{"success": True, "invoice": cached["invoice"], "confidence": cached["confidence"]}]
+                for i, order in enumerate(orders):
+                    yield format_stream_event("order", {"index": i, "order": order}, stream_format)
+                yield format_stream_event(
+                    "done", {"success": True, "data": cached, "performance": {"cache_hit": 1.0}}, stream_format
+                )
+                return
+
+            future = loop.run_in_executor(
+                scan_executor,
+                partial(scan_image, image_bytes=contents, concurrent=True, on_progress=on_progress,
+                        deadline=deadline, **params),
+            )
+            # 名额转交给扫描本身（流被关闭时不释放）
+            future.add_done_callback(partial(on_scan_done, admission.pop_all()))
+
+            try:
+                while True:
+                    getter = asyncio.ensure_future(events.get())
+                    await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        getter.cancel()
+                        break
+                    event, payload = getter.result()
+                    yield format_stream_event(event, payload, stream_format)
+            finally:
+                # 客户端断开时流被关闭，停止扫描
+                if not future.done():
+                    deadline.cancel()
+
+            # 扫描结束后队列中可能还有未推送的事件
+            while not events.empty():
+                event, payload = events.get_nowait()
+                yield format_stream_event(event, payload, stream_format)
+
+            result = await future
+            yield format_stream_event(
+                "done",
+                {key: result.get(key) for key in ("success", "data", "error", "performance")},
+                stream_format,
+            )
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+
+@app.post("/scan/batch", response_model=BatchScanResponse)
+async def scan_bill_batch(
+    request: Request,
+    files: List[UploadFile] = File(..., description="账单图片（多张）"),
+    skip_items: bool = Form(False, description="跳过商品明细"),
+    clean_text: bool = Form(True, description="清理文本"),
+    format_text: bool = Form(False, description="格式化文本"),
+    concurrent: bool = Form(True, description="并发处理"),
+    use_angle_cls: bool = Form(False, description="角度检测"),
+    model: Optional[str] = Form(None, description="LLM 模型"),
+):
+    """
+    批量扫描（流水线处理）
+
+    - 第 k 张图片在 LLM 阶段时，第 k+1 张图片同时进行 OCR
+    - 结果按上传顺序返回，每张图片附带阶段耗时
+    - 参数与 /scan 相同，作用于所有图片
+    - X-Request-Budget 作用于整个批次，超时或客户端断开后剩余图片直接返回失败
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件太多: {len(files)} (max: {MAX_BATCH_FILES})",
+        )
+
+    model = resolve_model(model)
+
+    contents_list = []
+    for file in files:
+        file_ext = Path(file.filename).suffix.lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的文件类型: {file_ext} ({file.filename})",
+            )
+        contents = await file.read()
+        check_upload_size(len(contents))
+        contents_list.append(contents)
+
+    logger.info(f"Batch uploaded: {len(files)} files")
+
+    t = time.time()
+    deadline = request_deadline(request)
+    watcher = asyncio.create_task(cancel_on_disconnect(request, deadline))
+    try:
+        results = await run_batch_pipeline(
+            contents_list,
+            model=model,
+            skip_items=skip_items,
+            clean_text=clean_text,
+            format_text=format_text,
+            concurrent=concurrent,
+            use_angle_cls=use_angle_cls,
+            deadline=deadline,
+        )
+    finally:
+        watcher.cancel()
+    total = time.time() - t
+
+    return BatchScanResponse(
+        success=all(r["success"] for r in results),
+        results=[ScanResponse(**r) for r in results],
+        performance={
+            "total": total,
+            "images": float(len(results)),
+            "images_per_minute": len(results) / total * 60 if total > 0 else 0.0,
+        },
     )
 
 
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    file: UploadFile = File(..., description="账单图片"),
+    skip_items: bool = Form(False, description="跳过商品明细"),
+    clean_text: bool = Form(True, description="清理文本"),
+    format_text: bool = Form(False, description="格式化文本"),
+    concurrent: bool = Form(True, description="并发处理"),
+    use_angle_cls: bool = Form(False, description="角度检测"),
+    model: Optional[str] = Form(None, description="LLM 模型"),
+):
+    """
+    提交异步扫描任务（立即返回任务 ID）
+
+    参数与 /scan 相同。通过 GET /jobs/{job_id} 查询状态、阶段耗时和已完成的订单。
+    """
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {file_ext}",
+        )
+
+    if job_queue.qsize() >= MAX_QUEUED_JOBS:
+        raise HTTPException(
+            status_code=503,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": "30"},
+        )
+
+    model = resolve_model(model)
+    contents = await file.read()
+    check_upload_size(len(contents))
+
+    job = job_store.create(contents, {
+        "model": model,
+        "skip_items": skip_items,
+        "clean_text": clean_text,
+        "format_text": format_text,
+        "concurrent": concurrent,
+        "use_angle_cls": use_angle_cls,
+    })
+    job_queue.put_nowait(job.job_id)
+    logger.info(f"Job submitted: {job.job_id} ({file.filename})")
+
+    return JobSubmitResponse(job_id=job.job_id, status=job.status, status_url=f"/jobs/{job.job_id}")
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    查询任务状态
+
+    - **status**: queued / running / done / failed
+    - **stages**: 已完成阶段的耗时（ocr、detect、split ...）
+    - **partial**: 已解析完成的订单（订单列表逐个追加）
+    - **result**: 完成后的完整结果（与 /scan 响应相同）
+    """
+    job = job_store.snapshot(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return JobStatusResponse(**job)
+
+
 # ==================== 启动 ====================
 
 if __name__ == "__main__":
@@ -17,14 +17,15 @@
   --no-angle        关闭 OCR 角度检测（图片方向正确时）
   --clean           清理 OCR 文本（移除 UI 元素，提升 5-10% 速度）
   --concurrent      启用并发解析（订单列表）
+  --batch           批量解析订单列表（多个订单共用一个提示词）
 """
 
 import sys
 import os
 import time
+import asyncio
 import logging
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 设置日志级别为 WARNING，隐藏 INFO 日志
 logging.basicConfig(level=logging.WARNING)
@@ -35,33 +36,20 @@ from src.ocr import RapidOCREngine, clean_ocr_text
 from src.llm import OllamaEngine
 from src.parser.smart_parser import SmartParser
 from src.parser.multi_order_parser import MultiOrderParser
-from src.parser.fast_parser import FastBillParser
-from src.parser.bank_parser import BankStatementParser
 
 
-def parse_single_order(order_block, llm_engine, is_bank_statement=False, skip_items=False):
-    """解析单个订单（用于并发）"""
-    if is_bank_statement:
-        parser = BankStatementParser()
-        result = parser.parse(order_block.text)
-    else:
-        parser = FastBillParser(llm_engine, skip_items=skip_items)
-        result = parser.parse(order_block.text)
-
-    # 添加状态信息
-    if result.success and result.invoice:
-        if not result.invoice.remarks:
-            result.invoice.remarks = f"订单状态: {order_block.status}"
-        else:
-            result.invoice.remarks += f" | 订单状态: {order_block.status}"
-
-    return result, order_block.status
+async def parse_order_list_async(multi_parser, llm_engine, text):
+    """并发解析订单列表（异步），完成后关闭异步 HTTP 连接池"""
+    try:
+        return await multi_parser.aparse_order_list(text)
+    finally:
+        await llm_engine.aclose()
 
 
 def scan_bill(image_path: str, model: str = "qwen2.5:3b",
               use_angle_cls: bool = True, concurrent: bool = False,
               clean_text: bool = False, format_text: bool = False,
-              skip_items: bool = False):
+              skip_items: bool = False, batch: bool = False):
     """快速扫描账单"""
 
     # 检查文件
@@ -108,7 +96,7 @@ def scan_bill(image_path: str, model: str = "qwen2.5:3b",
     # 检测是否是订单列表
     print("[ 3/5 ] 检测订单类型...", end=" ", flush=True)
     t = time.time()
-    multi_parser = MultiOrderParser(llm, skip_items=skip_items)
+    multi_parser = MultiOrderParser(llm, skip_items=skip_items, batch=batch)
     is_list, list_conf = multi_parser.is_order_list(ocr_result.text)
     times['detect_type'] = time.time() - t
 
@@ -129,48 +117,17 @@ def scan_bill(image_path: str, model: str = "qwen2.5:3b",
         print("[ 5/5 ] 解析订单列表...", end=" ", flush=True)
         t = time.time()
 
-        # 检测是否是银行流水
-        is_bank_statement = multi_parser._is_bank_statement_list(ocr_result.text)
-
         if concurrent and len(order_blocks) > 1:
-            # 并发解析
-            results = []
-            stats = {
-                'total_orders': len(order_blocks),
-                'completed': 0,
-                'cancelled': 0,
-                'in_progress': 0,
-                'other': 0,
-            }
-
-            with ThreadPoolExecutor(max_workers=min(len(order_blocks), 4)) as executor:
-                futures = {
-                    executor.submit(parse_single_order, block, llm, is_bank_statement, skip_items): i
-                    for i, block in enumerate(order_blocks)
-                }
-
-                temp_results = [None] * len(order_blocks)
-                for future in as_completed(futures):
-                    idx = futures[future]
-                    result, status = future.result()
-                    temp_results[idx] = (result, status)
-
-                for result, status in temp_results:
-                    results.append(result)
-                    if status == '已完成':
-                        stats['completed'] += 1
-                    elif status == '已取消':
-                        stats['cancelled'] += 1
-                    elif status in ['进行中', '待支付', '待发货', '待收货']:
-                        stats['in_progress'] += 1
-                    else:
-                        stats['other'] += 1
+            # 并发解析（每个订单一个协程，实际并发数由 LLM 自适应并发限制决定）
+            results, stats = asyncio.run(parse_order_list_async(multi_parser, llm, ocr_result.text))
         else:
             # 串行解析
             results, stats = multi_parser.parse_order_list(ocr_result.text)
 
         times['parse'] = time.time() - t
-        mode_str = "并发" if concurrent and len(order_blocks) > 1 else "串行"
+        mode_str = f"并发×{llm.limiter.limit}" if concurrent and len(order_blocks) > 1 else "串行"
+        if batch:
+            mode_str += ", 批量"
         print(f"✓ ({times['parse']:.2f}s, {mode_str})")
 
         times['total'] = time.time() - total_start
@@ -341,6 +298,7 @@ def main():
         print("  --format          格式化 OCR 文本（合并商品信息，提升 20-30% 速度）⚠️ 可能漏项")
         print("  --no-items        不识别商品明细（仅总金额，提升 50-60% 速度）⚡")
         print("  --concurrent      启用并发解析订单列表")
+        print("  --batch           批量解析订单列表（多个订单共用一个提示词，减少 token）")
         print("\n高级示例:")
         print("  python3 scan_bill.py invoice.png --model qwen2.5:7b")
         print("  python3 scan_bill.py list.jpg --fast --concurrent")
@@ -393,7 +351,10 @@ def main():
     # 跳过商品明细
     skip_items = '--no-items' in args
 
-    scan_bill(image, model, use_angle_cls, concurrent, clean_text, format_text, skip_items)
+    # 订单列表批量解析
+    batch = '--batch' in args
+
+    scan_bill(image, model, use_angle_cls, concurrent, clean_text, format_text, skip_items, batch)
 
 
 if __name__ == "__main__":
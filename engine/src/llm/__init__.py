@@ -1,4 +1,12 @@
+from .openai_engine import OpenAICompatibleEngine, OutputTruncated
 from .vllm_engine import VLLMEngine
 from .ollama_engine import OllamaEngine
+from .router import RouterEngine
+from .deadline import Deadline, DeadlineExceeded
+from .cache import LLMCache
+from .limiter import AdaptiveLimiter, get_limiter, configure_limiters, all_limiters
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker, configure_breakers, all_breakers
 
-__all__ = ["VLLMEngine", "OllamaEngine"]
+__all__ = ["OpenAICompatibleEngine", "OutputTruncated", "VLLMEngine", "OllamaEngine", "RouterEngine", "Deadline", "DeadlineExceeded", "LLMCache",
+           "AdaptiveLimiter", "get_limiter", "configure_limiters", "all_limiters",
+           "CircuitBreaker", "CircuitOpenError", "get_breaker", "configure_breakers", "all_breakers"]
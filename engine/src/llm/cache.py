@@ -0,0 +1,228 @@
+"""
+LLM 响应缓存 - 按 (模型, 提示词哈希, temperature, max_tokens, json_mode) 缓存生成结果
+内存 LRU，可选 SQLite 持久化（按总大小淘汰最久未使用的记录）
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """
+    LLM 响应缓存（线程安全，多个引擎可共用一个实例）
+
+    - 重试、/scan/fast 之后的 /scan、重叠截图中相同的订单块，提示词完全相同，
+      temperature 为 0 时直接返回上次的生成结果
+    - 提示词模板修改后提示词哈希随之变化，旧记录自然不再命中；
+      修改了提示词以外影响输出的因素（如换了同名模型权重）时修改 version，
+      SQLite 中其他版本的记录在打开时清除
+    - 只缓存原始生成文本，解析和清理逻辑修改后无需失效
+    """
+
+    # 缓存格式版本（与 version 一起参与缓存键）
+    SCHEMA_VERSION = "1"
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        db_path: Optional[str] = None,
+        max_db_bytes: int = 64 * 1024 * 1024,
+        version: str = "",
+        max_temperature: float = 0.0,
+    ):
+        """
+        初始化 LLM 响应缓存
+
+        Args:
+            max_entries: 内存中最多缓存的响应数（LRU 淘汰）
+            db_path: SQLite 数据库路径（为空时只使用内存缓存）
+            max_db_bytes: SQLite 中响应文本的总大小上限（字节），超出时淘汰最久未使用的记录
+            version: 缓存版本，修改后旧记录全部失效
+            max_temperature: 只缓存 temperature 不超过该值的调用（采样结果不确定时不缓存）
+        """
+        self.max_entries = max_entries
+        self.max_db_bytes = max_db_bytes
+        self.version = f"{self.SCHEMA_VERSION}:{version}"
+        self.max_temperature = max_temperature
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()  # key -> 生成文本
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_bytes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "version TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed)"
+            )
+            # 清除其他版本的记录
+            stale = self._db.execute(
+                "DELETE FROM llm_cache WHERE version != ?", (self.version,)
+            ).rowcount
+            self._db.commit()
+            self._db_bytes = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()[0]
+            logger.info(
+                f"LLM cache persisted to {db_path} ({self._db_bytes} bytes, {stale} stale entries removed)"
+            )
+
+    def cacheable(self, temperature: float) -> bool:
+        """该 temperature 的调用是否缓存"""
+        return temperature <= self.max_temperature
+
+    def make_key(
+        self,
+        backend: str,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        json_mode: bool,
+        fields: Optional[Sequence[str]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        生成缓存键
+
+        Args:
+            backend: 后端名称（不同后端的同名模型可能是不同的量化版本）
+            model: 模型名称
+            prompt: 完整提示词
+            temperature: 采样温度
+            max_tokens: 最大生成 token 数
+            json_mode: 是否启用 JSON 模式
+            fields: 提前停止时需要的字段（结果只包含这些字段，与完整输出分开缓存）
+            schema: 约束解码的 JSON Schema（输出受 Schema 约束，与不约束的输出分开缓存）
+
+        Returns:
+            缓存键
+        """
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        key = [self.version, backend, model, prompt_hash, temperature, max_tokens, json_mode]
+        if fields:
+            key.append(sorted(fields))
+        if schema:
+            key.append(hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest())
+        params = json.dumps(key)
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存（内存未命中时查询 SQLite）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的生成文本，未命中返回 None
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._db.commit()
+                    self._store(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 生成文本
+        """
+        with self._lock:
+            self._store(key, value)
+
+            if self._db is not None:
+                size = len(value.encode())
+                old = self._db.execute(
+                    "SELECT size FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, version, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, self.version, time.time()),
+                )
+                self._db_bytes += size - (old[0] if old else 0)
+                if self._db_bytes > self.max_db_bytes:
+                    self._evict()
+                self._db.commit()
+
+    def _evict(self):
+        """按最久未使用淘汰 SQLite 记录，直到总大小降到上限的 90%（调用方持有锁）"""
+        target = self.max_db_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._db_bytes <= target:
+                break
+            evicted.append((key,))
+            self._db_bytes -= size
+        self._db.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        logger.info(f"LLM cache evicted {len(evicted)} entries ({self._db_bytes} bytes left)")
+
+    def _store(self, key: str, value: str):
+        """写入内存 LRU（调用方持有锁）"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "db_bytes": self._db_bytes,
+            }
+
+    def clear(self):
+        """清空缓存（内存和 SQLite）"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+                self._db_bytes = 0
+
+    def close(self):
+        """关闭 SQLite 连接"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
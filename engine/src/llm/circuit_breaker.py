@@ -0,0 +1,278 @@
+"""
+LLM 熔断器 - 后端故障或明显变慢时快速失败
+最近的调用中出错 / 过慢的比例过高时熔断，熔断期间的调用立即抛出 CircuitOpenError，
+不再等待连接超时；到期后放行少量探测调用，成功后恢复
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Deque, Tuple
+
+from .deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """熔断中，调用未发出"""
+    pass
+
+
+# 熔断器状态（数值用于监控指标）
+CLOSED = 0
+HALF_OPEN = 1
+OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    熔断器（线程安全）
+
+    - closed：正常调用，记录最近 window 次（且不超过 window_seconds 秒）调用的结果；
+      样本不少于 min_calls 且出错或耗时超过 slow_seconds 的比例 >= failure_ratio 时熔断
+    - open：调用立即抛出 CircuitOpenError，open_seconds 秒后进入 half_open
+    - half_open：最多放行 probe_calls 个探测调用，成功则恢复 closed，失败则重新熔断；
+      只有探测调用的结果决定半开状态的去向，熔断前放行、半开时才结束的调用不计入
+    - 截止时间到期 / 客户端取消不计入（耗时已超过 slow_seconds 的到期调用计为过慢）
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        failure_ratio: float = 0.5,
+        slow_seconds: float = 20.0,
+        min_calls: int = 5,
+        window: int = 20,
+        window_seconds: float = 60.0,
+        open_seconds: float = 10.0,
+        probe_calls: int = 1,
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            name: 名称（用于日志，如 "ollama/qwen2.5:3b"）
+            failure_ratio: 熔断的出错 / 过慢比例
+            slow_seconds: 调用耗时超过该值视为过慢（秒）
+            min_calls: 判断熔断所需的最少样本数
+            window: 统计的最近调用数
+            window_seconds: 统计窗口（秒，更早的调用不计入）
+            open_seconds: 熔断持续时间（秒）
+            probe_calls: 半开状态同时放行的探测调用数
+        """
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_calls = probe_calls
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._half_open_round = 0   # 第几次进入半开状态（探测调用的令牌，区分上一轮的探测调用）
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=window)  # (时间, 是否出错 / 过慢)
+        self.trips = 0       # 熔断次数
+        self.rejected = 0    # 熔断期间拒绝的调用数
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> int:
+        """当前状态（CLOSED / HALF_OPEN / OPEN）"""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> int:
+        """当前状态（调用方持有锁），熔断到期后转为半开"""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._half_open_round += 1
+        return self._state
+
+    def acquire(self) -> Optional[int]:
+        """
+        调用前检查
+
+        Returns:
+            探测调用的令牌（半开状态放行的调用，release 时传回），正常放行时为 None
+
+        Raises:
+            CircuitOpenError: 熔断中（或半开状态的探测名额已满）
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return None
+            if state == HALF_OPEN and self._probes < self.probe_calls:
+                self._probes += 1
+                return self._half_open_round
+            self.rejected += 1
+        raise CircuitOpenError(f"LLM circuit open: {self.name}")
+
+    def release(self, failed: Optional[bool], probe: Optional[int] = None):
+        """
+        记录一次调用的结果
+
+        Args:
+            failed: 是否出错或过慢，None 表示不计入（截止时间到期 / 客户端取消）
+            probe: acquire 返回的探测调用令牌（正常放行的调用为 None）
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if probe is not None:
+                # 上一轮半开状态的探测调用（期间已重新熔断）不计入
+                if state != HALF_OPEN or probe != self._half_open_round:
+                    return
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._trip(now)
+                elif failed is not None:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"LLM circuit closed: {self.name}")
+                return
+            # 熔断前放行的调用在熔断 / 半开期间结束时不计入
+            if failed is None or state != CLOSED:
+                return
+
+            self._outcomes.append((now, failed))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+            if len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for _, bad in self._outcomes if bad)
+                if failures / len(self._outcomes) >= self.failure_ratio:
+                    self._trip(now)
+
+    def _trip(self, now: float):
+        """熔断（调用方持有锁）"""
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.trips += 1
+        logger.warning(f"LLM circuit open for {self.open_seconds:.0f}s: {self.name}")
+
+    @contextmanager
+    def call(self, deadline: Optional[Deadline] = None):
+        """
+        检查熔断并记录一次调用的结果
+
+        用法:
+            with breaker.call(deadline) as call:
+                ...               # 等待并发名额
+                call.started()    # 开始调用后端（耗时从这里算起）
+                ...
+
+        Args:
+            deadline: 请求截止时间（可选，用于区分到期和客户端取消）
+
+        Raises:
+            CircuitOpenError: 熔断中
+        """
+        probe = self.acquire()
+        call = _BreakerCall()
+        try:
+            yield call
+        except DeadlineExceeded:
+            self.release(self._deadline_outcome(call, deadline), probe)
+            raise
+        except Exception as e:
+            # 调用后端之前的错误（如构建请求失败）、请求本身的错误（4xx）与后端健康无关，不计入
+            self.release(None if call.start is None or _request_error(e) else True, probe)
+            raise
+        except BaseException:
+            # 协程被取消（对冲的另一次调用先返回、客户端断开）不计入
+            self.release(None, probe)
+            raise
+        else:
+            self.release(call.elapsed() > self.slow_seconds, probe)
+
+    def _deadline_outcome(self, call: "_BreakerCall", deadline: Optional[Deadline]) -> Optional[bool]:
+        """到期中断的调用：取消的不计入，已调用后端超过 slow_seconds 的计为过慢"""
+        if call.start is None or (deadline is not None and deadline.cancelled):
+            return None
+        return True if call.elapsed() > self.slow_seconds else None
+
+    def stats(self) -> Dict[str, int]:
+        """当前状态、熔断次数、拒绝的调用数"""
+        with self._lock:
+            return {
+                "state": self._current_state(time.monotonic()),
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def _request_error(error: Exception) -> bool:
+    """是否为请求本身的错误（4xx，超时和限流除外）"""
+    status = getattr(error, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class _BreakerCall:
+    """call() 中的一次调用"""
+
+    def __init__(self):
+        self.start: Optional[float] = None
+
+    def started(self):
+        """开始调用后端（之前是排队等待并发名额，不计入耗时）"""
+        self.start = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start if self.start is not None else 0.0
+
+
+# 全局注册表：同一后端地址 + 模型的所有引擎实例共用一个熔断器
+_breakers: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+# 新建熔断器的默认参数（服务启动时可通过 configure_breakers 修改）
+_defaults = {"failure_ratio": 0.5, "slow_seconds": 20.0, "open_seconds": 10.0}
+
+
+def configure_breakers(failure_ratio: Optional[float] = None, slow_seconds: Optional[float] = None,
+                       open_seconds: Optional[float] = None):
+    """
+    设置之后新建的熔断器的默认参数
+
+    Args:
+        failure_ratio: 熔断的出错 / 过慢比例
+        slow_seconds: 调用耗时超过该值视为过慢（秒）
+        open_seconds: 熔断持续时间（秒）
+    """
+    for key, value in (("failure_ratio", failure_ratio), ("slow_seconds", slow_seconds),
+                       ("open_seconds", open_seconds)):
+        if value is not None:
+            _defaults[key] = value
+
+
+def get_breaker(backend: str, api_base: str, model: str) -> CircuitBreaker:
+    """
+    获取后端地址 + 模型对应的熔断器（不存在时创建）
+
+    Args:
+        backend: 后端名称（ollama / vllm）
+        api_base: API 地址
+        model: 模型名称
+
+    Returns:
+        熔断器
+    """
+    key = (backend, api_base, model)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(name=f"{backend}/{model}@{api_base}", **_defaults)
+        return breaker
+
+
+def all_breakers() -> Dict[Tuple[str, str, str], CircuitBreaker]:
+    """所有熔断器（键为 (backend, api_base, model)）"""
+    with _breakers_lock:
+        return dict(_breakers)
@@ -0,0 +1,101 @@
+"""
+请求截止时间 - 从 HTTP 层一直传递到 LLM 调用
+超时或客户端断开后，尚未开始的 LLM 调用不再发起，进行中的调用被中断
+"""
+
+import time
+import threading
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间（或已被取消）"""
+    pass
+
+
+class Deadline:
+    """
+    请求截止时间（线程安全）
+
+    - expires_at 为 time.monotonic() 时间戳
+    - cancel() 用于客户端断开等提前终止的场景，效果等同于立即到期
+    - child() 创建子截止时间：父截止时间到期或取消时子截止时间随之失效，
+      取消子截止时间不影响父截止时间（用于只中断某一次 LLM 调用）
+    """
+
+    def __init__(self, expires_at: float, parent: Optional["Deadline"] = None):
+        """
+        初始化截止时间
+
+        Args:
+            expires_at: 截止时间（time.monotonic() 时间戳）
+            parent: 父截止时间（可选）
+        """
+        self.expires_at = expires_at
+        self.parent = parent
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """从现在起 seconds 秒后到期"""
+        return cls(time.monotonic() + seconds)
+
+    @classmethod
+    def never(cls) -> "Deadline":
+        """不会到期的截止时间（只用于取消某一次调用）"""
+        return cls(float("inf"))
+
+    def child(self) -> "Deadline":
+        """创建子截止时间（到期时间跟随父截止时间，包括之后的 extend，可单独取消）"""
+        return Deadline(float("inf"), parent=self)
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已到期或已取消时为 0"""
+        if self._cancelled.is_set():
+            return 0.0
+        remaining = max(0.0, self.expires_at - time.monotonic())
+        if self.parent is not None:
+            remaining = min(remaining, self.parent.remaining())
+        return remaining
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已被取消（包括父截止时间被取消）"""
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def expired(self) -> bool:
+        """是否已到期（包括被取消）"""
+        return (
+            self.cancelled
+            or time.monotonic() >= self.expires_at
+            or (self.parent is not None and self.parent.expired)
+        )
+
+    def cancel(self):
+        """取消（客户端断开时调用）"""
+        self._cancelled.set()
+
+    def extend(self, expires_at: float):
+        """
+        延后截止时间（不会提前）
+
+        多个请求合并到同一次计算时，计算按最晚的截止时间执行。
+
+        Args:
+            expires_at: 新的截止时间（time.monotonic() 时间戳）
+        """
+        with self._lock:
+            self.expires_at = max(self.expires_at, expires_at)
+
+    def check(self, stage: Optional[str] = None):
+        """
+        检查截止时间，已到期时抛出 DeadlineExceeded
+
+        Args:
+            stage: 当前阶段（用于错误信息）
+        """
+        if self.expired:
+            reason = "cancelled" if self.cancelled else "deadline exceeded"
+            raise DeadlineExceeded(f"{reason} before {stage}" if stage else reason)
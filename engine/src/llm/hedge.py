@@ -0,0 +1,71 @@
+"""
+对冲请求 - 调用超过最近耗时的 p90 仍未返回时，再发一个相同的调用，取先返回的有效结果
+用于降低偶发慢调用（模型切换、某个后端排队）造成的长尾延迟
+"""
+
+import threading
+from collections import deque
+from typing import Optional, Dict, Deque, Hashable
+
+
+class HedgeTracker:
+    """
+    对冲延迟和统计（线程安全）
+
+    按调用类型（如 max_tokens，摘要模式和完整模式的耗时差别很大）分别记录最近的成功耗时，
+    对冲延迟取其分位数；样本不足 min_samples 时不对冲。
+    """
+
+    def __init__(self, quantile: float = 0.9, min_samples: int = 20, window: int = 200):
+        """
+        初始化对冲统计
+
+        Args:
+            quantile: 对冲延迟取最近耗时的分位数
+            min_samples: 开始对冲所需的最少样本数
+            window: 每种调用保留的最近耗时数
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.window = window
+
+        self.fired = 0  # 发出的对冲调用数
+        self.won = 0    # 对冲调用先返回的次数
+
+        self._latencies: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable, seconds: float):
+        """记录一次成功调用的耗时"""
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None:
+                samples = self._latencies[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, key: Hashable) -> Optional[float]:
+        """
+        对冲延迟
+
+        Returns:
+            调用超过该时间仍未返回时发出对冲调用（秒），样本不足时为 None
+        """
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def record_fired(self):
+        with self._lock:
+            self.fired += 1
+
+    def record_won(self):
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> Dict[str, int]:
+        """对冲次数和对冲调用先返回的次数"""
+        with self._lock:
+            return {"hedges": self.fired, "hedge_wins": self.won}
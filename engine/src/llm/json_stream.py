@@ -0,0 +1,137 @@
+"""
+增量 JSON 扫描 - 流式生成时判断顶层字段是否已经完整输出
+所需字段全部完整后即可中断生成，不必等模型输出剩余的字段
+"""
+
+import json
+from typing import Any, Dict, Iterable, Optional
+
+
+class JSONFieldScanner:
+    """
+    增量扫描 JSON 对象的顶层字段
+
+    逐块 feed 生成的文本，记录每个已完整输出的顶层字段的值：
+    - 字符串 / 对象 / 数组：遇到对应的结束符即完整
+    - 数字 / true / false / null：遇到逗号、空白或对象结束符才完整（"9" 之后可能还有 ".9"）
+    对象之前的文字（如代码块标记）被忽略。
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        """
+        初始化扫描器
+
+        Args:
+            fields: 需要的顶层字段
+        """
+        self.fields = set(fields)
+        self.values: Dict[str, Any] = {}
+
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 顶层对象内的状态：key（等待键）/ key_str（键字符串中）/ colon / value / comma
+        self._expect = "key"
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._value_kind: Optional[str] = None  # string / container / primitive
+
+    @property
+    def complete(self) -> bool:
+        """所需字段是否都已完整输出"""
+        return self.fields.issubset(self.values)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        输入一段生成的文本
+
+        Args:
+            chunk: 新生成的文本
+
+        Returns:
+            所需字段是否都已完整输出
+        """
+        self._text += chunk
+        text = self._text
+
+        while self._pos < len(text):
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect == "key_str":
+                            self._key = self._loads(text[self._key_start:i + 1])
+                            self._expect = "colon"
+                        elif self._expect == "value" and self._value_kind == "string":
+                            self._finish(text[self._value_start:i + 1])
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._expect == "key":
+                        self._key_start = i
+                        self._expect = "key_str"
+                    elif self._expect == "value" and self._value_start is None:
+                        self._value_start, self._value_kind = i, "string"
+            elif c in "{[":
+                if self._depth == 1 and self._expect == "value" and self._value_start is None:
+                    self._value_start, self._value_kind = i, "container"
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_kind == "container":
+                    self._finish(text[self._value_start:i + 1])
+                elif self._depth == 0 and self._value_kind == "primitive":
+                    self._finish(text[self._value_start:i])
+            elif self._depth == 1:
+                if self._expect == "colon" and c == ":":
+                    self._expect = "value"
+                    self._value_start, self._value_kind = None, None
+                elif self._expect == "value":
+                    if self._value_start is None:
+                        if not c.isspace():
+                            self._value_start, self._value_kind = i, "primitive"
+                    elif self._value_kind == "primitive" and (c == "," or c.isspace()):
+                        self._finish(text[self._value_start:i])
+                        if c == ",":
+                            self._expect = "key"
+                elif self._expect == "comma" and c == ",":
+                    self._expect = "key"
+
+        return self.complete
+
+    def _finish(self, raw: str):
+        """一个顶层字段的值已完整"""
+        value = self._loads(raw)
+        if self._key is not None and value is not _INVALID:
+            self.values[self._key] = value
+        self._expect = "comma"
+        self._key = None
+        self._value_start, self._value_kind = None, None
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _INVALID
+
+    def result(self) -> Dict[str, Any]:
+        """已完整输出的顶层字段"""
+        return dict(self.values)
+
+
+# 无法解析的值（与 JSON 的 null 区分）
+_INVALID = object()
@@ -0,0 +1,324 @@
+"""
+LLM 自适应并发限制 - AIMD（加性增、乘性减）
+根据观测到的调用耗时自动调整发往同一后端 + 模型的并发数：
+延迟稳定时逐步加并发，延迟明显变长或调用失败时按比例减并发
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Deque, Tuple
+
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发限制（线程安全）
+
+    - 基准耗时：最近 baseline_window 秒内成功调用的最小耗时（近似无排队时的耗时），
+      后端或提示词长度变化后基准能跟上
+    - 调用耗时 <= 基准 × tolerance，且并发已用满：limit += 1 / limit
+      （每完成约 limit 次调用加 1）
+    - 调用耗时 > 基准 × tolerance 或调用失败：limit × backoff，
+      同一轮拥塞（一次调用耗时内）只减一次
+    - 截止时间到期 / 客户端取消不计入（与后端负载无关）
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        tolerance: float = 1.5,
+        backoff: float = 0.75,
+        baseline_window: float = 60.0,
+    ):
+        """
+        初始化并发限制
+
+        Args:
+            name: 名称（用于日志，如 "ollama/qwen2.5:3b"）
+            initial: 初始并发数
+            min_limit: 并发数下限
+            max_limit: 并发数上限
+            tolerance: 耗时超过基准的多少倍视为拥塞
+            backoff: 拥塞时并发数的缩小比例
+            baseline_window: 基准耗时的统计窗口（秒）
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.baseline_window = baseline_window
+
+        self._limit = float(min(self.max_limit, max(min_limit, initial)))
+        self._inflight = 0
+        # 基准耗时分两段统计（当前窗口 / 上一个窗口），取两者最小值
+        self._min_current: Optional[float] = None
+        self._min_previous: Optional[float] = None
+        self._window_start = time.monotonic()
+        self._last_decrease = 0.0
+        self._last_used = 0.0   # 最近一次占用 / 释放名额的时间（monotonic，0 表示从未使用）
+        self._cond = threading.Condition()
+        # 等待名额的协程（事件循环, future），名额释放时唤醒
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        """执行中的调用数"""
+        return self._inflight
+
+    def active(self, window: float) -> bool:
+        """
+        是否有流量：有执行中的调用，或最近 window 秒内使用过
+
+        Args:
+            window: 统计窗口（秒）
+        """
+        return self._inflight > 0 or (self._last_used > 0 and time.monotonic() - self._last_used < window)
+
+    def acquire(self, deadline: Optional[Deadline] = None):
+        """
+        占用一个并发名额（没有空闲名额时阻塞）
+
+        Args:
+            deadline: 请求截止时间（可选，等待期间到期或取消时放弃）
+
+        Raises:
+            DeadlineExceeded: 等到名额之前截止时间已到或请求已取消
+        """
+        with self._cond:
+            while self._inflight >= int(self._limit):
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    # 定期醒来检查，客户端断开时不必等到截止时间
+                    deadline.check("LLM concurrency slot")
+                    self._cond.wait(min(deadline.remaining(), 0.5))
+            self._inflight += 1
+            self._last_used = time.monotonic()
+
+    def release(self, latency: Optional[float] = None, ok: bool = True):
+        """
+        释放并发名额并根据本次调用调整并发上限
+
+        Args:
+            latency: 调用耗时（秒），为 None 时不调整（调用被取消等）
+            ok: 调用是否成功（失败视为拥塞）
+        """
+        with self._cond:
+            saturated = self._inflight >= int(self._limit)
+            self._inflight -= 1
+            self._last_used = time.monotonic()
+
+            if latency is not None or not ok:
+                self._adjust(latency, ok, saturated)
+            self._cond.notify_all()
+            self._wake_async_waiters()
+
+    def _wake_async_waiters(self):
+        """唤醒等待名额的协程（调用方持有锁），被唤醒后重新竞争名额"""
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_set_done, future)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    async def aacquire(self, deadline: Optional[Deadline] = None):
+        """
+        占用一个并发名额（异步，没有空闲名额时等待而不占用线程）
+
+        Args:
+            deadline: 请求截止时间（可选，等待期间到期或取消时放弃）
+
+        Raises:
+            DeadlineExceeded: 等到名额之前截止时间已到或请求已取消
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._inflight < int(self._limit):
+                    self._inflight += 1
+                    self._last_used = time.monotonic()
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+
+            if deadline is None:
+                await future
+            else:
+                deadline.check("LLM concurrency slot")
+                await asyncio.wait({future}, timeout=min(deadline.remaining(), 0.5))
+                if not future.done():
+                    with self._cond:
+                        try:
+                            self._async_waiters.remove((loop, future))
+                        except ValueError:
+                            pass
+
+    def _adjust(self, latency: Optional[float], ok: bool, saturated: bool):
+        """AIMD 调整（调用方持有锁）"""
+        now = time.monotonic()
+        if now - self._window_start >= self.baseline_window:
+            self._min_previous, self._min_current = self._min_current, None
+            self._window_start = now
+        if ok and latency is not None and (self._min_current is None or latency < self._min_current):
+            self._min_current = latency
+        baseline = self._baseline()
+
+        congested = not ok or (
+            baseline is not None and latency is not None and latency > baseline * self.tolerance
+        )
+        old = int(self._limit)
+
+        if congested:
+            # 拥塞期间并发中的调用都会变慢，一次调用耗时内只减一次
+            if now - self._last_decrease >= (latency or 0.0):
+                self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                self._last_decrease = now
+        elif saturated:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+        if int(self._limit) != old:
+            logger.debug(f"Concurrency limit {self.name}: {old} -> {int(self._limit)}")
+
+    def _baseline(self) -> Optional[float]:
+        """基准耗时（调用方持有锁），无样本时返回 None"""
+        values = [v for v in (self._min_current, self._min_previous) if v is not None]
+        return min(values) if values else None
+
+    @contextmanager
+    def slot(self, deadline: Optional[Deadline] = None):
+        """
+        占用一个并发名额执行一次调用
+
+        用法:
+            with limiter.slot(deadline) as call:
+                ...
+                call.cancelled()   # 调用被取消（不计入耗时统计）
+
+        Args:
+            deadline: 请求截止时间（可选，见 acquire）
+        """
+        self.acquire(deadline)
+        call = _Call()
+        start = time.monotonic()
+        try:
+            yield call
+        except BaseException:
+            if call.neutral:
+                self.release()
+            else:
+                self.release(time.monotonic() - start, ok=False)
+            raise
+        else:
+            self.release(None if call.neutral else time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aslot(self, deadline: Optional[Deadline] = None):
+        """占用一个并发名额执行一次调用（异步版 slot）"""
+        await self.aacquire(deadline)
+        call = _Call()
+        start = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # 协程被取消（客户端断开等），不作为后端负载信号
+            self.release()
+            raise
+        except BaseException:
+            if call.neutral:
+                self.release()
+            else:
+                self.release(time.monotonic() - start, ok=False)
+            raise
+        else:
+            self.release(None if call.neutral else time.monotonic() - start)
+
+    def stats(self) -> Dict[str, float]:
+        """当前并发上限、执行中调用数、基准耗时"""
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "inflight": self._inflight,
+                "baseline": self._baseline() or 0.0,
+            }
+
+
+def _set_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Call:
+    """slot() 中的一次调用"""
+
+    def __init__(self):
+        self.neutral = False
+
+    def cancelled(self):
+        """调用因截止时间 / 客户端取消而中断，不作为后端负载信号"""
+        self.neutral = True
+
+
+# 全局注册表：同一后端 + 模型的所有引擎实例共用一个限制器
+_limiters: Dict[Tuple[str, str, str], AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# 新建限制器的默认参数（服务启动时可通过 configure_limiters 修改）
+_defaults = {"initial": 4, "min_limit": 1, "max_limit": 16}
+
+
+def configure_limiters(initial: Optional[int] = None, min_limit: Optional[int] = None,
+                       max_limit: Optional[int] = None):
+    """
+    设置之后新建的限制器的默认参数
+
+    Args:
+        initial: 初始并发数
+        min_limit: 并发数下限
+        max_limit: 并发数上限
+    """
+    for key, value in (("initial", initial), ("min_limit", min_limit), ("max_limit", max_limit)):
+        if value is not None:
+            _defaults[key] = value
+
+
+def get_limiter(backend: str, api_base: str, model: str) -> AdaptiveLimiter:
+    """
+    获取后端 + 模型对应的限制器（不存在时创建）
+
+    Args:
+        backend: 后端名称（ollama / vllm）
+        api_base: API 地址（同名后端可能部署多个）
+        model: 模型名称
+
+    Returns:
+        限制器
+    """
+    key = (backend, api_base, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveLimiter(name=f"{backend}/{model}", **_defaults)
+        return limiter
+
+
+def all_limiters() -> Dict[Tuple[str, str, str], AdaptiveLimiter]:
+    """所有限制器（键为 (backend, api_base, model)）"""
+    with _limiters_lock:
+        return dict(_limiters)
@@ -0,0 +1,887 @@
+"""
+OpenAI 兼容 API 推理引擎基类
+Ollama 和 vLLM 都提供 OpenAI 兼容接口，共用同一套调用逻辑
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Sequence, Tuple, Awaitable
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, APITimeoutError
+
+from .deadline import Deadline, DeadlineExceeded
+from .limiter import get_limiter
+from .circuit_breaker import get_breaker, CircuitOpenError, CLOSED
+from .cache import LLMCache
+from .json_stream import JSONFieldScanner
+from .hedge import HedgeTracker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OutputTruncated(ValueError):
+    """JSON 输出达到 max_tokens 被截断（输出不完整，不能解析）"""
+    pass
+
+
+class OpenAICompatibleEngine:
+    """OpenAI 兼容 API 推理引擎基类"""
+
+    # 后端名称（子类覆盖）
+    backend = "openai"
+
+    # 同步对冲调用的线程数（每个引擎一个线程池，只有 hedge=True 的调用使用）
+    HEDGE_WORKERS = 32
+
+    def __init__(
+        self,
+        model_name: str,
+        api_base: str,
+        api_key: str,
+        temperature: float = 0.1,
+        max_tokens: int = 2048,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        cache: Optional[LLMCache] = None,
+        structured_output: bool = True,
+    ):
+        """
+        初始化推理引擎
+
+        Args:
+            model_name: 模型名称
+            api_base: API 地址
+            api_key: API 密钥
+            temperature: 采样温度
+            max_tokens: 最大生成 token 数
+            max_connections: 连接池最大连接数（同步 / 异步客户端各一个连接池）
+            max_keepalive_connections: 保持空闲的最大连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            timeout: 单次调用超时（秒，流式调用为两次输出之间的最长间隔；不超过截止时间的剩余时间）
+            connect_timeout: 建立连接超时（秒）
+            max_retries: 连接失败、5xx 等错误的自动重试次数（由 RouterEngine 换地址重试时为 0）
+            cache: generate_json 的响应缓存（可选，多个引擎可共用）
+            structured_output: 传入 schema 时是否使用约束解码（后端不支持时关闭，只使用 JSON 模式）
+        """
+        self.model_name = model_name
+        self.api_base = api_base
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.structured_output = structured_output
+
+        # 连接池和超时（同步和异步客户端共用同一套配置）
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._max_retries = max_retries
+
+        # token 用量统计（多个扫描线程共用同一个引擎）
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.early_stops = 0
+        self._usage_lock = threading.Lock()
+        self._init_hedging()
+
+        # 自适应并发限制（同一后端 + 模型的所有引擎实例共用）
+        self.limiter = get_limiter(self.backend, api_base, model_name)
+        # 熔断器（同一后端地址 + 模型共用）：后端故障或明显变慢时调用立即失败
+        self.breaker = get_breaker(self.backend, api_base, model_name)
+
+        # 初始化 OpenAI 客户端（客户端内部维护 HTTP 连接池，应长期复用）
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=api_base,
+            max_retries=max_retries,
+            http_client=httpx.Client(limits=self._limits, timeout=self._timeout),
+        )
+
+        # 异步客户端在首次 agenerate 时创建（连接池绑定到当时的事件循环）
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        logger.info(f"{type(self).__name__} initialized with model: {model_name}")
+
+    def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+        deadline: Optional[Deadline] = None,
+        stop: Optional[Callable[[str], bool]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        生成文本
+
+        Args:
+            prompt: 输入提示词
+            temperature: 采样温度（可选，覆盖默认值）
+            max_tokens: 最大生成 token 数（可选，覆盖默认值）
+            json_mode: 是否启用 JSON 模式
+            deadline: 请求截止时间（可选，到期或取消后中断生成）
+            stop: 提前停止条件（可选，依次传入新生成的文本，返回 True 时中断生成）
+            schema: 输出的 JSON Schema（可选，JSON 模式下约束解码，输出必然符合 Schema）
+
+        Returns:
+            生成的文本
+
+        Raises:
+            DeadlineExceeded: 截止时间已到或请求已取消
+            CircuitOpenError: 熔断中，调用未发出
+            OutputTruncated: JSON 模式下输出达到 max_tokens 被截断
+        """
+        try:
+            kwargs = self._build_request(prompt, temperature, max_tokens, json_mode, schema)
+
+            # 熔断中直接失败（不排队，也不等待连接超时）
+            with self.breaker.call(deadline) as breaker_call:
+                # 等待并发名额（超过后端当前承受能力的调用在这里排队）
+                with self.limiter.slot(deadline) as call:
+                    breaker_call.started()
+                    try:
+                        if deadline is not None or stop is not None:
+                            # 有截止时间或停止条件时使用流式调用，逐块检查，
+                            # 到期或满足条件后关闭连接（后端随之停止生成）
+                            if deadline is not None:
+                                deadline.check("generation")
+                            generated_text, finish_reason = self._generate_until(kwargs, deadline, stop)
+                        else:
+                            # 调用 API
+                            response = self.client.chat.completions.create(**kwargs)
+                            self._record_usage(response.usage)
+
+                            # 提取生成的文本
+                            generated_text = response.choices[0].message.content
+                            finish_reason = response.choices[0].finish_reason
+                    except DeadlineExceeded:
+                        call.cancelled()
+                        raise
+
+            # 在熔断 / 并发统计之外检查：截断是 max_tokens 不够，不是后端故障
+            self._check_truncated(json_mode, finish_reason, kwargs)
+
+            logger.info(f"Generated text length: {len(generated_text)}")
+            return generated_text
+
+        except DeadlineExceeded as e:
+            logger.warning(f"Generation aborted: {e}")
+            raise
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during generation: {e}")
+            raise
+
+    def _check_truncated(self, json_mode: bool, finish_reason: Optional[str], kwargs: Dict[str, Any]):
+        """
+        JSON 输出达到 max_tokens 被截断时抛出 OutputTruncated
+
+        截断的 JSON 不能解析（约束解码也只保证完整输出时符合 Schema），
+        明确报错而不是在解析时报出难以定位的 JSONDecodeError
+        """
+        if json_mode and finish_reason == "length":
+            raise OutputTruncated(f"JSON output truncated at max_tokens={kwargs['max_tokens']}")
+
+    def _build_request(
+        self,
+        prompt: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        json_mode: bool,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """构建 chat.completions.create 参数"""
+        kwargs = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature if temperature is not None else self.temperature,
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
+        }
+
+        # 如果启用 JSON 模式
+        if json_mode:
+            if schema is not None and self.structured_output:
+                kwargs.update(self._schema_request(schema))
+            else:
+                kwargs["response_format"] = {"type": "json_object"}
+
+        return kwargs
+
+    def _schema_request(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        约束解码的请求参数（OpenAI 的 json_schema 格式，Ollama 将其转换为 format 参数）
+
+        Args:
+            schema: 输出的 JSON Schema
+
+        Returns:
+            合并到 chat.completions.create 的参数
+        """
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "output", "schema": schema},
+            }
+        }
+
+    def _generate_until(
+        self,
+        kwargs: Dict[str, Any],
+        deadline: Optional[Deadline],
+        stop: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        流式生成，直到完成、截止时间到期或满足停止条件
+
+        Args:
+            kwargs: chat.completions.create 参数
+            deadline: 请求截止时间（可选）
+            stop: 提前停止条件（可选）
+
+        Returns:
+            (生成的文本, 结束原因（提前停止时为 None）)
+        """
+        client = self.client
+        options = self._deadline_options(deadline)
+        if options is not None:
+            # 复用同一个 HTTP 连接池
+            client = client.with_options(**options)
+        try:
+            stream = client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+        except APITimeoutError:
+            self._check_timeout(deadline)
+            raise
+
+        parts = []
+        usage = None
+        stopped = False
+        finish_reason = None
+        try:
+            for chunk in stream:
+                if deadline is not None:
+                    deadline.check("generation finished")
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content = chunk.choices[0].delta.content
+                    parts.append(content)
+                    if stop is not None and stop(content):
+                        stopped = True
+                        break
+        except APITimeoutError:
+            self._check_timeout(deadline)
+            raise
+        finally:
+            stream.close()
+
+        self._record_usage(usage, chunks=len(parts), stopped=stopped)
+        return "".join(parts), finish_reason
+
+    def _deadline_options(self, deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+        """
+        有截止时间的调用的客户端参数（超时和自动重试），不需要修改时为 None
+
+        - 超时取 timeout 与剩余时间中较小的一个：后端 timeout 秒内没有输出时按后端故障处理
+          （APITimeoutError，多地址时摘除该地址并换地址重试），而不是一直等到截止时间
+        - 自动重试只在剩余时间还够每次都用满 timeout 时保留
+        - 不会到期的截止时间（只用于取消）保留客户端默认的超时和重试
+        """
+        if deadline is None:
+            return None
+        remaining = deadline.remaining()
+        if remaining == float("inf"):
+            return None
+        timeout = min(self.timeout, remaining)
+        return {
+            "timeout": httpx.Timeout(timeout, connect=min(self._timeout.connect, timeout)),
+            "max_retries": max(0, min(self._max_retries, int(remaining // self.timeout) - 1)),
+        }
+
+    def _check_timeout(self, deadline: Optional[Deadline]):
+        """
+        流式调用超时：截止时间已到时抛出 DeadlineExceeded，
+        否则是后端在 timeout 秒内没有输出，由调用方按后端故障处理
+        """
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded("deadline exceeded during generation")
+
+    def _record_usage(self, usage, chunks: int = 0, stopped: bool = False):
+        """
+        累计 token 用量
+
+        后端未返回 usage 时（如提前停止的流式调用）按流式块数估算输出 token 数
+        （Ollama / vLLM 每个块约一个 token），输入 token 不计。
+        """
+        with self._usage_lock:
+            self.requests += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+            else:
+                self.completion_tokens += chunks
+            if stopped:
+                self.early_stops += 1
+
+    def usage_stats(self) -> Dict[str, int]:
+        """累计请求数和 token 用量"""
+        with self._usage_lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "early_stops": self.early_stops,
+                **self.hedger.stats(),
+            }
+
+    def generate_json(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        required: Optional[Sequence[str]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        hedge: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        生成 JSON 格式输出
+
+        Args:
+            prompt: 输入提示词（需要明确要求返回 JSON）
+            temperature: 采样温度
+            max_tokens: 最大生成 token 数
+            deadline: 请求截止时间（可选）
+            required: 需要的顶层字段（可选，全部完整输出后立即停止生成，
+                只返回已完整输出的字段）
+            schema: 输出的 JSON Schema（可选，约束解码，不会输出说明文字或被截断的多余字段）
+            hedge: 是否对冲（超过同类调用最近耗时的 p90 仍未返回时再发一个相同的调用，
+                取先返回的有效 JSON，取消另一个）
+
+        Returns:
+            解析后的 JSON 字典
+        """
+        prompt = self._json_prompt(prompt)
+
+        # 相同提示词的确定性调用直接返回缓存的结果
+        cache_key = self._cache_key(prompt, temperature, max_tokens, required, schema)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._parse_json(cached)
+
+        # 生成文本并解析
+        def attempt(attempt_deadline: Optional[Deadline]) -> Tuple[Dict[str, Any], str]:
+            return self._generate_parsed(
+                prompt, temperature, max_tokens, attempt_deadline, required, schema
+            )
+
+        if hedge:
+            result, text = self._generate_hedged(attempt, deadline, max_tokens)
+        else:
+            result, text = attempt(deadline)
+
+        # 只缓存能解析的输出
+        if cache_key is not None:
+            self.cache.put(cache_key, text)
+        return result
+
+    def _generate_parsed(
+        self,
+        prompt: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Optional[Deadline],
+        required: Optional[Sequence[str]],
+        schema: Optional[Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        生成并解析一次 JSON（成功时记录耗时，作为对冲延迟的依据）
+
+        Returns:
+            (解析后的 JSON 字典, 用于缓存的文本)
+        """
+        start = time.monotonic()
+        required = self._early_stop_fields(required, schema)
+        scanner = JSONFieldScanner(required) if required else None
+        text = self.generate(
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=True,
+            deadline=deadline,
+            stop=scanner.feed if scanner is not None else None,
+            schema=schema,
+        )
+        parsed = self._parse_partial_json(text, scanner)
+        self.hedger.record(max_tokens, time.monotonic() - start)
+        return parsed
+
+    def _early_stop_fields(
+        self,
+        required: Optional[Sequence[str]],
+        schema: Optional[Dict[str, Any]],
+    ) -> Optional[Sequence[str]]:
+        """
+        需要提前停止的字段
+
+        约束解码的 Schema 不允许多余字段、且只包含 required 中的字段时，这些字段输出完整后
+        只剩一个右括号，提前停止节省不了解码时间，反而要走流式调用（不能自动重试），此时返回 None
+        """
+        if not required or schema is None or not self.structured_output:
+            return required
+        if schema.get("additionalProperties") is False and set(schema.get("properties", {})) <= set(required):
+            return None
+        return required
+
+    def _cache_key(
+        self,
+        prompt: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        required: Optional[Sequence[str]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> Optional[str]:
+        """generate_json 的缓存键（未启用缓存或调用不可缓存时返回 None）"""
+        if self.cache is None:
+            return None
+        temperature = temperature if temperature is not None else self.temperature
+        if not self.cache.cacheable(temperature):
+            return None
+        max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+        return self.cache.make_key(
+            self.backend, self.model_name, prompt, temperature, max_tokens, json_mode=True,
+            fields=required,
+            schema=schema if self.structured_output else None,
+        )
+
+    def _json_prompt(self, prompt: str) -> str:
+        """在提示词中明确要求 JSON 格式"""
+        if "json" not in prompt.lower():
+            prompt = f"{prompt}\n\nPlease respond with a valid JSON object only."
+        return prompt
+
+    def _parse_partial_json(
+        self,
+        text: str,
+        scanner: Optional[JSONFieldScanner],
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        解析可能提前停止的 JSON 输出
+
+        Returns:
+            (解析后的 JSON 字典, 用于缓存的文本)
+        """
+        if scanner is not None and scanner.complete:
+            try:
+                return json.loads(text), text
+            except json.JSONDecodeError:
+                # 提前停止，输出不是完整的 JSON，只取已完整输出的字段
+                result = scanner.result()
+                return result, json.dumps(result, ensure_ascii=False)
+        return self._parse_json(text), text
+
+    def _parse_json(self, text: str) -> Dict[str, Any]:
+        """解析 JSON 输出"""
+        try:
+            # 尝试直接解析
+            return json.loads(text)
+        except json.JSONDecodeError:
+            # 如果失败，尝试提取 JSON 部分
+            logger.warning("Failed to parse JSON directly, trying to extract...")
+            return self._extract_json(text)
+
+    # ==================== 异步接口 ====================
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        异步客户端（每个事件循环一个，在首次使用时创建）
+
+        httpx.AsyncClient 的连接绑定到创建时的事件循环，
+        在新的事件循环中（如 CLI 多次 asyncio.run）使用时重新创建。
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.api_base,
+                max_retries=self._max_retries,
+                http_client=httpx.AsyncClient(limits=self._limits, timeout=self._timeout),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def agenerate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+        deadline: Optional[Deadline] = None,
+        stop: Optional[Callable[[str], bool]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        生成文本（异步，参数与 generate 相同）
+
+        等待 LLM 期间不占用线程，大量并发调用只是大量协程；
+        实际发往后端的并发数仍由自适应并发限制决定。
+
+        Returns:
+            生成的文本
+
+        Raises:
+            DeadlineExceeded: 截止时间已到或请求已取消
+            CircuitOpenError: 熔断中，调用未发出
+            OutputTruncated: JSON 模式下输出达到 max_tokens 被截断
+        """
+        try:
+            kwargs = self._build_request(prompt, temperature, max_tokens, json_mode, schema)
+
+            with self.breaker.call(deadline) as breaker_call:
+                async with self.limiter.aslot(deadline) as call:
+                    breaker_call.started()
+                    try:
+                        if deadline is not None or stop is not None:
+                            if deadline is not None:
+                                deadline.check("generation")
+                            generated_text, finish_reason = await self._agenerate_until(kwargs, deadline, stop)
+                        else:
+                            response = await self.async_client.chat.completions.create(**kwargs)
+                            self._record_usage(response.usage)
+                            generated_text = response.choices[0].message.content
+                            finish_reason = response.choices[0].finish_reason
+                    except DeadlineExceeded:
+                        call.cancelled()
+                        raise
+
+            self._check_truncated(json_mode, finish_reason, kwargs)
+
+            logger.info(f"Generated text length: {len(generated_text)}")
+            return generated_text
+
+        except DeadlineExceeded as e:
+            logger.warning(f"Generation aborted: {e}")
+            raise
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error during generation: {e}")
+            raise
+
+    async def _agenerate_until(
+        self,
+        kwargs: Dict[str, Any],
+        deadline: Optional[Deadline],
+        stop: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """流式生成，直到完成、截止时间到期或满足停止条件（异步版 _generate_until）"""
+        client = self.async_client
+        options = self._deadline_options(deadline)
+        if options is not None:
+            client = client.with_options(**options)
+        try:
+            stream = await client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+        except APITimeoutError:
+            self._check_timeout(deadline)
+            raise
+
+        parts = []
+        usage = None
+        stopped = False
+        finish_reason = None
+        try:
+            async for chunk in stream:
+                if deadline is not None:
+                    deadline.check("generation finished")
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content = chunk.choices[0].delta.content
+                    parts.append(content)
+                    if stop is not None and stop(content):
+                        stopped = True
+                        break
+        except APITimeoutError:
+            self._check_timeout(deadline)
+            raise
+        finally:
+            await stream.close()
+
+        self._record_usage(usage, chunks=len(parts), stopped=stopped)
+        return "".join(parts), finish_reason
+
+    async def agenerate_json(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        required: Optional[Sequence[str]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        hedge: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        生成 JSON 格式输出（异步，参数与 generate_json 相同）
+
+        Returns:
+            解析后的 JSON 字典
+        """
+        prompt = self._json_prompt(prompt)
+
+        cache_key = self._cache_key(prompt, temperature, max_tokens, required, schema)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._parse_json(cached)
+
+        def attempt(attempt_deadline: Optional[Deadline]) -> Awaitable[Tuple[Dict[str, Any], str]]:
+            return self._agenerate_parsed(
+                prompt, temperature, max_tokens, attempt_deadline, required, schema
+            )
+
+        if hedge:
+            result, text = await self._agenerate_hedged(attempt, deadline, max_tokens)
+        else:
+            result, text = await attempt(deadline)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, text)
+        return result
+
+    async def _agenerate_parsed(
+        self,
+        prompt: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Optional[Deadline],
+        required: Optional[Sequence[str]],
+        schema: Optional[Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], str]:
+        """生成并解析一次 JSON（异步版 _generate_parsed）"""
+        start = time.monotonic()
+        required = self._early_stop_fields(required, schema)
+        scanner = JSONFieldScanner(required) if required else None
+        text = await self.agenerate(
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=True,
+            deadline=deadline,
+            stop=scanner.feed if scanner is not None else None,
+            schema=schema,
+        )
+        parsed = self._parse_partial_json(text, scanner)
+        self.hedger.record(max_tokens, time.monotonic() - start)
+        return parsed
+
+    async def aclose(self):
+        """关闭同步和异步客户端"""
+        if self._async_client is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_client.close()
+        self._async_client = None
+        self._async_loop = None
+        self.close()
+
+    # ==================== 对冲请求 ====================
+
+    def _init_hedging(self):
+        """初始化对冲统计（线程池在首次对冲时创建）"""
+        self.hedger = HedgeTracker()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._hedge_pool_lock = threading.Lock()
+
+    def _can_hedge(self) -> bool:
+        """是否还有空闲的并发名额（后端已饱和或熔断时对冲只会加重排队）"""
+        if self.breaker.state != CLOSED:
+            return False
+        stats = self.limiter.stats()
+        return stats["inflight"] < stats["limit"]
+
+    @property
+    def hedge_pool(self) -> ThreadPoolExecutor:
+        """同步对冲调用的线程池"""
+        with self._hedge_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=self.HEDGE_WORKERS, thread_name_prefix="llm-hedge"
+                )
+            return self._hedge_pool
+
+    def _generate_hedged(
+        self,
+        attempt: Callable[[Optional[Deadline]], Tuple[Dict[str, Any], str]],
+        deadline: Optional[Deadline],
+        key: Any,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        对冲执行 attempt：超过同类调用最近耗时的 p90 仍未返回时再执行一次，取先成功的结果
+
+        第一次在调用方线程中执行，只有对冲的一次提交到线程池（由定时器触发）。
+        每次执行使用请求截止时间的子截止时间（没有截止时间时不会到期，只用于取消），
+        结束后取消仍在进行的另一次（流式调用在收到下一个输出块时关闭连接，后端随之停止生成）。
+
+        Args:
+            attempt: 生成并解析一次 JSON
+            deadline: 请求截止时间（可选）
+            key: 耗时统计的分类
+
+        Returns:
+            attempt 的返回值
+        """
+        delay = self.hedger.delay(key)
+        if delay is None:
+            return attempt(deadline)
+
+        parent = deadline if deadline is not None else Deadline.never()
+        primary_deadline = parent.child()
+        hedge_deadline = parent.child()
+        lock = threading.Lock()
+        state = {"finished": False, "hedge": None}
+
+        def on_hedge_done(future):
+            # 对冲的一次先成功时中断第一次，调用方线程随之返回
+            if not future.cancelled() and future.exception() is None:
+                primary_deadline.cancel()
+
+        def fire():
+            with lock:
+                if state["finished"] or not self._can_hedge():
+                    return
+                self.hedger.record_fired()
+                logger.info(f"Hedging LLM call after {delay:.2f}s: {self.model_name}")
+                state["hedge"] = self.hedge_pool.submit(attempt, hedge_deadline)
+            state["hedge"].add_done_callback(on_hedge_done)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        timer.start()
+        try:
+            try:
+                return attempt(primary_deadline)
+            except BaseException as e:
+                with lock:
+                    state["finished"] = True
+                    hedge = state["hedge"]
+                if hedge is None:
+                    raise
+                # 第一次失败（或被先成功的对冲中断）时等待对冲的结果
+                try:
+                    result = hedge.result()
+                except BaseException:
+                    raise e
+                self.hedger.record_won()
+                return result
+        finally:
+            with lock:
+                state["finished"] = True
+            timer.cancel()
+            hedge_deadline.cancel()
+            primary_deadline.cancel()
+
+    async def _agenerate_hedged(
+        self,
+        attempt: Callable[[Optional[Deadline]], Awaitable[Tuple[Dict[str, Any], str]]],
+        deadline: Optional[Deadline],
+        key: Any,
+    ) -> Tuple[Dict[str, Any], str]:
+        """对冲执行 attempt（异步版 _generate_hedged，另一次调用直接取消协程）"""
+        delay = self.hedger.delay(key)
+        if delay is None:
+            return await attempt(deadline)
+
+        primary = asyncio.ensure_future(attempt(deadline))
+        tasks = [primary]
+        hedge = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._can_hedge():
+                self.hedger.record_fired()
+                logger.info(f"Hedging LLM call after {delay:.2f}s: {self.model_name}")
+                hedge = asyncio.ensure_future(attempt(deadline))
+                tasks.append(hedge)
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedger.record_won()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _close_hedge_pool(self):
+        """关闭对冲线程池（不等待仍在进行的调用）"""
+        with self._hedge_pool_lock:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+
+    def _extract_json(self, text: str) -> Dict[str, Any]:
+        """从文本中提取 JSON"""
+        # 查找 JSON 代码块
+        if "```json" in text:
+            start = text.find("```json") + 7
+            end = text.find("```", start)
+            json_text = text[start:end].strip()
+        elif "{" in text and "}" in text:
+            start = text.find("{")
+            end = text.rfind("}") + 1
+            json_text = text[start:end]
+        else:
+            raise ValueError("No valid JSON found in response")
+
+        return json.loads(json_text)
+
+    def test_connection(self) -> bool:
+        """测试与推理服务的连接"""
+        try:
+            response = self.generate("Hello", max_tokens=10)
+            logger.info("Connection test successful")
+            return True
+        except Exception as e:
+            logger.error(f"Connection test failed: {e}")
+            return False
+
+    def close(self):
+        """关闭客户端，释放 HTTP 连接池"""
+        self._close_hedge_pool()
+        self.client.close()
+        logger.info(f"{type(self).__name__} closed: {self.model_name}")
@@ -0,0 +1,364 @@
+"""
+多地址 LLM 路由 - 同一模型部署在多台 Ollama / vLLM 主机上时，按负载分发调用
+每次调用发往 (进行中调用数 + 1) × 最近耗时 最小的健康地址，出错或无响应的地址暂时摘除，到期后自动恢复
+"""
+
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable, List, Sequence, Set, Type
+
+from openai import APIConnectionError, InternalServerError
+
+from .openai_engine import OpenAICompatibleEngine
+from .ollama_engine import OllamaEngine
+from .deadline import Deadline
+from .circuit_breaker import CircuitOpenError, OPEN
+from .cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# 换地址重试的错误：连接失败、超时（APITimeoutError 是 APIConnectionError 的子类）、5xx
+# （4xx 是请求本身的问题，换地址也一样）
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError)
+
+
+class _Endpoint:
+    """单个地址的引擎和负载状态（由 RouterEngine 的锁保护）"""
+
+    def __init__(self, engine: OpenAICompatibleEngine):
+        self.engine = engine
+        self.api_base = engine.api_base
+        self.inflight = 0
+        self.latency: Optional[float] = None  # 最近耗时（指数移动平均，秒）
+        self.failures = 0                     # 连续失败次数
+        self.ejected_until = 0.0              # 摘除到期时间（monotonic）
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class RouterEngine(OpenAICompatibleEngine):
+    """
+    多地址 LLM 路由引擎（可直接作为各解析器的 llm_engine）
+
+    - 每个地址一个引擎（各自的连接池和自适应并发限制），路由引擎本身不持有客户端
+    - 选择 (进行中调用数 + 1) × 最近耗时 最小的健康地址；尚无耗时记录的地址按最快地址估算
+    - 连接失败、超时、5xx 时摘除该地址并换下一个地址重试（流式输出已开始时不重试）；
+      地址 attempt_timeout 秒内没有输出即视为超时（截止时间还有剩余时不等到截止时间），
+      截止时间本身到期时抛出 DeadlineExceeded，不摘除地址
+      摘除时间从 eject_seconds 起按连续失败次数翻倍，到期后恢复接收请求，成功一次即清零
+    - 所有地址都被摘除时仍然选择最早到期的地址，不直接失败
+    - 某个地址熔断（见 CircuitBreaker）时直接换下一个地址，所有地址都熔断时抛出 CircuitOpenError
+    - generate_json 的缓存、提前停止、约束解码、对冲逻辑与单地址引擎相同（由基类实现），
+      对冲调用按负载选择地址，通常发往另一个地址
+    """
+
+    def __init__(
+        self,
+        api_bases: Sequence[str],
+        model_name: str,
+        engine_cls: Type[OpenAICompatibleEngine] = OllamaEngine,
+        temperature: float = 0.1,
+        max_tokens: int = 2048,
+        cache: Optional[LLMCache] = None,
+        structured_output: bool = True,
+        eject_seconds: float = 5.0,
+        max_eject_seconds: float = 60.0,
+        latency_alpha: float = 0.3,
+        attempt_timeout: float = 30.0,
+        **kwargs,
+    ):
+        """
+        初始化路由引擎
+
+        Args:
+            api_bases: 各地址的 API 地址（OpenAI 兼容接口）
+            model_name: 模型名称（各地址部署相同的模型）
+            engine_cls: 各地址使用的引擎类（OllamaEngine / VLLMEngine）
+            temperature: 采样温度
+            max_tokens: 最大生成 token 数
+            cache: generate_json 的响应缓存（在路由引擎上缓存，各地址的引擎不缓存）
+            structured_output: 传入 schema 时是否使用约束解码
+            eject_seconds: 首次摘除时间（秒）
+            max_eject_seconds: 最长摘除时间（秒）
+            latency_alpha: 耗时移动平均的权重（越大越看重最近一次调用）
+            attempt_timeout: 单个地址多久没有输出视为无响应（秒，摘除并换地址重试）
+            **kwargs: 各地址引擎的连接池和超时参数（见 OpenAICompatibleEngine）
+        """
+        if not api_bases:
+            raise ValueError("RouterEngine requires at least one api_base")
+
+        # 不调用基类 __init__：生成请求转发给各地址的引擎，这里只设置基类 JSON 逻辑用到的属性
+        self.backend = engine_cls.backend
+        self.model_name = model_name
+        self.api_base = ",".join(api_bases)
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.structured_output = structured_output
+
+        self.timeout = kwargs.get("timeout", 120.0)
+        self._usage_lock = threading.Lock()
+        self._init_hedging()
+
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.latency_alpha = latency_alpha
+
+        # 失败由路由换地址重试，各地址的客户端不再自行重试；
+        # 各地址的超时不超过 attempt_timeout，无响应的地址在截止时间之前就能摘除
+        kwargs["max_retries"] = 0
+        kwargs["timeout"] = min(self.timeout, attempt_timeout)
+        self.endpoints = [
+            _Endpoint(engine_cls(
+                model_name=model_name,
+                api_base=api_base,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                structured_output=structured_output,
+                **kwargs,
+            ))
+            for api_base in api_bases
+        ]
+        self._lock = threading.Lock()
+
+        logger.info(f"RouterEngine initialized with model: {model_name}, endpoints: {list(api_bases)}")
+
+    @property
+    def engines(self) -> List[OpenAICompatibleEngine]:
+        """各地址的引擎"""
+        return [endpoint.engine for endpoint in self.endpoints]
+
+    # ==================== 选择地址 ====================
+
+    def _acquire(self, tried: Set[_Endpoint]) -> _Endpoint:
+        """选择负载最低的健康地址，并计入进行中调用"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in tried]
+            # 熔断中的地址调用会立即失败，优先选择其他地址
+            healthy = [e for e in candidates if e.healthy(now) and e.engine.breaker.state != OPEN]
+            if healthy:
+                known = [e.latency for e in self.endpoints if e.latency is not None]
+                default = min(known) if known else 1.0
+                endpoint = min(
+                    healthy,
+                    key=lambda e: (e.inflight + 1) * (e.latency if e.latency is not None else default),
+                )
+            else:
+                # 全部被摘除：选择最早恢复的地址
+                endpoint = min(candidates, key=lambda e: e.ejected_until)
+            endpoint.inflight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint: _Endpoint, latency: Optional[float], failed: bool = False):
+        """
+        调用结束
+
+        Args:
+            endpoint: 调用的地址
+            latency: 成功调用的耗时（失败或被取消时为 None）
+            failed: 是否因地址故障失败（摘除该地址）
+        """
+        with self._lock:
+            endpoint.inflight -= 1
+            if latency is not None:
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.latency_alpha * (latency - endpoint.latency)
+            elif failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                endpoint.ejections += 1
+                duration = min(
+                    self.max_eject_seconds,
+                    self.eject_seconds * 2 ** (endpoint.failures - 1),
+                )
+                endpoint.ejected_until = time.monotonic() + duration
+                logger.warning(f"LLM endpoint {endpoint.api_base} ejected for {duration:.0f}s")
+
+    def _should_retry(
+        self,
+        tried: Set[_Endpoint],
+        streamed: bool,
+        deadline: Optional[Deadline],
+    ) -> bool:
+        """地址故障后是否换地址重试"""
+        if streamed or len(tried) >= len(self.endpoints):
+            return False
+        return deadline is None or not deadline.expired
+
+    @staticmethod
+    def _track_stop(stop: Optional[Callable[[str], bool]], state: Dict[str, bool]):
+        """包装 stop 回调，记录是否已经输出过内容（输出开始后不能换地址重试）"""
+        if stop is None:
+            return None
+
+        def tracked(content: str) -> bool:
+            state["streamed"] = True
+            return stop(content)
+        return tracked
+
+    # ==================== 生成 ====================
+
+    def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+        deadline: Optional[Deadline] = None,
+        stop: Optional[Callable[[str], bool]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        生成文本（参数与 OpenAICompatibleEngine.generate 相同，发往负载最低的健康地址）
+
+        Returns:
+            生成的文本
+        """
+        tried: Set[_Endpoint] = set()
+        state = {"streamed": False}
+        tracked_stop = self._track_stop(stop, state)
+
+        while True:
+            endpoint = self._acquire(tried)
+            tried.add(endpoint)
+            start = time.monotonic()
+            try:
+                text = endpoint.engine.generate(
+                    prompt=prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    json_mode=json_mode,
+                    deadline=deadline,
+                    stop=tracked_stop,
+                    schema=schema,
+                )
+            except CircuitOpenError:
+                # 熔断的地址调用未发出，不摘除，直接换地址
+                self._release(endpoint, None)
+                if len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except RETRYABLE_ERRORS as e:
+                self._release(endpoint, None, failed=True)
+                if not self._should_retry(tried, state["streamed"], deadline):
+                    raise
+                logger.warning(f"LLM endpoint {endpoint.api_base} failed, retrying on another endpoint: {e}")
+                continue
+            except BaseException:
+                self._release(endpoint, None)
+                raise
+
+            self._release(endpoint, time.monotonic() - start)
+            return text
+
+    async def agenerate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+        deadline: Optional[Deadline] = None,
+        stop: Optional[Callable[[str], bool]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        生成文本（异步，参数与 generate 相同）
+
+        Returns:
+            生成的文本
+        """
+        tried: Set[_Endpoint] = set()
+        state = {"streamed": False}
+        tracked_stop = self._track_stop(stop, state)
+
+        while True:
+            endpoint = self._acquire(tried)
+            tried.add(endpoint)
+            start = time.monotonic()
+            try:
+                text = await endpoint.engine.agenerate(
+                    prompt=prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    json_mode=json_mode,
+                    deadline=deadline,
+                    stop=tracked_stop,
+                    schema=schema,
+                )
+            except CircuitOpenError:
+                # 熔断的地址调用未发出，不摘除，直接换地址
+                self._release(endpoint, None)
+                if len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except RETRYABLE_ERRORS as e:
+                self._release(endpoint, None, failed=True)
+                if not self._should_retry(tried, state["streamed"], deadline):
+                    raise
+                logger.warning(f"LLM endpoint {endpoint.api_base} failed, retrying on another endpoint: {e}")
+                continue
+            except BaseException:
+                self._release(endpoint, None)
+                raise
+
+            self._release(endpoint, time.monotonic() - start)
+            return text
+
+    def _can_hedge(self) -> bool:
+        """是否有健康且还有空闲并发名额的地址"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e.engine for e in self.endpoints if e.healthy(now)]
+        return any(engine._can_hedge() for engine in healthy)
+
+    # ==================== 统计和关闭 ====================
+
+    def usage_stats(self) -> Dict[str, int]:
+        """累计请求数和 token 用量（各地址求和）"""
+        total: Dict[str, int] = {}
+        for engine in self.engines:
+            for key, value in engine.usage_stats().items():
+                total[key] = total.get(key, 0) + value
+        # 对冲在路由引擎上进行
+        total.update(self.hedger.stats())
+        return total
+
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        """各地址的负载和健康状态"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "api_base": e.api_base,
+                    "healthy": e.healthy(now),
+                    "inflight": e.inflight,
+                    "latency": e.latency,
+                    "requests": e.requests,
+                    "errors": e.errors,
+                    "ejections": e.ejections,
+                }
+                for e in self.endpoints
+            ]
+
+    async def aclose(self):
+        """关闭各地址的同步和异步客户端"""
+        for engine in self.engines:
+            await engine.aclose()
+
+    def close(self):
+        """关闭各地址的客户端"""
+        self._close_hedge_pool()
+        for engine in self.engines:
+            engine.close()
+        logger.info(f"RouterEngine closed: {self.model_name}")
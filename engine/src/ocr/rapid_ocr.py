@@ -4,6 +4,7 @@ RapidOCR 引擎封装
 """
 
 from typing import Optional, List, Dict, Any, Union
+from io import BytesIO
 from pathlib import Path
 from dataclasses import dataclass
 import numpy as np
@@ -115,49 +116,7 @@ class RapidOCREngine:
 
             # 使用 PIL 读取图片
             img = Image.open(image_path)
-            img_array = np.array(img)
-
-            # 进行 OCR 识别
-            result, elapse = self.engine(img_array)
-
-            if self.print_verbose:
-                print(f"OCR elapsed time: {elapse:.3f}s")
-
-            # 解析结果
-            if result is None or len(result) == 0:
-                return OCRResult(
-                    text="",
-                    boxes=[],
-                    scores=[],
-                    lines=[],
-                    success=True,
-                    error_message="No text detected in image",
-                )
-
-            # RapidOCR 返回格式: [[box, text, score], ...]
-            boxes = []
-            texts = []
-            scores = []
-
-            for item in result:
-                box, text, score = item
-                boxes.append(box)
-                texts.append(text)
-                scores.append(float(score))
-
-            # 合并文本
-            if merge_lines:
-                full_text = line_separator.join(texts)
-            else:
-                full_text = " ".join(texts)
-
-            return OCRResult(
-                text=full_text,
-                boxes=boxes,
-                scores=scores,
-                lines=texts,
-                success=True,
-            )
+            return self._recognize(np.array(img), merge_lines, line_separator)
 
         except Exception as e:
             return OCRResult(
@@ -176,7 +135,7 @@ class RapidOCREngine:
         line_separator: str = "\n",
     ) -> OCRResult:
         """
-        从图片字节流中提取文本
+        从图片字节流中提取文本（全程在内存中完成，不落盘）
 
         Args:
             image_bytes: 图片字节流
@@ -187,53 +146,9 @@ class RapidOCREngine:
             OCRResult: 识别结果
         """
         try:
-            from io import BytesIO
-
             # 从字节流读取图片
             img = Image.open(BytesIO(image_bytes))
-            img_array = np.array(img)
-
-            # 进行 OCR 识别
-            result, elapse = self.engine(img_array)
-
-            if self.print_verbose:
-                print(f"OCR elapsed time: {elapse:.3f}s")
-
-            # 解析结果
-            if result is None or len(result) == 0:
-                return OCRResult(
-                    text="",
-                    boxes=[],
-                    scores=[],
-                    lines=[],
-                    success=True,
-                    error_message="No text detected in image",
-                )
-
-            # RapidOCR 返回格式: [[box, text, score], ...]
-            boxes = []
-            texts = []
-            scores = []
-
-            for item in result:
-                box, text, score = item
-                boxes.append(box)
-                texts.append(text)
-                scores.append(float(score))
-
-            # 合并文本
-            if merge_lines:
-                full_text = line_separator.join(texts)
-            else:
-                full_text = " ".join(texts)
-
-            return OCRResult(
-                text=full_text,
-                boxes=boxes,
-                scores=scores,
-                lines=texts,
-                success=True,
-            )
+            return self._recognize(np.array(img), merge_lines, line_separator)
 
         except Exception as e:
             return OCRResult(
@@ -245,6 +160,60 @@ class RapidOCREngine:
                 error_message=f"OCR failed: {str(e)}",
             )
 
+    def _recognize(
+        self,
+        img_array: np.ndarray,
+        merge_lines: bool,
+        line_separator: str,
+    ) -> OCRResult:
+        """对已解码的图片执行 OCR 并组装结果"""
+        # 进行 OCR 识别（按初始化配置启用检测 / 角度分类 / 识别）
+        result, elapse = self.engine(
+            img_array,
+            use_det=self.use_text_det,
+            use_cls=self.use_angle_cls,
+            use_rec=self.use_text_rec,
+        )
+
+        if self.print_verbose:
+            print(f"OCR elapsed time: {elapse:.3f}s")
+
+        # 解析结果
+        if result is None or len(result) == 0:
+            return OCRResult(
+                text="",
+                boxes=[],
+                scores=[],
+                lines=[],
+                success=True,
+                error_message="No text detected in image",
+            )
+
+        # RapidOCR 返回格式: [[box, text, score], ...]
+        boxes = []
+        texts = []
+        scores = []
+
+        for item in result:
+            box, text, score = item
+            boxes.append(box)
+            texts.append(text)
+            scores.append(float(score))
+
+        # 合并文本
+        if merge_lines:
+            full_text = line_separator.join(texts)
+        else:
+            full_text = " ".join(texts)
+
+        return OCRResult(
+            text=full_text,
+            boxes=boxes,
+            scores=scores,
+            lines=texts,
+            success=True,
+        )
+
     def batch_extract(
         self,
         image_paths: List[Union[str, Path]],
@@ -266,6 +235,29 @@ class RapidOCREngine:
             results.append(result)
         return results
 
+    def warm_up(self) -> float:
+        """
+        预热：对一张带文字的小图执行一次完整识别
+        首次推理会创建 ONNX 会话并优化计算图，耗时远高于后续推理
+
+        Returns:
+            float: 预热耗时（秒）
+        """
+        import time
+        from PIL import ImageDraw
+
+        img = Image.new("RGB", (320, 64), "white")
+        ImageDraw.Draw(img).text((10, 20), "Total 12.50", fill="black")
+
+        t = time.time()
+        self.engine(
+            np.array(img),
+            use_det=self.use_text_det,
+            use_cls=self.use_angle_cls,
+            use_rec=self.use_text_rec,
+        )
+        return time.time() - t
+
     def test_connection(self) -> bool:
         """
         测试 OCR 引擎是否可用
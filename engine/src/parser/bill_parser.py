@@ -8,8 +8,10 @@ from typing import Optional
 from jsonschema import validate, ValidationError
 
 from ..models import Invoice, InvoiceParseResult
-from ..llm import VLLMEngine
+from ..llm import VLLMEngine, Deadline, DeadlineExceeded, CircuitOpenError
 from ..prompts import PromptTemplate
+from .schema import INVOICE_SCHEMA, reduce_schema
+from .rule_fallback import rule_only_result
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,44 +20,16 @@ logger = logging.getLogger(__name__)
 class BillParser:
     """智能账单解析器"""
 
-    # JSON Schema 用于验证输出
-    INVOICE_SCHEMA = {
-        "type": "object",
-        "properties": {
-            "invoice_type": {"type": ["string", "null"]},
-            "invoice_number": {"type": ["string", "null"]},
-            "invoice_date": {"type": ["string", "null"]},
-            "seller_name": {"type": ["string", "null"]},
-            "seller_tax_id": {"type": ["string", "null"]},
-            "seller_address": {"type": ["string", "null"]},
-            "seller_phone": {"type": ["string", "null"]},
-            "seller_bank": {"type": ["string", "null"]},
-            "seller_account": {"type": ["string", "null"]},
-            "buyer_name": {"type": ["string", "null"]},
-            "buyer_tax_id": {"type": ["string", "null"]},
-            "buyer_address": {"type": ["string", "null"]},
-            "buyer_phone": {"type": ["string", "null"]},
-            "subtotal": {"type": ["number", "null"]},
-            "tax_amount": {"type": ["number", "null"]},
-            "total_amount": {"type": ["number", "null"]},
-            "items": {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string"},
-                        "quantity": {"type": ["number", "null"]},
-                        "unit_price": {"type": ["number", "null"]},
-                        "amount": {"type": ["number", "null"]},
-                        "description": {"type": ["string", "null"]},
-                    },
-                    "required": ["name"],
-                },
-            },
-            "payment_method": {"type": ["string", "null"]},
-            "remarks": {"type": ["string", "null"]},
-        },
-    }
+    # JSON Schema 用于验证输出和约束解码：提示词要求输出全部字段（无法确定时为 null），
+    # 因此所有字段必填、不允许多余字段，商品的字段也全部必填
+    INVOICE_SCHEMA = reduce_schema(
+        tuple(INVOICE_SCHEMA["properties"]),
+        item_fields=tuple(INVOICE_SCHEMA["properties"]["items"]["items"]["properties"]),
+    )
+
+    # 输出 token 上限（全部字段约 300 token，每个商品约 40 token）；
+    # 超出时 LLM 引擎抛出 OutputTruncated，解析结果为失败并给出原因
+    MAX_OUTPUT_TOKENS = 2048
 
     def __init__(
         self,
@@ -77,55 +51,62 @@ class BillParser:
 
         logger.info("BillParser initialized")
 
-    def parse(self, ocr_text: str) -> InvoiceParseResult:
+    def parse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
         """
         解析账单文本
 
         Args:
             ocr_text: OCR 识别的文本
+            deadline: 请求截止时间（到期时抛出 DeadlineExceeded）
 
         Returns:
             账单解析结果
         """
         try:
-            # 构建提示词
-            if self.use_few_shot:
-                prompt = PromptTemplate.build_prompt(ocr_text)
-            else:
-                prompt = PromptTemplate.build_simple_prompt(ocr_text)
-
-            logger.info(f"Parsing invoice from text (length: {len(ocr_text)})")
-
             # 调用 LLM 生成 JSON
             json_output = self.llm_engine.generate_json(
-                prompt=prompt,
+                prompt=self._build_prompt(ocr_text),
                 temperature=0.1,  # 使用较低的温度以获得更确定的输出
+                max_tokens=self.MAX_OUTPUT_TOKENS,
+                deadline=deadline,
+                schema=self.INVOICE_SCHEMA,
             )
+            return self._build_result(ocr_text, json_output)
 
-            # 验证 JSON 格式
-            if self.validate_output:
-                try:
-                    validate(instance=json_output, schema=self.INVOICE_SCHEMA)
-                    logger.info("JSON validation passed")
-                except ValidationError as e:
-                    logger.warning(f"JSON validation failed: {e}")
-                    # 验证失败但继续处理
-
-            # 添加原始文本
-            json_output["raw_text"] = ocr_text
-
-            # 转换为 Invoice 对象
-            invoice = Invoice(**json_output)
+        except DeadlineExceeded:
+            raise
+        except CircuitOpenError as e:
+            logger.warning(f"{e}, falling back to rule-only extraction")
+            return rule_only_result(ocr_text)
+        except Exception as e:
+            logger.error(f"Error parsing invoice: {e}")
+            return InvoiceParseResult(
+                success=False,
+                error_message=str(e),
+            )
 
-            # 计算置信度（简单实现：基于提取到的字段数量）
-            confidence = self._calculate_confidence(invoice)
+    async def aparse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
+        """
+        解析账单文本（异步，参数与 parse 相同）
 
-            return InvoiceParseResult(
-                success=True,
-                invoice=invoice,
-                confidence=confidence,
+        Returns:
+            账单解析结果
+        """
+        try:
+            json_output = await self.llm_engine.agenerate_json(
+                prompt=self._build_prompt(ocr_text),
+                temperature=0.1,
+                max_tokens=self.MAX_OUTPUT_TOKENS,
+                deadline=deadline,
+                schema=self.INVOICE_SCHEMA,
             )
+            return self._build_result(ocr_text, json_output)
 
+        except DeadlineExceeded:
+            raise
+        except CircuitOpenError as e:
+            logger.warning(f"{e}, falling back to rule-only extraction")
+            return rule_only_result(ocr_text)
         except Exception as e:
             logger.error(f"Error parsing invoice: {e}")
             return InvoiceParseResult(
@@ -133,6 +114,39 @@ class BillParser:
                 error_message=str(e),
             )
 
+    def _build_prompt(self, ocr_text: str) -> str:
+        """构建提示词"""
+        logger.info(f"Parsing invoice from text (length: {len(ocr_text)})")
+        if self.use_few_shot:
+            return PromptTemplate.build_prompt(ocr_text)
+        return PromptTemplate.build_simple_prompt(ocr_text)
+
+    def _build_result(self, ocr_text: str, json_output: dict) -> InvoiceParseResult:
+        """LLM 输出 -> 解析结果"""
+        # 验证 JSON 格式
+        if self.validate_output:
+            try:
+                validate(instance=json_output, schema=self.INVOICE_SCHEMA)
+                logger.info("JSON validation passed")
+            except ValidationError as e:
+                logger.warning(f"JSON validation failed: {e}")
+                # 验证失败但继续处理
+
+        # 添加原始文本
+        json_output["raw_text"] = ocr_text
+
+        # 转换为 Invoice 对象
+        invoice = Invoice(**json_output)
+
+        # 计算置信度（简单实现：基于提取到的字段数量）
+        confidence = self._calculate_confidence(invoice)
+
+        return InvoiceParseResult(
+            success=True,
+            invoice=invoice,
+            confidence=confidence,
+        )
+
     def parse_batch(self, ocr_texts: list[str]) -> list[InvoiceParseResult]:
         """
         批量解析账单
@@ -3,11 +3,16 @@
 """
 
 import json
+import asyncio
 import logging
-from typing import Optional
+from typing import Optional, Tuple, List, Dict, Any
 
 from ..models import Invoice, InvoiceParseResult
-from ..llm import OllamaEngine
+from ..llm import OllamaEngine, Deadline, DeadlineExceeded, CircuitOpenError
+from .schema import reduce_schema, batch_schema
+from .rule_fallback import extract_total_amount, rule_only_result
+from .rule_engine import RuleMatch, default_rule_engine
+from .merchant_templates import MerchantTemplateStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,7 +22,8 @@ class FastBillParser:
     """快速账单解析器 - 牺牲少量准确率换取速度"""
 
     # 精简的提示词（无 few-shot 示例）- 优化版
-    FAST_PROMPT_TEMPLATE = """你是账单信息提取助手。从文本中提取账单信息并输出 JSON。
+    # 规则部分（单个订单和批量解析共用）
+    FAST_RULES = """你是账单信息提取助手。从文本中提取账单信息并输出 JSON。
 
 提取字段：
 - invoice_type, invoice_number, invoice_date, seller_name, buyer_name, buyer_phone, buyer_address, total_amount, items
@@ -109,13 +115,14 @@ invoice_type 提取规则：
 }}
 说明：商品价格取原价，总金额取实付（不是商品总价）
 
-输入文本：
+"""
+    FAST_PROMPT_TEMPLATE = FAST_RULES + """输入文本：
 {text}
 
 输出 JSON（只输出JSON，不要其他文字）："""
 
     # 极简提示词（仅提取商家名和金额）- 优化版
-    SUMMARY_PROMPT_TEMPLATE = """从文本提取商家名和金额，输出 JSON。
+    SUMMARY_RULES = """从文本提取商家名和金额，输出 JSON。
 
 字段：
 - seller_name: 商家品牌名称
@@ -192,16 +199,83 @@ total_amount 提取规则（按优先级）：
 正确输出：{{"seller_name": "德园闰肠粉·蚝油捞·炖汤（西丽店）", "total_amount": 15.3}}
 错误示例：{{"seller_name": "德园", ...}}  # ❌ 只提取品牌前缀，丢失了特色菜品和门店信息
 
-文本：
+"""
+    SUMMARY_PROMPT_TEMPLATE = SUMMARY_RULES + """文本：
 {text}
 
 输出 JSON（只输出JSON，不要其他文字）："""
 
+    # 批量解析：多个订单放进同一个提示词（规则只发送一次），输出 {"orders": [...]}
+    BATCH_SUFFIX = """以下共 {count} 个订单，每个订单以"### 订单 编号"开头。
+对每个订单分别按上述规则提取，输出：
+{{"orders": [{{"index": 订单编号, ...该订单的字段}}, ...]}}
+要求：
+1. 每个订单输出一项，共 {count} 项，index 与订单编号一致
+2. 不同订单的信息不要混用
+
+{orders}
+
+输出 JSON（只输出JSON，不要其他文字）："""
+    BATCH_ORDER_TEMPLATE = """### 订单 {index}
+{text}
+"""
+
+    # 批量解析的 token 预算（按字符数估算）
+    CHARS_PER_TOKEN = 1.5                  # 中文 OCR 文本约 1.5 字符 / token（偏保守）
+    BATCH_PROMPT_TOKENS = 3000             # 单个批量提示词的 token 上限（含规则部分）
+    BATCH_OUTPUT_TOKENS = 2048             # 单次批量调用的输出 token 上限
+    ORDER_OUTPUT_TOKENS = {True: 60, False: 256}   # 每个订单的预计输出 token（skip_items -> 值）
+
+    # 摘要模式只需要这两个字段（后端不支持约束解码时，完整输出后立即停止生成）
+    SUMMARY_FIELDS = ("seller_name", "total_amount")
+
+    # 约束解码的 Schema（与提示词中的字段一致，模型只能输出这些字段）
+    SUMMARY_SCHEMA = reduce_schema(SUMMARY_FIELDS)
+    FAST_SCHEMA = reduce_schema(
+        (
+            "seller_name", "total_amount", "items", "invoice_type", "invoice_number",
+            "invoice_date", "buyer_name", "buyer_phone", "buyer_address",
+        ),
+        required=("seller_name", "total_amount", "items"),
+        item_fields=("name", "quantity", "amount"),
+    )
+    BATCH_SCHEMAS = {True: batch_schema(SUMMARY_SCHEMA), False: batch_schema(FAST_SCHEMA)}
+
+    # 规则优先：模板命中且这些字段都已提取时不调用 LLM
+    RULE_REQUIRED_FIELDS = {True: SUMMARY_FIELDS, False: ("seller_name", "total_amount", "items")}
+
+    # 残余提示词：只让 LLM 补充规则未提取到的字段
+    RESIDUAL_PROMPT_TEMPLATE = """你是账单信息提取助手。以下{invoice_type}的部分字段已提取，只需补充提取缺少的字段，输出 JSON。
+
+已提取（不要输出）：
+{known}
+
+需要提取的字段：
+{fields}
+
+核心规则：
+1. 金额和数量必须是纯数字（如 16.2, 1），不要货币符号和单位
+2. 无法确定的字段设为 null
+
+输入文本：
+{text}
+
+输出 JSON（只输出JSON，不要其他文字）："""
+    RESIDUAL_FIELD_RULES = {
+        "seller_name": "- seller_name: 商家名称，保留完整商家名（包括特色菜品和门店），不要平台名称、配送和保险服务",
+        "total_amount": "- total_amount: 总金额，优先\"实付\" > \"应付\" > \"合计\"（排除\"优惠合计\"），不要优惠金额和\"到手\"金额",
+        "items": "- items: 商品列表 [{name, quantity, amount}]，amount 是原价不是到手价；份量、口味、备注、规格是说明不是商品",
+    }
+    RESIDUAL_OUTPUT_TOKENS = {"seller_name": 40, "total_amount": 20, "items": 256}
+
     def __init__(
         self,
         llm_engine: OllamaEngine,
         validate_output: bool = False,  # 快速模式默认不验证
         skip_items: bool = False,  # 是否跳过商品明细
+        hedge: bool = False,  # 是否对冲慢调用
+        rules_first: bool = False,  # 是否先用模板规则提取
+        merchant_templates: Optional[MerchantTemplateStore] = None,  # 学习的商家模板
     ):
         """
         初始化快速解析器
@@ -210,60 +284,96 @@ total_amount 提取规则（按优先级）：
             llm_engine: LLM 推理引擎
             validate_output: 是否验证输出（关闭以提升速度）
             skip_items: 是否跳过商品明细（仅提取总金额等关键信息）
+            hedge: 单个订单的 LLM 调用超过最近耗时的 p90 仍未返回时，再发一个相同的调用
+                （用于延迟敏感的请求，见 OpenAICompatibleEngine.generate_json）
+            rules_first: 先用模板规则提取高频账单（见 rule_engine.TEMPLATES），必需字段齐全时不调用 LLM，
+                缺少的字段用残余提示词交给 LLM 补充
+            merchant_templates: 商家模板库：内置模板未命中时先查学习的商家模板，校验通过时不调用 LLM；
+                LLM 解析成功后为该商家学习模板（见 MerchantTemplateStore）
         """
         self.llm_engine = llm_engine
         self.validate_output = validate_output
         self.skip_items = skip_items
+        self.hedge = hedge
+        self.rules_first = rules_first
+        self.rule_engine = default_rule_engine
+        self.merchant_templates = merchant_templates
         mode = "summary mode" if skip_items else "optimized for speed"
         logger.info(f"FastBillParser initialized ({mode})")
 
-    def parse(self, ocr_text: str) -> InvoiceParseResult:
+    def parse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
         """
         快速解析账单
 
         Args:
             ocr_text: OCR 识别的文本
+            deadline: 请求截止时间（到期时抛出 DeadlineExceeded，而不是返回失败结果）
 
         Returns:
             账单解析结果
         """
+        match = self._match_rules(ocr_text)
+        if match is not None and not match.missing(self._required_fields()):
+            result = self._rules_result(ocr_text, match)
+            if result is not None:
+                return result
+            match = None
+
         try:
-            # 根据模式选择提示词和 max_tokens
-            if self.skip_items:
-                # 使用完整文本以确保能找到商家名（可能在末尾）
-                prompt = self.SUMMARY_PROMPT_TEMPLATE.format(text=ocr_text)
-                # 优化：增加 max_tokens 确保 LLM 有足够空间理解提示词并输出完整 JSON
-                # 提示词约 800 tokens + 输出 JSON 约 50 tokens = 至少需要 200 tokens
-                max_tokens = 200  # 从 100 增加到 200，提升理解准确性
-                logger.info(f"Summary parsing (text length: {len(ocr_text)}, max_tokens: {max_tokens})")
-            else:
-                prompt = self.FAST_PROMPT_TEMPLATE.format(text=ocr_text)
-                # 完整模式需要更多输出空间（包含 items 数组）
-                max_tokens = 512  # 标准输出
-                logger.info(f"Fast parsing (text length: {len(ocr_text)}, max_tokens: {max_tokens})")
+            request = self._build_request(ocr_text, match)
 
             # 调用 LLM - 使用更低温度和优化的 token 限制
             json_output = self.llm_engine.generate_json(
-                prompt=prompt,
                 temperature=0.0,  # 最低温度，更快
-                max_tokens=max_tokens,
+                deadline=deadline,
+                hedge=self.hedge,
+                **request,
+            )
+            return self._build_result(ocr_text, json_output, match)
+
+        except DeadlineExceeded:
+            raise
+        except CircuitOpenError as e:
+            # LLM 熔断：不等待，降级为规则提取（置信度较低）
+            logger.warning(f"{e}, falling back to rule-only extraction")
+            return rule_only_result(ocr_text, skip_items=self.skip_items)
+        except Exception as e:
+            logger.error(f"Fast parsing error: {e}")
+            return InvoiceParseResult(
+                success=False,
+                error_message=str(e),
             )
 
-            # 添加原始文本（在清理之前，以便清理函数可以访问）
-            json_output["raw_text"] = ocr_text
-
-            # 清理数据（移除货币符号和单位）
-            json_output = self._clean_output(json_output)
+    async def aparse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
+        """
+        快速解析账单（异步，参数与 parse 相同）
 
-            # 转换为 Invoice 对象
-            invoice = Invoice(**json_output)
+        Returns:
+            账单解析结果
+        """
+        match = self._match_rules(ocr_text)
+        if match is not None and not match.missing(self._required_fields()):
+            result = self._rules_result(ocr_text, match)
+            if result is not None:
+                return result
+            match = None
 
-            return InvoiceParseResult(
-                success=True,
-                invoice=invoice,
-                confidence=0.8,  # 快速模式固定置信度
+        try:
+            request = self._build_request(ocr_text, match)
+            json_output = await self.llm_engine.agenerate_json(
+                temperature=0.0,
+                deadline=deadline,
+                hedge=self.hedge,
+                **request,
             )
-
+            return self._build_result(ocr_text, json_output, match)
+
+        except DeadlineExceeded:
+            raise
+        except CircuitOpenError as e:
+            # LLM 熔断：不等待，降级为规则提取（置信度较低）
+            logger.warning(f"{e}, falling back to rule-only extraction")
+            return rule_only_result(ocr_text, skip_items=self.skip_items)
         except Exception as e:
             logger.error(f"Fast parsing error: {e}")
             return InvoiceParseResult(
@@ -271,6 +381,390 @@ total_amount 提取规则（按优先级）：
                 error_message=str(e),
             )
 
+    def _build_prompt(self, ocr_text: str) -> Tuple[str, int]:
+        """
+        根据模式选择提示词和 max_tokens
+
+        Returns:
+            (提示词, max_tokens)
+        """
+        if self.skip_items:
+            # 使用完整文本以确保能找到商家名（可能在末尾）
+            prompt = self.SUMMARY_PROMPT_TEMPLATE.format(text=ocr_text)
+            # 优化：增加 max_tokens 确保 LLM 有足够空间理解提示词并输出完整 JSON
+            # 提示词约 800 tokens + 输出 JSON 约 50 tokens = 至少需要 200 tokens
+            max_tokens = 200  # 从 100 增加到 200，提升理解准确性
+            logger.info(f"Summary parsing (text length: {len(ocr_text)}, max_tokens: {max_tokens})")
+        else:
+            prompt = self.FAST_PROMPT_TEMPLATE.format(text=ocr_text)
+            # 完整模式需要更多输出空间（包含 items 数组）
+            max_tokens = 512  # 标准输出
+            logger.info(f"Fast parsing (text length: {len(ocr_text)}, max_tokens: {max_tokens})")
+        return prompt, max_tokens
+
+    def _build_request(self, ocr_text: str, match: Optional[RuleMatch] = None) -> Dict[str, Any]:
+        """
+        构建 LLM 调用参数（模板命中但缺少字段时只提取缺少的字段）
+
+        Args:
+            ocr_text: OCR 文本
+            match: 规则提取结果（可选）
+
+        Returns:
+            generate_json 的 prompt / max_tokens / required / schema 参数
+        """
+        if match is None:
+            prompt, max_tokens = self._build_prompt(ocr_text)
+            return {
+                "prompt": prompt,
+                "max_tokens": max_tokens,
+                "required": self.SUMMARY_FIELDS if self.skip_items else None,
+                "schema": self.SUMMARY_SCHEMA if self.skip_items else self.FAST_SCHEMA,
+            }
+
+        missing = match.missing(self._required_fields())
+        known = {name: value for name, value in match.data.items() if name in self.FAST_SCHEMA["properties"]}
+        prompt = self.RESIDUAL_PROMPT_TEMPLATE.format(
+            invoice_type=match.data.get("invoice_type", "订单"),
+            known=json.dumps(known, ensure_ascii=False),
+            fields="\n".join(self.RESIDUAL_FIELD_RULES[name] for name in missing),
+            text=ocr_text,
+        )
+        max_tokens = sum(self.RESIDUAL_OUTPUT_TOKENS[name] for name in missing) + 20
+        logger.info(f"Residual parsing for {match.template} (missing: {', '.join(missing)}, max_tokens: {max_tokens})")
+        return {
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            # 商品数组较长，只在摘要模式下提前停止
+            "required": missing if self.skip_items else None,
+            "schema": reduce_schema(missing, item_fields=("name", "quantity", "amount") if "items" in missing else None),
+        }
+
+    def _required_fields(self) -> Tuple[str, ...]:
+        """规则提取必须齐全的字段"""
+        return self.RULE_REQUIRED_FIELDS[self.skip_items]
+
+    def _match_rules(self, ocr_text: str) -> Optional[RuleMatch]:
+        """
+        内置模板规则提取，未命中时查学习的商家模板
+
+        Returns:
+            提取结果，都没有命中或提取出错时为 None（出错时交给 LLM 解析）
+        """
+        match = None
+        if self.rules_first:
+            try:
+                match = self.rule_engine.extract(ocr_text)
+            except Exception as e:
+                logger.warning(f"Rule extraction failed, falling back to LLM: {e}")
+                match = None
+            if match is not None:
+                outcome = "residual" if match.missing(self._required_fields()) else "rules"
+                self.rule_engine.record(match.template, outcome)
+        if match is None and self.merchant_templates is not None:
+            try:
+                match = self.merchant_templates.extract(ocr_text)
+            except Exception as e:
+                logger.warning(f"Merchant template extraction failed, falling back to LLM: {e}")
+        return match
+
+    def _rules_result(self, ocr_text: str, match: RuleMatch) -> Optional[InvoiceParseResult]:
+        """
+        规则提取的字段齐全，不调用 LLM
+
+        Returns:
+            解析结果，规则提取的字段无效（如不能转换为 Invoice）时为 None（交给 LLM 解析）
+        """
+        logger.info(f"Rules extracted all fields ({match.mode}: {match.template}), skipping LLM")
+        try:
+            return self._build_result(ocr_text, {}, match)
+        except Exception as e:
+            logger.warning(f"Invalid rule extraction ({match.mode}: {match.template}), falling back to LLM: {e}")
+            return None
+
+    def _build_result(
+        self,
+        ocr_text: str,
+        json_output: dict,
+        match: Optional[RuleMatch] = None,
+    ) -> InvoiceParseResult:
+        """
+        LLM 输出（和规则提取的字段）-> 解析结果
+
+        Args:
+            ocr_text: OCR 文本
+            json_output: LLM 输出（规则提取已齐全时为空）
+            match: 规则提取结果（规则提取的字段优先于 LLM 输出）
+
+        Returns:
+            解析结果（parse_mode 为 "rules" / "learned"，LLM 补充了字段时加 "+llm"，未使用规则时不设置）
+        """
+        # 由 LLM 解析（或补充了商家模板缺少的商品）的结果：在后台为该商家学习（更新）模板
+        learn = self.merchant_templates is not None and (
+            match is None or (match.mode == "learned" and bool(json_output))
+        )
+        extra = {}
+        confidence = 0.8  # 快速模式 LLM 解析固定置信度
+        if match is not None:
+            extra["parse_mode"] = f"{match.mode}+llm" if json_output else match.mode
+            # 规则提取按提取到的字段计算置信度，缺少的字段由 LLM 补充时不低于 LLM 解析
+            confidence = max(match.confidence, confidence) if json_output else match.confidence
+            json_output = {**json_output, **match.data}
+
+        # 添加原始文本（在清理之前，以便清理函数可以访问）
+        json_output["raw_text"] = ocr_text
+
+        # 清理数据（移除货币符号和单位）
+        json_output = self._clean_output(json_output)
+
+        # 转换为 Invoice 对象
+        invoice = Invoice(**json_output)
+
+        if learn:
+            self.merchant_templates.learn_async(ocr_text, json_output)
+
+        return InvoiceParseResult(
+            success=True,
+            invoice=invoice,
+            confidence=confidence,
+            **extra,
+        )
+
+    # ==================== 批量解析 ====================
+
+    def plan_batches(self, ocr_texts: List[str]) -> List[List[int]]:
+        """
+        按 token 预算把订单分组（保持原顺序）
+
+        提示词（规则 + 各订单文本）不超过 BATCH_PROMPT_TOKENS，
+        预计输出不超过 BATCH_OUTPUT_TOKENS；单个订单超出预算时单独成组。
+
+        Args:
+            ocr_texts: 各订单的文本
+
+        Returns:
+            分组（每组为订单下标列表）
+        """
+        rules = self.SUMMARY_RULES if self.skip_items else self.FAST_RULES
+        base = self._estimate_tokens(rules + self.BATCH_SUFFIX)
+        per_order_output = self.ORDER_OUTPUT_TOKENS[self.skip_items]
+
+        batches: List[List[int]] = []
+        current: List[int] = []
+        tokens = base
+        for i, text in enumerate(ocr_texts):
+            cost = self._estimate_tokens(self.BATCH_ORDER_TEMPLATE.format(index=i + 1, text=text))
+            if current and (
+                tokens + cost > self.BATCH_PROMPT_TOKENS
+                or (len(current) + 1) * per_order_output > self.BATCH_OUTPUT_TOKENS
+            ):
+                batches.append(current)
+                current, tokens = [], base
+            current.append(i)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def parse_batched(
+        self,
+        ocr_texts: List[str],
+        deadline: Optional[Deadline] = None,
+    ) -> List[InvoiceParseResult]:
+        """
+        批量解析多个订单（每组订单一次 LLM 调用）
+
+        Args:
+            ocr_texts: 各订单的文本
+            deadline: 请求截止时间（可选）
+
+        Returns:
+            解析结果（与 ocr_texts 顺序一致）
+        """
+        results: List[Optional[InvoiceParseResult]] = [None] * len(ocr_texts)
+        for batch in self.plan_batches(ocr_texts):
+            group = self.parse_group([ocr_texts[i] for i in batch], deadline=deadline)
+            for i, result in zip(batch, group):
+                results[i] = result
+        return results
+
+    async def aparse_batched(
+        self,
+        ocr_texts: List[str],
+        deadline: Optional[Deadline] = None,
+    ) -> List[InvoiceParseResult]:
+        """批量解析多个订单（异步，各组并发，参数与 parse_batched 相同）"""
+        batches = self.plan_batches(ocr_texts)
+        groups = await asyncio.gather(*[
+            self.aparse_group([ocr_texts[i] for i in batch], deadline=deadline)
+            for batch in batches
+        ])
+        results: List[Optional[InvoiceParseResult]] = [None] * len(ocr_texts)
+        for batch, group in zip(batches, groups):
+            for i, result in zip(batch, group):
+                results[i] = result
+        return results
+
+    def parse_group(
+        self,
+        ocr_texts: List[str],
+        deadline: Optional[Deadline] = None,
+    ) -> List[InvoiceParseResult]:
+        """
+        一次 LLM 调用解析一组订单，输出缺失或无效的订单单独重新解析
+
+        Args:
+            ocr_texts: 一组订单的文本（通常来自 plan_batches）
+            deadline: 请求截止时间（可选）
+
+        Returns:
+            解析结果（与 ocr_texts 顺序一致）
+        """
+        if len(ocr_texts) == 1:
+            return [self.parse(ocr_texts[0], deadline=deadline)]
+
+        # 命中模板的订单单独解析（字段齐全时不调用 LLM，否则用残余提示词），其余订单批量解析
+        matched = self._template_orders(ocr_texts)
+        if matched:
+            results: List[Optional[InvoiceParseResult]] = [None] * len(ocr_texts)
+            for i in matched:
+                results[i] = self.parse(ocr_texts[i], deadline=deadline)
+            rest = [i for i in range(len(ocr_texts)) if results[i] is None]
+            if rest:
+                for i, result in zip(rest, self.parse_group([ocr_texts[i] for i in rest], deadline=deadline)):
+                    results[i] = result
+            return results
+
+        prompt, max_tokens = self._build_batch_prompt(ocr_texts)
+        try:
+            output = self.llm_engine.generate_json(
+                prompt=prompt,
+                temperature=0.0,
+                max_tokens=max_tokens,
+                deadline=deadline,
+                schema=self.BATCH_SCHEMAS[self.skip_items],
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Batch parsing failed ({len(ocr_texts)} orders), falling back: {e}")
+            output = {}
+
+        results = self._map_batch_output(ocr_texts, output)
+        return [
+            result if result is not None else self.parse(text, deadline=deadline)
+            for text, result in zip(ocr_texts, results)
+        ]
+
+    async def aparse_group(
+        self,
+        ocr_texts: List[str],
+        deadline: Optional[Deadline] = None,
+    ) -> List[InvoiceParseResult]:
+        """一次 LLM 调用解析一组订单（异步，参数与 parse_group 相同）"""
+        if len(ocr_texts) == 1:
+            return [await self.aparse(ocr_texts[0], deadline=deadline)]
+
+        matched = self._template_orders(ocr_texts)
+        if matched:
+            rest = [i for i in range(len(ocr_texts)) if i not in matched]
+            parsed, grouped = await asyncio.gather(
+                asyncio.gather(*[self.aparse(ocr_texts[i], deadline=deadline) for i in matched]),
+                self.aparse_group([ocr_texts[i] for i in rest], deadline=deadline) if rest else asyncio.sleep(0, []),
+            )
+            results: List[Optional[InvoiceParseResult]] = [None] * len(ocr_texts)
+            for i, result in zip(matched + rest, list(parsed) + list(grouped)):
+                results[i] = result
+            return results
+
+        prompt, max_tokens = self._build_batch_prompt(ocr_texts)
+        try:
+            output = await self.llm_engine.agenerate_json(
+                prompt=prompt,
+                temperature=0.0,
+                max_tokens=max_tokens,
+                deadline=deadline,
+                schema=self.BATCH_SCHEMAS[self.skip_items],
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Batch parsing failed ({len(ocr_texts)} orders), falling back: {e}")
+            output = {}
+
+        results = self._map_batch_output(ocr_texts, output)
+        fallback = [i for i, result in enumerate(results) if result is None]
+        retried = await asyncio.gather(*[self.aparse(ocr_texts[i], deadline=deadline) for i in fallback])
+        for i, result in zip(fallback, retried):
+            results[i] = result
+        return results
+
+    def _template_orders(self, ocr_texts: List[str]) -> List[int]:
+        """命中内置模板或商家模板的订单下标"""
+        return [
+            i for i, text in enumerate(ocr_texts)
+            if (self.rules_first and self.rule_engine.match(text) is not None)
+            or (self.merchant_templates is not None and self.merchant_templates.lookup(text) is not None)
+        ]
+
+    def _build_batch_prompt(self, ocr_texts: List[str]) -> Tuple[str, int]:
+        """
+        构建批量提示词
+
+        Returns:
+            (提示词, max_tokens)
+        """
+        rules = self.SUMMARY_RULES if self.skip_items else self.FAST_RULES
+        orders = "\n".join(
+            self.BATCH_ORDER_TEMPLATE.format(index=i, text=text)
+            for i, text in enumerate(ocr_texts, 1)
+        )
+        prompt = (rules + self.BATCH_SUFFIX).format(count=len(ocr_texts), orders=orders)
+        max_tokens = min(
+            self.BATCH_OUTPUT_TOKENS,
+            self.ORDER_OUTPUT_TOKENS[self.skip_items] * len(ocr_texts) + 50,
+        )
+        logger.info(f"Batch parsing {len(ocr_texts)} orders (prompt length: {len(prompt)}, max_tokens: {max_tokens})")
+        return prompt, max_tokens
+
+    def _map_batch_output(self, ocr_texts: List[str], output: Any) -> List[Optional[InvoiceParseResult]]:
+        """
+        把批量输出按 index 对应回各订单
+
+        Returns:
+            解析结果列表，缺失、重复或无效的订单为 None（需要单独解析）
+        """
+        entries = output.get("orders") if isinstance(output, dict) else output
+        results: List[Optional[InvoiceParseResult]] = [None] * len(ocr_texts)
+        if not isinstance(entries, list):
+            entries = []
+
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                idx = int(entry.pop("index")) - 1
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not 0 <= idx < len(ocr_texts) or results[idx] is not None:
+                continue
+            if entry.get("seller_name") is None and entry.get("total_amount") is None:
+                continue
+            try:
+                results[idx] = self._build_result(ocr_texts[idx], entry)
+            except Exception as e:
+                logger.warning(f"Invalid batch output for order {idx + 1}: {e}")
+
+        missing = sum(1 for result in results if result is None)
+        if missing:
+            logger.info(f"Batch output missing {missing}/{len(ocr_texts)} orders, parsing them individually")
+        return results
+
+    @classmethod
+    def _estimate_tokens(cls, text: str) -> int:
+        """估算 token 数"""
+        return int(len(text) / cls.CHARS_PER_TOKEN) + 1
+
     def _clean_output(self, data: dict) -> dict:
         """
         清理 LLM 输出，移除货币符号和单位
@@ -336,30 +830,8 @@ total_amount 提取规则（按优先级）：
             raw_text = data.get('raw_text', '')
 
             # 始终尝试从原始文本提取总金额（比 LLM 计算更准确）
-            extracted_amount = None
-
             # 按优先级尝试提取: 实付 > 应付 > 合计
-            # (实付最准确，合计可能被误匹配为"优惠合计")
-            if extracted_amount is None:
-                patterns = [
-                    r'实付[：:\s]*[￥¥]?([\d.]+)',  # 实付: ¥9.9
-                    r'应付[：:\s]*[￥¥]?([\d.]+)',  # 应付: ¥34.6
-                ]
-                for pattern in patterns:
-                    matches = re.findall(pattern, raw_text)
-                    if matches:
-                        extracted_amount = float(matches[-1])
-                        break
-
-            # 如果还没找到，尝试"合计"（需要特殊处理，避免误匹配"优惠合计"）
-            if extracted_amount is None:
-                # 只匹配不是以"优惠"开头的"合计"
-                match = re.search(r'(?<!优惠)(?<!优惠券)(?<!优惠减免)合计[^\n]*\n[^\n]*', raw_text)
-                if match:
-                    section = match.group()
-                    numbers = re.findall(r'[¥￥]([\d.]+)', section)
-                    if numbers:
-                        extracted_amount = float(numbers[-1])
+            extracted_amount = extract_total_amount(raw_text)
 
             # 如果从文本提取成功，优先使用提取的金额
             if extracted_amount is not None and extracted_amount > 0:
@@ -10,7 +10,7 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 from ..models import Invoice, InvoiceItem, InvoiceParseResult
-from ..llm import OllamaEngine
+from ..llm import OllamaEngine, Deadline, DeadlineExceeded
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,12 +62,13 @@ class HybridParser:
         self.use_rules_first = use_rules_first
         logger.info("HybridParser initialized (Rules + LLM)")
 
-    def parse(self, ocr_text: str) -> InvoiceParseResult:
+    def parse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
         """
         混合解析
 
         Args:
             ocr_text: OCR 识别的文本
+            deadline: 请求截止时间（到期时抛出 DeadlineExceeded）
 
         Returns:
             账单解析结果
@@ -80,26 +81,37 @@ class HybridParser:
             logger.info(f"Rules extracted: {len(rules_data)} fields")
 
             # 第二步：使用LLM补充
-            llm_data = self._extract_by_llm(ocr_text, rules_data)
+            llm_data = self._extract_by_llm(ocr_text, rules_data, deadline)
 
             # 第三步：合并结果（规则优先）
-            final_data = self._merge_data(rules_data, llm_data)
+            return self._build_result(ocr_text, rules_data, llm_data)
 
-            # 添加原始文本
-            final_data["raw_text"] = ocr_text
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Hybrid parsing error: {e}")
+            return InvoiceParseResult(
+                success=False,
+                error_message=str(e),
+            )
 
-            # 转换为 Invoice 对象
-            invoice = Invoice(**final_data)
+    async def aparse(self, ocr_text: str, deadline: Optional[Deadline] = None) -> InvoiceParseResult:
+        """
+        混合解析（异步，参数与 parse 相同）
 
-            # 计算置信度
-            confidence = self._calculate_confidence(invoice, rules_data)
+        Returns:
+            账单解析结果
+        """
+        try:
+            logger.info(f"Hybrid parsing (text length: {len(ocr_text)})")
+            rules_data = self._extract_by_rules(ocr_text)
+            logger.info(f"Rules extracted: {len(rules_data)} fields")
 
-            return InvoiceParseResult(
-                success=True,
-                invoice=invoice,
-                confidence=confidence,
-            )
+            llm_data = await self._aextract_by_llm(ocr_text, rules_data, deadline)
+            return self._build_result(ocr_text, rules_data, llm_data)
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Hybrid parsing error: {e}")
             return InvoiceParseResult(
@@ -107,6 +119,30 @@ class HybridParser:
                 error_message=str(e),
             )
 
+    def _build_result(
+        self,
+        ocr_text: str,
+        rules_data: Dict[str, Any],
+        llm_data: Dict[str, Any],
+    ) -> InvoiceParseResult:
+        """合并规则和 LLM 结果（规则优先）"""
+        final_data = self._merge_data(rules_data, llm_data)
+
+        # 添加原始文本
+        final_data["raw_text"] = ocr_text
+
+        # 转换为 Invoice 对象
+        invoice = Invoice(**final_data)
+
+        # 计算置信度
+        confidence = self._calculate_confidence(invoice, rules_data)
+
+        return InvoiceParseResult(
+            success=True,
+            invoice=invoice,
+            confidence=confidence,
+        )
+
     def _extract_by_rules(self, text: str) -> Dict[str, Any]:
         """使用规则提取结构化信息"""
         data = {}
@@ -171,8 +207,49 @@ class HybridParser:
 
         return data
 
-    def _extract_by_llm(self, text: str, rules_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _extract_by_llm(
+        self,
+        text: str,
+        rules_data: Dict[str, Any],
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
         """使用LLM补充提取"""
+        try:
+            json_output = self.llm_engine.generate_json(
+                prompt=self._llm_prompt(text, rules_data),
+                temperature=0.0,
+                max_tokens=1024,
+                deadline=deadline,
+            )
+            return json_output
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"LLM extraction failed: {e}")
+            return {}
+
+    async def _aextract_by_llm(
+        self,
+        text: str,
+        rules_data: Dict[str, Any],
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
+        """使用LLM补充提取（异步）"""
+        try:
+            return await self.llm_engine.agenerate_json(
+                prompt=self._llm_prompt(text, rules_data),
+                temperature=0.0,
+                max_tokens=1024,
+                deadline=deadline,
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"LLM extraction failed: {e}")
+            return {}
+
+    def _llm_prompt(self, text: str, rules_data: Dict[str, Any]) -> str:
+        """构建 LLM 补充提取的提示词"""
 
         # 构建精简的提示词，告诉LLM哪些字段已经提取
         extracted_fields = list(rules_data.keys())
@@ -200,16 +277,7 @@ class HybridParser:
 
 输出JSON："""
 
-        try:
-            json_output = self.llm_engine.generate_json(
-                prompt=prompt,
-                temperature=0.0,
-                max_tokens=1024,
-            )
-            return json_output
-        except Exception as e:
-            logger.warning(f"LLM extraction failed: {e}")
-            return {}
+        return prompt
 
     def _merge_data(self, rules_data: Dict[str, Any], llm_data: Dict[str, Any]) -> Dict[str, Any]:
         """合并规则和LLM的结果（规则优先）"""
@@ -0,0 +1,360 @@
+"""
+学习的商家模板 - 从 LLM 解析结果推导同一商家的提取模板
+LLM 解析过某个商家的订单、且推导出的模板在原文上能复现相同的结果后，保存该模板
+（按商家名所在的行匹配），之后同一商家的订单直接用模板解析，模板校验失败时再调用 LLM
+内存 LRU，可选 SQLite 持久化
+"""
+
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+
+from .rule_engine import (
+    AMOUNT, ITEM_LINE, ITEM_BLOCK, RuleMatch, compile_template, apply_template, extract_items, score_confidence,
+)
+from .rule_fallback import _looks_like_merchant, extract_date
+
+logger = logging.getLogger(__name__)
+
+# 学习的模板的置信度（内置模板为 0.85-0.9）
+LEARNED_CONFIDENCE = 0.85
+
+# 总金额标签必须包含 / 不能包含的关键词（"商品总价"、"到手价"在有优惠时不等于实付）
+TOTAL_LABELS = ('实付', '应付', '合计', '总计', '付款', '支付', '金额')
+TOTAL_LABEL_EXCLUDE = ('优惠', '到手', '商品总价', '原价', '立减', '红包', '券')
+
+# 日期（只用于定位日期所在的行，格式解析见 rule_fallback.extract_date）
+DATE = r'\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}'
+
+
+class MerchantTemplateStore:
+    """
+    商家模板库（线程安全，多个解析器可共用一个实例）
+
+    - learn：从 LLM 解析结果推导模板：商家名所在的行作为键，总金额、日期取其所在行的标签
+      （"实付款：¥9.9" → 实付款，"下单时间 2025-12-08" → 下单时间），商品从内置的单行 / 多行商品正则中
+      选能复现 LLM 商品的一个；模板在原文上复现的金额（和商品）与 LLM 一致、且有日期或商品正则时才保存
+    - extract：按文本中的行查找模板并提取，商家名、金额未提取到或商品不完整时视为校验失败，返回 None；
+      商家名是模板中的常量，键只是一行文本，因此除金额外日期或商品正则也必须命中，
+      否则只保留金额和日期，商家名和商品交给 LLM 补充
+    - 同一商家重新学习时覆盖旧模板；无法推导时删除旧模板（版式已变化）
+    - learn_async：在后台线程中学习（推导模板和 SQLite 写入不占用解析的时间，出错只记录日志）
+    """
+
+    # 模板格式版本（推导规则修改后旧记录失效）
+    SCHEMA_VERSION = "2"
+
+    def __init__(self, max_entries: int = 10000, db_path: Optional[str] = None):
+        """
+        初始化商家模板库
+
+        Args:
+            max_entries: 最多保存的模板数（LRU 淘汰）
+            db_path: SQLite 数据库路径（为空时只保存在内存中）
+        """
+        self.max_entries = max_entries
+        self._templates: "OrderedDict[str, Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()  # 键 -> (模板, 预编译)
+        self._lock = threading.Lock()
+        self.hits = 0       # 模板解析成功
+        self.misses = 0     # 模板校验失败或只有金额命中（回退到 LLM / 由 LLM 补充）
+        self.learned = 0    # 新学习 / 更新的模板数
+        # 后台学习线程（单线程，SQLite 写入按顺序执行）
+        self._learner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="merchant-learn")
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS merchant_templates ("
+                "key TEXT PRIMARY KEY, template TEXT NOT NULL, version TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            stale = self._db.execute(
+                "DELETE FROM merchant_templates WHERE version != ?", (self.SCHEMA_VERSION,)
+            ).rowcount
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, template FROM merchant_templates ORDER BY updated DESC LIMIT ?", (max_entries,)
+            ).fetchall()
+            for key, value in reversed(rows):
+                template = json.loads(value)
+                self._templates[key] = (template, compile_template(template))
+            logger.info(f"Merchant templates loaded from {db_path} ({len(rows)} templates, {stale} stale removed)")
+
+    def lookup(self, text: str) -> Optional[str]:
+        """
+        查找文本对应的模板
+
+        Args:
+            text: OCR 文本
+
+        Returns:
+            模板的键（商家名所在的行），没有时为 None
+        """
+        with self._lock:
+            if not self._templates:
+                return None
+            for line in text.splitlines():
+                key = line.strip()
+                if key in self._templates:
+                    return key
+        return None
+
+    def extract(self, text: str) -> Optional[RuleMatch]:
+        """
+        用商家模板提取字段
+
+        Args:
+            text: OCR 文本
+
+        Returns:
+            提取结果（mode 为 "learned"；只有金额命中时不含商家名和商品，由 LLM 补充），
+            没有模板或校验失败时为 None
+        """
+        key = self.lookup(text)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._templates.get(key)
+            if entry is None:
+                return None
+            self._templates.move_to_end(key)
+        template, compiled = entry
+
+        match = apply_template(template, compiled, text, mode="learned")
+        if match.missing(("seller_name", "total_amount")) or (template["items"] and not match.data.get("items")):
+            with self._lock:
+                self.misses += 1
+            logger.info(f"Merchant template failed validation: {key}")
+            return None
+
+        if not match.data.get("items") and not any(p.search(text) for p in compiled["fields"]["invoice_date"]):
+            with self._lock:
+                self.misses += 1
+            logger.info(f"Merchant template matched only the total, LLM fills the rest: {key}")
+            data = {name: value for name, value in match.data.items() if name not in ("seller_name", "items")}
+            return RuleMatch(template=match.template, data=data,
+                             confidence=score_confidence(template, data), mode="learned")
+
+        with self._lock:
+            self.hits += 1
+        return match
+
+    def learn(self, text: str, invoice: Dict[str, Any]) -> bool:
+        """
+        从 LLM 解析结果学习商家模板
+
+        Args:
+            text: OCR 文本
+            invoice: LLM 解析（并清理）后的账单字段
+
+        Returns:
+            是否保存了模板
+        """
+        seller = str(invoice.get("seller_name") or "").strip()
+        key = _header_key(text, seller) if len(seller) >= 2 else None
+        if key is None:
+            return False
+        try:
+            template = derive_template(text, invoice, key)
+        except Exception as e:
+            logger.warning(f"Failed to derive merchant template for {key}: {e}")
+            template = None
+
+        with self._lock:
+            old = self._templates.get(key)
+            if template is None:
+                if old is not None:
+                    logger.info(f"Merchant template no longer matches, removing: {key}")
+                    self._delete(key)
+                return False
+            # 摘要模式的结果没有商品，保留之前学到的商品正则
+            if old is not None and not template["items"] and not invoice.get("items"):
+                template["items"] = old[0]["items"]
+            if old is not None and old[0] == template:
+                return True
+
+            self._templates[key] = (template, compile_template(template))
+            self._templates.move_to_end(key)
+            self.learned += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO merchant_templates (key, template, version, updated) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(template, ensure_ascii=False), self.SCHEMA_VERSION, time.time()),
+                )
+                self._db.commit()
+            while len(self._templates) > self.max_entries:
+                self._delete(next(iter(self._templates)))
+        logger.info(f"Learned merchant template: {key} (items: {'yes' if template['items'] else 'no'})")
+        return True
+
+    def learn_async(self, text: str, invoice: Dict[str, Any]):
+        """
+        在后台线程中学习商家模板（尽力而为：失败只记录日志，不影响已完成的解析）
+
+        Args:
+            text: OCR 文本
+            invoice: LLM 解析（并清理）后的账单字段
+        """
+        try:
+            self._learner.submit(self._learn_quietly, text, dict(invoice))
+        except RuntimeError as e:
+            # 已关闭
+            logger.warning(f"Merchant template learning skipped: {e}")
+
+    def _learn_quietly(self, text: str, invoice: Dict[str, Any]):
+        try:
+            self.learn(text, invoice)
+        except Exception as e:
+            logger.warning(f"Failed to learn merchant template: {e}")
+
+    def _delete(self, key: str):
+        """删除模板（调用方持有锁）"""
+        self._templates.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM merchant_templates WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """模板数、模板解析成功 / 校验失败次数、学习次数"""
+        with self._lock:
+            return {
+                "entries": len(self._templates),
+                "hits": self.hits,
+                "misses": self.misses,
+                "learned": self.learned,
+            }
+
+    def close(self):
+        """等待后台学习完成并关闭 SQLite 连接"""
+        self._learner.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def derive_template(text: str, invoice: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    """
+    从 LLM 解析结果推导商家模板（格式与 rule_engine.TEMPLATES 相同）
+
+    Args:
+        text: OCR 文本
+        invoice: LLM 解析后的账单字段
+        key: 模板的键（商家名所在的行）
+
+    Returns:
+        模板，无法推导、在原文上不能复现 LLM 结果，或除金额外没有日期 / 商品正则时为 None
+    """
+    total = invoice.get("total_amount")
+    if not isinstance(total, (int, float)) or not 0.01 <= total <= 50000:
+        return None
+    total_pattern = _total_pattern(text, total)
+    if total_pattern is None:
+        return None
+
+    template = {
+        "name": "learned",
+        "key": key,
+        "invoice_type": invoice.get("invoice_type"),
+        "fields": {
+            "seller_name": {"value": str(invoice["seller_name"]).strip()},
+            "total_amount": {"type": "amount", "patterns": [total_pattern]},
+            "invoice_date": {"type": "date", "patterns": _date_patterns(text)},
+        },
+        "items": _item_patterns(text, invoice.get("items")),
+        "confidence": LEARNED_CONFIDENCE,
+    }
+
+    # 只有金额正则时无法确认之后的订单属于同一商家
+    if not template["fields"]["invoice_date"]["patterns"] and not template["items"]:
+        return None
+
+    # 回放：模板在原文上必须得到与 LLM 相同的金额
+    match = apply_template(template, compile_template(template), text, mode="learned")
+    if abs((match.data.get("total_amount") or 0) - total) > 0.005:
+        return None
+    return template
+
+
+def _header_key(text: str, seller: str) -> Optional[str]:
+    """包含商家名、且像商家名的行（如"杨氏手撕烤鸭（丁头村店）"）"""
+    for line in text.splitlines():
+        line = line.strip()
+        if seller in line and _looks_like_merchant(line):
+            return line
+    return None
+
+
+def _total_pattern(text: str, total: float) -> Optional[str]:
+    """
+    总金额的正则：取金额所在行的标签（同一行 "实付款：¥9.9"，或上一行 "合计" / 下一行 "￥15.3"），
+    有多个候选时取最后一个
+    """
+    lines = text.splitlines()
+    best = None
+    for i, line in enumerate(lines):
+        for number in re.finditer(r'\d+(?:\.\d{1,2})?', line):
+            if abs(float(number.group()) - total) > 0.005:
+                continue
+            prefix = line[:number.start()]
+            label = re.search(r'([^\d\s：:￥¥\-]+)[：:\s￥¥\-]*$', prefix)
+            if label:
+                candidate = (label.group(1), True)
+            elif not prefix.strip(' ￥¥') and i > 0:
+                candidate = (lines[i - 1].strip(), False)
+            else:
+                continue
+            if _is_total_label(candidate[0]):
+                best = candidate
+
+    if best is None:
+        return None
+    label, same_line = best
+    if same_line:
+        return rf'{re.escape(label)}[：:\s]*[￥¥]?\s*{AMOUNT}'
+    return rf'^\s*{re.escape(label)}\s*\n\s*[￥¥]?\s*{AMOUNT}'
+
+
+def _date_patterns(text: str) -> List[str]:
+    """日期的正则：取第一个带标签的日期所在行的标签（"下单时间 2025-12-08 19:14" → 下单时间），没有时为空"""
+    for line in text.splitlines():
+        date = re.search(DATE, line)
+        if not date:
+            continue
+        label = re.search(r'([^\d\s：:]+)[：:\s]*$', line[:date.start()])
+        if label and len(label.group(1)) <= 10:
+            pattern = rf'{re.escape(label.group(1))}[：:\s]*([^\n]+)'
+            match = re.search(pattern, text, re.M)
+            if match and extract_date(match.group(1)) is not None:
+                return [pattern]
+    return []
+
+
+def _is_total_label(label: str) -> bool:
+    """是否像总金额标签"""
+    return (
+        0 < len(label) <= 10
+        and any(keyword in label for keyword in TOTAL_LABELS)
+        and not any(keyword in label for keyword in TOTAL_LABEL_EXCLUDE)
+    )
+
+
+def _item_patterns(text: str, items: Any) -> List[str]:
+    """能在原文上复现 LLM 商品（名称和金额）的商品正则，没有时为空"""
+    expected = sorted(
+        (str(item.get("name") or "").strip(), round(float(item.get("amount") or 0), 2))
+        for item in items or [] if isinstance(item, dict)
+    )
+    if not expected:
+        return []
+    for pattern in (ITEM_LINE, ITEM_BLOCK):
+        found = extract_items(text, [re.compile(pattern, re.M)])
+        if sorted((item["name"], round(item["amount"], 2)) for item in found) == expected:
+            return [pattern]
+    return []
@@ -4,13 +4,15 @@
 """
 
 import re
+import asyncio
 import logging
 from typing import List, Tuple, Optional
 from dataclasses import dataclass
 
 from ..models import Invoice, InvoiceParseResult
-from ..llm import OllamaEngine
+from ..llm import OllamaEngine, Deadline
 from .fast_parser import FastBillParser
+from .merchant_templates import MerchantTemplateStore
 from .bank_parser import BankStatementParser
 
 logging.basicConfig(level=logging.INFO)
@@ -50,18 +52,35 @@ class MultiOrderParser:
         '待收货': 'pending_receipt',
     }
 
-    def __init__(self, llm_engine: OllamaEngine, skip_items: bool = False):
+    def __init__(
+        self,
+        llm_engine: OllamaEngine,
+        skip_items: bool = False,
+        batch: bool = False,
+        hedge: bool = False,
+        rules_first: bool = False,
+        merchant_templates: Optional[MerchantTemplateStore] = None,
+    ):
         """
         初始化多订单解析器
 
         Args:
             llm_engine: LLM 推理引擎
             skip_items: 是否跳过商品明细（仅提取总金额等关键信息）
+            batch: 是否批量解析（多个订单放进同一个提示词，见 FastBillParser.parse_batched）
+            hedge: 是否对冲单个订单的慢调用（见 FastBillParser）
+            rules_first: 是否先用模板规则提取各订单（见 FastBillParser）
+            merchant_templates: 学习的商家模板库（见 FastBillParser）
         """
         self.llm_engine = llm_engine
         self.skip_items = skip_items
-        self.parser = FastBillParser(llm_engine, skip_items=skip_items)
+        self.batch = batch
+        self.parser = FastBillParser(
+            llm_engine, skip_items=skip_items, hedge=hedge, rules_first=rules_first,
+            merchant_templates=merchant_templates,
+        )
         mode = " (summary mode)" if skip_items else ""
+        mode += " (batched)" if batch else ""
         logger.info(f"MultiOrderParser initialized{mode}")
 
     def is_order_list(self, text: str) -> Tuple[bool, float]:
@@ -289,12 +308,17 @@ class MultiOrderParser:
 
         return (has_merchant or has_amount) and (has_items or has_status or has_amount)
 
-    def parse_order_list(self, text: str) -> Tuple[List[InvoiceParseResult], dict]:
+    def parse_order_list(
+        self,
+        text: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[List[InvoiceParseResult], dict]:
         """
         解析订单列表
 
         Args:
             text: OCR 文本
+            deadline: 请求截止时间（到期后不再解析剩余订单，抛出 DeadlineExceeded）
 
         Returns:
             (订单解析结果列表, 统计信息)
@@ -308,45 +332,107 @@ class MultiOrderParser:
         is_bank_statement = self._is_bank_statement_list(text)
 
         results = []
-        stats = {
-            'total_orders': len(order_blocks),
-            'completed': 0,
-            'cancelled': 0,
-            'in_progress': 0,
-            'other': 0,
-        }
+        stats = self._empty_stats(len(order_blocks))
+
+        if self.batch and not is_bank_statement:
+            parsed = self.parser.parse_batched([block.text for block in order_blocks], deadline=deadline)
+            results = [
+                self._annotate(result, block, stats)
+                for result, block in zip(parsed, order_blocks)
+            ]
+            return results, stats
 
         for i, block in enumerate(order_blocks, 1):
             logger.info(f"Parsing order {i}/{len(order_blocks)} (status: {block.status})")
+            if deadline is not None:
+                deadline.check(f"order {i}/{len(order_blocks)}")
 
             # 根据类型选择解析器
             if is_bank_statement:
                 bank_parser = BankStatementParser()
                 result = bank_parser.parse(block.text)
             else:
-                result = self.parser.parse(block.text)
-
-            # 添加订单状态信息
-            if result.success and result.invoice:
-                if not result.invoice.remarks:
-                    result.invoice.remarks = f"订单状态: {block.status}"
-                else:
-                    result.invoice.remarks += f" | 订单状态: {block.status}"
-
-            results.append(result)
-
-            # 统计
-            if block.status == '已完成':
-                stats['completed'] += 1
-            elif block.status == '已取消':
-                stats['cancelled'] += 1
-            elif block.status in ['进行中', '待支付', '待发货', '待收货']:
-                stats['in_progress'] += 1
-            else:
-                stats['other'] += 1
+                result = self.parser.parse(block.text, deadline=deadline)
+
+            results.append(self._annotate(result, block, stats))
+
+        return results, stats
+
+    async def aparse_order_list(
+        self,
+        text: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[List[InvoiceParseResult], dict]:
+        """
+        解析订单列表（异步，所有订单并发解析，参数与 parse_order_list 相同）
+
+        每个订单块只是一个协程，实际发往 LLM 的并发数由自适应并发限制决定。
+        任一订单超过截止时间时取消其余订单并抛出 DeadlineExceeded。
+
+        Returns:
+            (订单解析结果列表（与订单顺序一致）, 统计信息)
+        """
+        order_blocks = self.split_orders(text)
+        logger.info(f"Detected {len(order_blocks)} orders in list")
+
+        is_bank_statement = self._is_bank_statement_list(text)
+        stats = self._empty_stats(len(order_blocks))
 
+        if self.batch and not is_bank_statement:
+            parsed = await self.parser.aparse_batched(
+                [block.text for block in order_blocks], deadline=deadline
+            )
+        else:
+            async def parse_block(block: OrderBlock) -> InvoiceParseResult:
+                if is_bank_statement:
+                    return BankStatementParser().parse(block.text)
+                return await self.parser.aparse(block.text, deadline=deadline)
+
+            tasks = [asyncio.ensure_future(parse_block(block)) for block in order_blocks]
+            try:
+                parsed = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+        results = [
+            self._annotate(result, block, stats)
+            for result, block in zip(parsed, order_blocks)
+        ]
         return results, stats
 
+    @staticmethod
+    def _empty_stats(total: int) -> dict:
+        """订单状态统计（初始值）"""
+        return {
+            'total_orders': total,
+            'completed': 0,
+            'cancelled': 0,
+            'in_progress': 0,
+            'other': 0,
+        }
+
+    @staticmethod
+    def _annotate(result: InvoiceParseResult, block: OrderBlock, stats: dict) -> InvoiceParseResult:
+        """在结果中添加订单状态信息，并计入统计"""
+        if result.success and result.invoice:
+            if not result.invoice.remarks:
+                result.invoice.remarks = f"订单状态: {block.status}"
+            else:
+                result.invoice.remarks += f" | 订单状态: {block.status}"
+
+        if block.status == '已完成':
+            stats['completed'] += 1
+        elif block.status == '已取消':
+            stats['cancelled'] += 1
+        elif block.status in ['进行中', '待支付', '待发货', '待收货']:
+            stats['in_progress'] += 1
+        else:
+            stats['other'] += 1
+
+        return result
+
     def parse(self, text: str) -> Tuple[bool, Optional[List[InvoiceParseResult]], Optional[dict]]:
         """
         智能解析：自动检测单个订单或订单列表
@@ -0,0 +1,339 @@
+"""
+规则优先提取 - 高频账单模板（瑞幸、麦当劳、美团外卖、淘宝订单详情）的声明式规则
+模板命中且必需字段齐全时不调用 LLM；缺少的字段再用精简提示词交给 LLM 补充
+"""
+
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+from .rule_fallback import extract_date
+
+logger = logging.getLogger(__name__)
+
+# 金额：9.9、18.69、15
+AMOUNT = r'(\d+(?:\.\d{1,2})?)'
+
+# 商品行中不是商品的内容（金额标签、费用、优惠）
+ITEM_EXCLUDE = (
+    '实付', '应付', '合计', '总计', '小计', '商品总价', '价格明细', '优惠', '立减', '红包', '券',
+    '到手', '配送', '包装', '打包', '餐盒', '运费', '满减', '退款', '积分',
+)
+
+# 单行商品："生椰拿铁 ￥9.9"、"巨无霸 x2 ¥45"
+ITEM_LINE = (
+    r'^(?P<name>[^￥¥\d\s][^￥¥\n]{1,60}?)\s*(?:[xX×*]\s*(?P<quantity>\d+)\s*)?'
+    r'[￥¥]\s*(?P<amount>\d+(?:\.\d{1,2})?)\s*$'
+)
+
+# 多行商品（美团外卖）："手撕烤鸭半只 / 到手￥7.87 / 份量，孜然辣椒 / ￥26.9 / 数量×1"
+# 商品名和价格之间只能是到手价、规格说明行
+ITEM_BLOCK = (
+    r'^(?P<name>[^￥¥\d\s\n][^￥¥\n]{1,40})\n(?:[^\n]*(?:[￥¥，,]|份量|口味|规格|备注)[^\n]*\n){0,3}?'
+    r'[￥¥]\s*(?P<amount>\d+(?:\.\d{1,2})?)\s*\n数量\s*[xX×]\s*(?P<quantity>\d+)'
+)
+
+# 置信度中各字段的权重（模板中没有的字段不计入）
+FIELD_WEIGHTS = {"seller_name": 0.3, "total_amount": 0.4, "invoice_date": 0.1, "invoice_number": 0.1, "items": 0.1}
+
+# 模板定义
+#
+# - match: 关键词组，每组命中任一关键词即可，所有组都命中时使用该模板（按顺序取第一个命中的模板）
+# - fields: 字段规则
+#     value: 固定值
+#     patterns: 正则列表（多行模式），取第一个有结果的正则的第 1 组；
+#         同一正则多处匹配时金额取最后一处（与 rule_fallback.extract_total_amount 相同），其他字段取第一处
+#     type: text（默认）/ amount（转为数字）/ date（从匹配内容或全文提取日期）
+# - items: 商品正则列表（命名组 name / quantity / amount），取第一个有结果的正则
+# - confidence: 所有字段都提取到且校验通过时的置信度（实际置信度按提取到的字段计算，见 FIELD_WEIGHTS）
+TEMPLATES: List[Dict[str, Any]] = [
+    {
+        "name": "luckin",
+        "match": [["luckin", "瑞幸"]],
+        "invoice_type": "咖啡订单",
+        "fields": {
+            "seller_name": {"value": "luckincoffee"},
+            "total_amount": {
+                "type": "amount",
+                "patterns": [rf'实付(?:款|金额)?[：:\s]*[￥¥]?\s*{AMOUNT}', rf'合计[：:\s]*[￥¥]\s*{AMOUNT}'],
+            },
+            "invoice_date": {"type": "date", "patterns": [r'(?:下单|订单)时间[：:\s]*([^\n]+)']},
+            "invoice_number": {"patterns": [r'订单(?:编号|号)[：:\s]*([A-Za-z0-9]{6,})']},
+        },
+        "items": [ITEM_LINE],
+        "confidence": 0.9,
+    },
+    {
+        "name": "mcdonalds",
+        "match": [["麦当劳", "McDonald"], ["取餐", "麦乐送", "餐厅>", "再来一单", "到店", "堂食", "外送"]],
+        "invoice_type": "餐饮订单",
+        "fields": {
+            "seller_name": {"value": "麦当劳"},
+            "total_amount": {
+                "type": "amount",
+                "patterns": [
+                    rf'实付(?:款|金额)?[：:\s]*[￥¥]?\s*{AMOUNT}',
+                    rf'(?<!优惠)合计[：:\s]*[￥¥]\s*{AMOUNT}',
+                    rf'总计[：:\s]*[￥¥]\s*{AMOUNT}',
+                ],
+            },
+            "invoice_date": {"type": "date", "patterns": [r'(?:下单|订单)时间[：:\s]*([^\n]+)']},
+            "invoice_number": {"patterns": [r'订单(?:编号|号)[：:\s]*([A-Za-z0-9]{6,})']},
+        },
+        "items": [ITEM_LINE],
+        "confidence": 0.9,
+    },
+    {
+        "name": "meituan",
+        "match": [["美团"], ["商品费用", "进商家", "订单号码", "配送", "骑手", "准时宝", "准时保"]],
+        "invoice_type": "外卖订单",
+        "fields": {
+            # 商家名保留特色菜品和门店（"德园闰肠粉·蚝油捞·炖汤（西丽店）"）
+            "seller_name": {"patterns": [r'商品费用[ \t]*\n[ \t]*([^\n￥¥]{2,40}?)[ \t]*\n', r'^([^\n￥¥]{2,40}?)[ \t]*\n[ \t]*进商家']},
+            "total_amount": {
+                "type": "amount",
+                "patterns": [rf'实付(?:款|金额)?[：:\s]*[￥¥]?\s*{AMOUNT}', rf'(?<!优惠)合计[：:\s]*[￥¥]\s*{AMOUNT}'],
+            },
+            "invoice_date": {"type": "date", "patterns": [r'(?:下单|订单)时间[：:\s]*([^\n]+)']},
+            "invoice_number": {"patterns": [r'订单号码[：:\s]*(\d{6,})']},
+        },
+        "items": [ITEM_BLOCK, ITEM_LINE],
+        "confidence": 0.85,
+    },
+    {
+        "name": "taobao",
+        "match": [["淘宝", "天猫", "支付宝交易号", "7天无理由", "价格明细"]],
+        "invoice_type": "电商订单",
+        "fields": {
+            # 店铺行："xx旗舰店 >"
+            "seller_name": {"patterns": [r'店铺[：:]\s*([^\n]{2,30})', r'^([^\n￥¥>＞]{2,30}?)\s*[>＞]\s*$']},
+            "total_amount": {"type": "amount", "patterns": [rf'实付(?:款|金额)?[：:\s]*[￥¥]?\s*{AMOUNT}']},
+            "invoice_date": {"type": "date", "patterns": [r'(?:创建|付款|成交)时间[：:\s]*([^\n]+)']},
+            "invoice_number": {"patterns": [r'订单编号[：:\s]*(\d{10,})']},
+        },
+        "items": [ITEM_LINE],
+        "confidence": 0.85,
+    },
+]
+
+
+@dataclass
+class RuleMatch:
+    """模板提取结果"""
+    template: str                                        # 模板名称
+    data: Dict[str, Any] = field(default_factory=dict)   # 提取到的字段（未提取到的字段不出现）
+    confidence: float = 0.0                              # 按提取到的字段计算的置信度
+    mode: str = "rules"                                  # 解析方式（rules：内置模板，learned：学习的商家模板）
+
+    def missing(self, fields: Sequence[str]) -> List[str]:
+        """fields 中未提取到的字段"""
+        return [name for name in fields if self.data.get(name) in (None, "", [])]
+
+
+def compile_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """预编译模板中的正则"""
+    return {
+        "fields": {
+            name: [re.compile(p, re.M) for p in spec.get("patterns", [])]
+            for name, spec in template["fields"].items()
+        },
+        "items": [re.compile(p, re.M) for p in template.get("items", [])],
+    }
+
+
+def apply_template(
+    template: Dict[str, Any],
+    compiled: Dict[str, Any],
+    text: str,
+    mode: str = "rules",
+) -> RuleMatch:
+    """
+    用一个模板提取字段
+
+    Args:
+        template: 模板定义（格式见 TEMPLATES）
+        compiled: compile_template 的结果
+        text: OCR 文本
+        mode: 解析方式（写入 RuleMatch.mode）
+
+    Returns:
+        提取结果（商品金额之和小于总金额时丢弃商品；置信度见 score_confidence）
+    """
+    data: Dict[str, Any] = {}
+    if template.get("invoice_type"):
+        data["invoice_type"] = template["invoice_type"]
+    for name, spec in template["fields"].items():
+        value = _extract_field(text, spec, compiled["fields"][name])
+        if value is not None:
+            data[name] = value
+
+    items = extract_items(text, compiled["items"])
+    total = data.get("total_amount")
+    if items and total is not None and sum(item["amount"] for item in items) + 0.01 < total:
+        logger.debug(f"Rule items incomplete for {template['name']}, dropping items")
+        items = []
+    if items:
+        data["items"] = items
+
+    return RuleMatch(template=template["name"], data=data, confidence=score_confidence(template, data), mode=mode)
+
+
+def score_confidence(template: Dict[str, Any], data: Dict[str, Any]) -> float:
+    """
+    按提取到（并通过校验）的字段计算置信度
+
+    模板置信度 × 提取到的字段的权重之和 / 模板中所有字段的权重之和；
+    商品金额之和与总金额一致时计满，大于总金额（有优惠）时计一半
+
+    Args:
+        template: 模板定义
+        data: apply_template 提取到的字段
+
+    Returns:
+        置信度（0 到模板置信度之间）
+    """
+    weights = {
+        name: weight for name, weight in FIELD_WEIGHTS.items()
+        if name in template["fields"] or (name == "items" and template.get("items"))
+    }
+    if not weights:
+        return 0.0
+
+    score = 0.0
+    for name, weight in weights.items():
+        if name == "items":
+            items, total = data.get("items"), data.get("total_amount")
+            if items and total is not None:
+                score += weight if abs(sum(item["amount"] for item in items) - total) <= 0.01 else weight / 2
+        elif data.get(name) not in (None, ""):
+            score += weight
+    return round(template["confidence"] * score / sum(weights.values()), 2)
+
+
+def extract_items(text: str, patterns: Sequence[re.Pattern]) -> List[Dict[str, Any]]:
+    """
+    提取商品（取第一个有结果的正则）
+
+    Args:
+        text: OCR 文本
+        patterns: 商品正则（命名组 name / quantity / amount）
+
+    Returns:
+        商品列表（不含金额标签、费用和优惠行）
+    """
+    for pattern in patterns:
+        items = []
+        for match in pattern.finditer(text):
+            name = match.group("name").strip()
+            if any(keyword in name for keyword in ITEM_EXCLUDE):
+                continue
+            amount = _to_amount(match.group("amount"))
+            if amount is None:
+                continue
+            quantity = match.group("quantity")
+            items.append({"name": name, "quantity": int(quantity) if quantity else 1, "amount": amount})
+        if items:
+            return items
+    return []
+
+
+class RuleEngine:
+    """
+    声明式规则引擎（线程安全，可在多个解析器间共用）
+
+    - 按 TEMPLATES 的顺序匹配模板，只使用第一个命中的模板
+    - 金额必须在 0.01-50000 之间；商品金额之和小于总金额时商品不完整，丢弃商品
+    - 统计各模板的提取结果（全部由规则完成 / 需要 LLM 补充）
+    """
+
+    def __init__(self, templates: Optional[List[Dict[str, Any]]] = None):
+        """
+        初始化规则引擎
+
+        Args:
+            templates: 模板定义（默认 TEMPLATES）
+        """
+        self.templates = templates if templates is not None else TEMPLATES
+        self._compiled = [compile_template(template) for template in self.templates]
+        self._stats: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def match(self, text: str) -> Optional[int]:
+        """第一个命中的模板的序号，没有时返回 None"""
+        for index, template in enumerate(self.templates):
+            if all(any(keyword in text for keyword in group) for group in template["match"]):
+                return index
+        return None
+
+    def extract(self, text: str) -> Optional[RuleMatch]:
+        """
+        用第一个命中的模板提取字段
+
+        Args:
+            text: OCR 文本
+
+        Returns:
+            提取结果，没有模板命中时为 None
+        """
+        index = self.match(text)
+        if index is None:
+            return None
+        return apply_template(self.templates[index], self._compiled[index], text)
+
+    def record(self, template: str, outcome: str):
+        """
+        记录一次提取结果
+
+        Args:
+            template: 模板名称
+            outcome: "rules"（全部由规则完成）/ "residual"（缺少的字段由 LLM 补充）
+        """
+        with self._lock:
+            key = (template, outcome)
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def stats(self) -> Dict[Tuple[str, str], int]:
+        """各模板的提取结果数（键为 (模板名称, 结果)）"""
+        with self._lock:
+            return dict(self._stats)
+
+
+def _extract_field(text: str, spec: Dict[str, Any], patterns: List[re.Pattern]) -> Any:
+    """按字段规则提取一个字段"""
+    if "value" in spec:
+        return spec["value"]
+
+    kind = spec.get("type", "text")
+    for pattern in patterns:
+        # 金额取最后一处（与 extract_total_amount 相同），其他字段取第一处
+        matches = list(pattern.finditer(text)) if kind == "amount" else [pattern.search(text)]
+        match = matches[-1] if matches else None
+        if not match:
+            continue
+        raw = match.group(1).strip()
+        if kind == "amount":
+            value = _to_amount(raw)
+        elif kind == "date":
+            value = extract_date(raw)
+        else:
+            value = raw or None
+        if value is not None:
+            return value
+
+    # 日期字段的正则都未命中时取全文第一个日期
+    return extract_date(text) if kind == "date" else None
+
+
+def _to_amount(value: str) -> Optional[float]:
+    """金额（0.01-50000 之外视为无效）"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if 0.01 <= amount <= 50000 else None
+
+
+# 默认规则引擎（各解析器共用，统计汇总在一起）
+default_rule_engine = RuleEngine()
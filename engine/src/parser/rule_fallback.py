@@ -0,0 +1,159 @@
+"""
+规则提取 - 不调用 LLM，只用正则和启发式规则提取金额、日期、商家名
+LLM 熔断（后端故障或明显变慢）时作为降级结果，置信度低于 LLM 解析
+"""
+
+import re
+import logging
+from typing import Optional, Dict, Any
+
+from ..models import Invoice, InvoiceParseResult
+
+logger = logging.getLogger(__name__)
+
+# 规则提取结果的置信度（快速模式 LLM 解析为 0.8）
+RULE_FALLBACK_CONFIDENCE = 0.3
+
+# 商家名中不应出现的内容：配送 / 保险服务、平台名称、金额和时间标签、订单页的提示文字
+MERCHANT_EXCLUDE = (
+    '配送', '骑手', '外送', '准时保', '食安险', '美团', '饿了么', '淘宝', '天猫', '京东',
+    '订单', '时间', '实付', '应付', '合计', '总计', '优惠', '感谢', '商品', '价格', '数量',
+    '明细', '支持', '无理由', '链接', '粉丝群',
+)
+
+# "下单时间 2025-12-08 19:14 luckincoffee小程序" 中商家名的后缀
+MERCHANT_SUFFIXES = ('小程序', '官方', 'APP', 'App', 'app')
+
+
+def extract_total_amount(text: str) -> Optional[float]:
+    """
+    从文本中提取总金额，按优先级：实付 > 应付 > 合计（排除"优惠合计"）
+
+    Args:
+        text: OCR 文本
+
+    Returns:
+        总金额，未找到时为 None
+    """
+    # (实付最准确，合计可能被误匹配为"优惠合计")
+    patterns = [
+        r'实付(?:款|金额)?[：:\s]*[￥¥]?([\d.]+)',  # 实付: ¥9.9 / 实付款：¥9.9
+        r'应付(?:款|金额)?[：:\s]*[￥¥]?([\d.]+)',  # 应付: ¥34.6 / 应付金额 34.6
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, text)
+        if matches:
+            return _to_float(matches[-1])
+
+    # 只匹配不是以"优惠"开头的"合计"（金额可能在同一行或下一行）
+    match = re.search(r'(?<!优惠)(?<!优惠券)(?<!优惠减免)合计[^\n]*(?:\n[^\n]*)?', text)
+    if match:
+        numbers = re.findall(r'[¥￥]([\d.]+)', match.group())
+        if numbers:
+            return _to_float(numbers[-1])
+    return None
+
+
+def extract_date(text: str) -> Optional[str]:
+    """
+    提取第一个完整日期（2025-12-08 19:14、2025/12/08、2025年12月08日）
+
+    Returns:
+        "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM[:SS]"，未找到时为 None
+    """
+    match = re.search(
+        r'(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?:\s*(\d{1,2}:\d{2}(?::\d{2})?))?',
+        text,
+    )
+    if not match:
+        return None
+    year, month, day, clock = match.groups()
+    date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+    return f"{date} {clock}" if clock else date
+
+
+def extract_merchant(text: str) -> Optional[str]:
+    """
+    提取商家名（启发式）
+
+    1. "下单时间" / "订单时间" 之后的商家名（去除"小程序"等后缀）
+    2. 文本开头几行中第一个像商家名的行（去除门店后缀，排除平台、配送、金额行）
+
+    Returns:
+        商家名，未找到时为 None
+    """
+    match = re.search(r'(?:下单|订单)时间[：:\s]*[\d\-/.: ]+\s*([^\n]+)', text)
+    if match:
+        name = match.group(1).strip()
+        for suffix in MERCHANT_SUFFIXES:
+            if name.endswith(suffix):
+                name = name[:-len(suffix)].strip()
+        if _looks_like_merchant(name):
+            return name
+
+    for line in text.splitlines()[:8]:
+        line = line.strip()
+        if not _looks_like_merchant(line):
+            continue
+        # "杨氏手撕烤鸭（丁头村店）" → "杨氏手撕烤鸭"
+        name = re.sub(r'[（(][^（()）]*[）)]$', '', line).strip()
+        if name:
+            return name
+    return None
+
+
+def rule_only_result(ocr_text: str, skip_items: bool = False) -> InvoiceParseResult:
+    """
+    只用规则提取账单（LLM 不可用时的降级结果）
+
+    Args:
+        ocr_text: OCR 文本
+        skip_items: 是否跳过商品明细（规则不提取商品，仅用于日志）
+
+    Returns:
+        解析结果（parse_mode 为 "rule_fallback"，置信度为 RULE_FALLBACK_CONFIDENCE；
+        金额和商家名都未找到时 success 为 False）
+    """
+    data: Dict[str, Any] = {
+        "seller_name": extract_merchant(ocr_text),
+        "total_amount": extract_total_amount(ocr_text),
+        "invoice_date": extract_date(ocr_text),
+        "items": [],
+        "raw_text": ocr_text,
+    }
+    mode = "summary" if skip_items else "full"
+    if data["total_amount"] is None and data["seller_name"] is None:
+        logger.warning(f"Rule-only extraction found nothing ({mode} mode)")
+        return InvoiceParseResult(
+            success=False,
+            confidence=0.0,
+            parse_mode="rule_fallback",
+            error_message="LLM unavailable and no amount or merchant found by rules",
+        )
+
+    logger.info(f"Rule-only extraction ({mode} mode): seller={data['seller_name']}, total={data['total_amount']}")
+    return InvoiceParseResult(
+        success=True,
+        invoice=Invoice(**data),
+        confidence=RULE_FALLBACK_CONFIDENCE,
+        parse_mode="rule_fallback",
+    )
+
+
+def _looks_like_merchant(line: str) -> bool:
+    """是否像商家名：有 2 个以上中文或字母，不含排除词和金额"""
+    if not line or len(line) > 40:
+        return False
+    if any(keyword in line for keyword in MERCHANT_EXCLUDE):
+        return False
+    # 金额行、商品说明（"到店自助链接；麦乐鸡20块（早1..."）
+    if re.search(r'[￥¥；;…]|\.\.\.|\d+\.\d{1,2}', line):
+        return False
+    return len(re.findall(r'[一-鿿A-Za-z]', line)) >= 2
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,112 @@
+"""
+账单输出的 JSON Schema - 用于验证 LLM 输出，以及约束解码（Ollama format / vLLM guided_json）
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+
+# 完整账单字段
+INVOICE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "invoice_type": {"type": ["string", "null"]},
+        "invoice_number": {"type": ["string", "null"]},
+        "invoice_date": {"type": ["string", "null"]},
+        "seller_name": {"type": ["string", "null"]},
+        "seller_tax_id": {"type": ["string", "null"]},
+        "seller_address": {"type": ["string", "null"]},
+        "seller_phone": {"type": ["string", "null"]},
+        "seller_bank": {"type": ["string", "null"]},
+        "seller_account": {"type": ["string", "null"]},
+        "buyer_name": {"type": ["string", "null"]},
+        "buyer_tax_id": {"type": ["string", "null"]},
+        "buyer_address": {"type": ["string", "null"]},
+        "buyer_phone": {"type": ["string", "null"]},
+        "subtotal": {"type": ["number", "null"]},
+        "tax_amount": {"type": ["number", "null"]},
+        "total_amount": {"type": ["number", "null"]},
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "quantity": {"type": ["number", "null"]},
+                    "unit_price": {"type": ["number", "null"]},
+                    "amount": {"type": ["number", "null"]},
+                    "description": {"type": ["string", "null"]},
+                },
+                "required": ["name"],
+            },
+        },
+        "payment_method": {"type": ["string", "null"]},
+        "remarks": {"type": ["string", "null"]},
+    },
+}
+
+
+def reduce_schema(
+    fields: Sequence[str],
+    required: Optional[Sequence[str]] = None,
+    item_fields: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    从 INVOICE_SCHEMA 裁剪出只包含部分字段的 Schema
+
+    约束解码时模型只能按 Schema 输出：不允许多余字段，
+    字段按 fields 的顺序输出（必填字段在前），不会输出说明文字或代码块标记。
+
+    Args:
+        fields: 保留的字段（决定输出顺序）
+        required: 必须输出的字段（默认全部）
+        item_fields: items 中商品保留的字段（默认与 INVOICE_SCHEMA 相同，必须全部输出）
+
+    Returns:
+        JSON Schema
+    """
+    properties = {}
+    for field in fields:
+        spec = INVOICE_SCHEMA["properties"][field]
+        if field == "items" and item_fields:
+            item_spec = spec["items"]["properties"]
+            spec = {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {name: item_spec[name] for name in item_fields},
+                    "required": list(item_fields),
+                    "additionalProperties": False,
+                },
+            }
+        properties[field] = spec
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(required if required is not None else fields),
+        "additionalProperties": False,
+    }
+
+
+def batch_schema(order_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    批量解析的 Schema：{"orders": [{"index": 订单编号, ...该订单的字段}, ...]}
+
+    Args:
+        order_schema: 单个订单的 Schema（reduce_schema 的结果）
+
+    Returns:
+        JSON Schema
+    """
+    order = {
+        "type": "object",
+        "properties": {"index": {"type": "integer"}, **order_schema["properties"]},
+        "required": ["index", *order_schema.get("required", [])],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "object",
+        "properties": {"orders": {"type": "array", "items": order}},
+        "required": ["orders"],
+        "additionalProperties": False,
+    }
@@ -8,9 +8,10 @@ from typing import Optional, Tuple
 from enum import Enum
 
 from ..models import InvoiceParseResult
-from ..llm import OllamaEngine
+from ..llm import OllamaEngine, Deadline
 from .bill_parser import BillParser
 from .fast_parser import FastBillParser
+from .merchant_templates import MerchantTemplateStore
 from .hybrid_parser import HybridParser
 
 logging.basicConfig(level=logging.INFO)
@@ -117,41 +118,90 @@ class SmartParser:
         BillType.UNKNOWN: ParserMode.FAST,               # 未知用快速模式
     }
 
-    def __init__(self, llm_engine: OllamaEngine, skip_items: bool = False):
+    def __init__(
+        self,
+        llm_engine: OllamaEngine,
+        skip_items: bool = False,
+        hedge: bool = False,
+        rules_first: bool = False,
+        merchant_templates: Optional[MerchantTemplateStore] = None,
+    ):
         """
         初始化智能解析器
 
         Args:
             llm_engine: LLM 推理引擎
             skip_items: 是否跳过商品明细（仅提取总金额等关键信息）
+            hedge: 是否对冲快速模式的慢调用（见 FastBillParser）
+            rules_first: 快速模式是否先用模板规则提取（见 FastBillParser）
+            merchant_templates: 学习的商家模板库（见 FastBillParser）
         """
         self.llm_engine = llm_engine
         self.skip_items = skip_items
 
         # 预初始化三种解析器
         self.standard_parser = BillParser(llm_engine, use_few_shot=True)
-        self.fast_parser = FastBillParser(llm_engine, skip_items=skip_items)
+        self.fast_parser = FastBillParser(
+            llm_engine, skip_items=skip_items, hedge=hedge, rules_first=rules_first,
+            merchant_templates=merchant_templates,
+        )
         self.hybrid_parser = HybridParser(llm_engine)
 
         mode = " (summary mode)" if skip_items else ""
         logger.info(f"SmartParser initialized (auto mode selection){mode}")
 
-    def parse(self, ocr_text: str, force_mode: Optional[ParserMode] = None) -> InvoiceParseResult:
+    def parse(
+        self,
+        ocr_text: str,
+        force_mode: Optional[ParserMode] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> InvoiceParseResult:
         """
         智能解析
 
         Args:
             ocr_text: OCR 识别的文本
             force_mode: 强制使用指定模式（可选）
+            deadline: 请求截止时间（可选）
 
         Returns:
             账单解析结果
         """
-        # 1. 检测账单类型
+        # 1-2. 检测账单类型，选择解析模式
+        bill_type, parser = self._select_parser(ocr_text, force_mode)
+
+        # 3. 使用对应的解析器
+        result = parser.parse(ocr_text, deadline=deadline)
+
+        # 4. 在结果中附加检测信息
+        return self._annotate(result, bill_type)
+
+    async def aparse(
+        self,
+        ocr_text: str,
+        force_mode: Optional[ParserMode] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> InvoiceParseResult:
+        """
+        智能解析（异步，参数与 parse 相同）
+
+        Returns:
+            账单解析结果
+        """
+        bill_type, parser = self._select_parser(ocr_text, force_mode)
+        result = await parser.aparse(ocr_text, deadline=deadline)
+        return self._annotate(result, bill_type)
+
+    def _select_parser(self, ocr_text: str, force_mode: Optional[ParserMode]):
+        """
+        检测账单类型并选择解析器
+
+        Returns:
+            (账单类型, 解析器)
+        """
         bill_type, confidence = self._detect_bill_type(ocr_text)
         logger.info(f"Detected bill type: {bill_type.value} (confidence: {confidence:.2%})")
 
-        # 2. 选择解析模式
         if force_mode:
             mode = force_mode
             logger.info(f"Using forced mode: {mode.value}")
@@ -159,15 +209,13 @@ class SmartParser:
             mode = self.TYPE_TO_MODE.get(bill_type, ParserMode.FAST)
             logger.info(f"Auto-selected mode: {mode.value}")
 
-        # 3. 使用对应的解析器
-        parser = self._get_parser(mode)
-        result = parser.parse(ocr_text)
+        return bill_type, self._get_parser(mode)
 
-        # 4. 在结果中附加检测信息
+    def _annotate(self, result: InvoiceParseResult, bill_type: BillType) -> InvoiceParseResult:
+        """在结果中附加检测到的账单类型"""
         if result.success and result.invoice:
             if not result.invoice.invoice_type:
                 result.invoice.invoice_type = bill_type.value.replace('_', ' ').title()
-
         return result
 
     def _detect_bill_type(self, text: str) -> Tuple[BillType, float]: